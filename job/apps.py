@@ -0,0 +1,10 @@
+from django.apps                 import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobConfig(AppConfig):
+    name = 'job'
+
+    def ready(self):
+        # 각 app의 jobs.py 에서 @task 로 정의한 job을 등록한다
+        autodiscover_modules('jobs')
@@ -0,0 +1,19 @@
+import datetime
+
+from django.conf  import settings
+from django.utils import timezone
+
+from job.models import Job
+from job.queue  import task
+
+@task('job.purge_finished')
+def purge_finished(batch_size=1000):
+    """ JOB_RETENTION 보다 오래전에 끝난(done, failed) job을 batch 단위로 지운다 """
+    expired = timezone.now() - datetime.timedelta(seconds=settings.JOB_RETENTION)
+    while True:
+        job_ids = list(Job.objects.filter(
+            status__in=[Job.DONE, Job.FAILED], finished_at__lt=expired
+        ).values_list('id', flat=True)[:batch_size])
+        if not job_ids:
+            break
+        Job.objects.filter(id__in=job_ids).delete()
@@ -0,0 +1,27 @@
+import signal
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from job.worker import Worker
+
+class Command(BaseCommand):
+    help = 'jobs table의 job을 thread pool로 실행하는 worker (settings.JOB_SCHEDULE의 주기 job도 추가한다)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOB_WORKER_THREADS)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+            help='실행할 job이 없을 때 다시 확인하는 간격(초)')
+        parser.add_argument('--once', action='store_true',
+            help='지금 실행할 수 있는 job을 모두 실행하면 끝낸다')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['threads'], options['poll_interval'])
+        # SIGTERM / Ctrl+C: 새 job은 가져가지 않고 실행 중인 job이 끝나면 종료한다
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: worker.stop())
+
+        counts = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            'done {done}, retried {retried}, failed {failed}'.format(**counts)
+        ))
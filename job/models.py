@@ -0,0 +1,36 @@
+from django.db import models
+
+class Job(models.Model):
+    PENDING  = 'pending'
+    RUNNING  = 'running'
+    DONE     = 'done'
+    FAILED   = 'failed'
+    STATUSES = [(PENDING, 'pending'), (RUNNING, 'running'), (DONE, 'done'), (FAILED, 'failed')]
+
+    name         = models.CharField(max_length=100)
+    payload      = models.JSONField(default=dict)
+    status       = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    # 대기/실행 중인 job 사이에서만 unique (끝난 job은 NULL로 비운다)
+    dedup_key    = models.CharField(max_length=200, null=True, unique=True)
+    attempts     = models.IntegerField(default=0)
+    max_attempts = models.IntegerField()
+    run_at       = models.DateTimeField()
+    locked_by    = models.CharField(max_length=100, null=True)
+    locked_at    = models.DateTimeField(null=True)
+    last_error   = models.TextField(null=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'jobs'
+        indexes  = [
+            models.Index(fields=['status', 'run_at'], name='jobs_status_run_at_idx'),
+            models.Index(fields=['status', 'locked_at'], name='jobs_status_locked_at_idx'),
+        ]
+
+class JobSchedule(models.Model):
+    name        = models.CharField(max_length=100, unique=True)
+    next_run_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'job_schedules'
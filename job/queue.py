@@ -0,0 +1,68 @@
+"""
+DB table(jobs) 기반 background job queue
+
+- job은 각 app의 jobs.py 에서 @task('app.name') 으로 등록한다. (JobConfig.ready 에서 autodiscover)
+- payload는 JSON으로 저장되어 task 함수의 keyword argument로 전달된다.
+- enqueue_on_commit: 현재 transaction이 commit 된 뒤에 job을 추가한다. rollback 되면 추가되지 않는다.
+- dedup_key: 같은 key의 job이 대기/실행 중이면 새로 추가하지 않고 기존 job을 반환한다.
+- 실행은 python manage.py run_jobs (job/worker.py) 가 담당한다. broker 없이 DB만 사용한다.
+"""
+import datetime
+
+from django.conf  import settings
+from django.db    import transaction, IntegrityError
+from django.utils import timezone
+
+from job.models import Job
+
+TASKS = {}
+
+class Task:
+    def __init__(self, name, func, max_attempts):
+        self.name         = name
+        self.func         = func
+        self.max_attempts = max_attempts
+
+def task(name, max_attempts=None):
+    """ 함수를 job으로 등록한다
+    Args:
+        - name: enqueue 할 때 사용하는 이름 ('app.동작')
+        - max_attempts: 실패 시 최대 실행 횟수 (기본: settings.JOB_MAX_ATTEMPTS)
+    """
+    def register(func):
+        TASKS[name] = Task(name, func, max_attempts or settings.JOB_MAX_ATTEMPTS)
+        return func
+    return register
+
+def enqueue(name, payload=None, dedup_key=None, delay=0):
+    """ job을 바로 추가하고 Job을 반환한다 (dedup_key가 겹치면 기존 Job)
+    Args:
+        - payload: task 함수에 전달할 keyword argument (JSON으로 저장 가능해야 한다)
+        - delay: 실행을 미룰 시간(초)
+    """
+    if name not in TASKS:
+        raise ValueError('등록되지 않은 job 입니다: {}'.format(name))
+
+    job = Job(
+        name         = name,
+        payload      = payload or {},
+        dedup_key    = dedup_key,
+        max_attempts = TASKS[name].max_attempts,
+        run_at       = timezone.now() + datetime.timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        existing = Job.objects.filter(dedup_key=dedup_key).first()
+        if existing is None:
+            # 그 사이에 기존 job이 끝나서 key가 비워졌다
+            return enqueue(name, payload, dedup_key, delay)
+        return existing
+
+def enqueue_on_commit(name, payload=None, dedup_key=None, delay=0):
+    """ view에서 사용: 요청의 변경 사항이 commit 된 뒤에 job을 추가한다 """
+    if name not in TASKS:
+        raise ValueError('등록되지 않은 job 입니다: {}'.format(name))
+    transaction.on_commit(lambda: enqueue(name, payload, dedup_key, delay))
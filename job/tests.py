@@ -0,0 +1,123 @@
+import datetime
+import io
+import time
+
+from django.core.management import call_command
+from django.db              import transaction
+from django.test            import TransactionTestCase, override_settings
+from django.utils           import timezone
+
+from job.models import Job, JobSchedule
+from job.queue  import enqueue, enqueue_on_commit, task
+from job.worker import Worker
+
+calls = []
+
+@task('job.test_record', max_attempts=3)
+def record(value, fail_times=0):
+    calls.append(value)
+    if calls.count(value) <= fail_times:
+        raise RuntimeError('fail {}'.format(value))
+
+@task('job.test_sleep')
+def sleep(value, seconds):
+    time.sleep(seconds)
+    calls.append(value)
+
+def run_worker():
+    return Worker(threads=2, poll_interval=0.01).run(once=True)
+
+def make_due():
+    Job.objects.filter(status=Job.PENDING).update(run_at=timezone.now())
+
+@override_settings(JOB_SCHEDULE={}, JOB_RETRY_BACKOFF=60)
+class JobQueueTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_on_commit_skips_rolled_back_requests(self):
+        try:
+            with transaction.atomic():
+                enqueue_on_commit('job.test_record', {'value' : 'rolled back'})
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            enqueue_on_commit('job.test_record', {'value' : 'committed'})
+
+        self.assertEqual(list(Job.objects.values_list('payload', flat=True)), [{'value' : 'committed'}])
+
+    def test_dedup_key_is_released_after_the_job_finishes(self):
+        first  = enqueue('job.test_record', {'value' : 'a'}, dedup_key='record:a')
+        second = enqueue('job.test_record', {'value' : 'a'}, dedup_key='record:a')
+        self.assertEqual(first.id, second.id)
+
+        self.assertEqual(run_worker()['done'], 1)
+        third = enqueue('job.test_record', {'value' : 'a'}, dedup_key='record:a')
+        self.assertNotEqual(third.id, first.id)
+
+    def test_failed_job_is_retried_with_backoff_then_marked_failed(self):
+        flaky  = enqueue('job.test_record', {'value' : 'flaky', 'fail_times' : 1})
+        broken = enqueue('job.test_record', {'value' : 'broken', 'fail_times' : 5})
+
+        self.assertEqual(run_worker(), {'done' : 0, 'retried' : 2, 'failed' : 0})
+        flaky.refresh_from_db()
+        self.assertEqual(flaky.status, Job.PENDING)
+        self.assertGreaterEqual(flaky.run_at, timezone.now() + datetime.timedelta(seconds=25))
+
+        make_due()
+        self.assertEqual(run_worker(), {'done' : 1, 'retried' : 1, 'failed' : 0})
+        make_due()
+        self.assertEqual(run_worker(), {'done' : 0, 'retried' : 0, 'failed' : 1})
+
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), (Job.FAILED, 3))
+        self.assertIn('RuntimeError: fail broken', broken.last_error)
+        self.assertEqual(Job.objects.get(id=flaky.id).status, Job.DONE)
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_jobs_left_running_by_a_dead_worker_are_requeued(self):
+        job = enqueue('job.test_record', {'value' : 'orphan'})
+        Job.objects.filter(id=job.id).update(
+            status=Job.RUNNING, locked_by='dead', locked_at=timezone.now() - datetime.timedelta(minutes=5)
+        )
+
+        make_due()
+        self.assertEqual(run_worker()['done'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+    @override_settings(JOB_SCHEDULE={'record' : {'task' : 'job.test_record', 'interval' : 3600, 'payload' : {'value' : 's'}}})
+    def test_scheduled_job_is_enqueued_once_per_interval(self):
+        call_command('run_jobs', '--once', stdout=io.StringIO())
+        call_command('run_jobs', '--once', stdout=io.StringIO())
+
+        self.assertEqual(calls, ['s'])
+        self.assertGreater(JobSchedule.objects.get(name='record').next_run_at, timezone.now())
+
+    @override_settings(JOB_LEASE_TIMEOUT=0.5, JOB_LEASE_RENEW_INTERVAL=0.1)
+    def test_lease_is_renewed_while_a_long_job_runs(self):
+        job = enqueue('job.test_sleep', {'value' : 'slow', 'seconds' : 1.5})
+
+        self.assertEqual(run_worker()['done'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 1))
+        self.assertEqual(calls, ['slow'])
+
+    def test_result_is_not_written_after_the_lease_is_lost(self):
+        for fail_times in (0, 1):
+            with self.subTest(fail_times=fail_times):
+                worker = Worker(threads=1, poll_interval=0.01)
+                job    = enqueue('job.test_record', {'value' : 'taken', 'fail_times' : fail_times})
+                [claimed] = worker.claim(1)
+                # 실행 중에 lease가 만료되어 다른 worker가 job을 가져간 상황
+                Job.objects.filter(id=job.id).update(locked_by='other-worker')
+
+                with self.assertLogs('job.worker', 'WARNING') as logs:
+                    worker.execute(claimed)
+                self.assertIn('lease was lost', logs.output[-1])
+                self.assertEqual(worker.counts, {'done' : 0, 'retried' : 0, 'failed' : 0})
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, 'other-worker', 0))
+                job.delete()
+                calls.clear()
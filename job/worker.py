@@ -0,0 +1,205 @@
+"""
+jobs table을 polling 하면서 job을 thread pool에서 실행하는 worker (python manage.py run_jobs)
+
+- 실행할 job은 SELECT ... FOR UPDATE SKIP LOCKED 로 고르고, status를 조건으로 한 UPDATE로 가져간다.
+  SKIP LOCKED가 없는 DB(SQLite)에서도 조건부 UPDATE 덕분에 같은 job을 두 worker가 실행하지 않는다.
+- 실패한 job은 JOB_RETRY_BACKOFF * 2^(실행 횟수-1) 초 (최대 JOB_RETRY_BACKOFF_MAX, jitter 포함) 뒤에 다시 실행하고,
+  max_attempts 번 실패하면 failed로 남긴다.
+- 실행 중인 job은 JOB_LEASE_RENEW_INTERVAL 마다 locked_at을 갱신하고(heartbeat),
+  worker가 죽어서 JOB_LEASE_TIMEOUT 동안 갱신되지 않은 job은 다시 pending으로 돌린다.
+- 결과는 job을 가져간 token(locked_by)이 그대로일 때만 기록한다. lease가 만료되어 다른 worker가 가져간 job은 덮어쓰지 않는다.
+- settings.JOB_SCHEDULE 의 주기 job은 job_schedules의 next_run_at을 먼저 옮긴 worker 하나만 추가한다.
+"""
+import datetime
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf      import settings
+from django.db        import OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.utils     import timezone
+
+from job.models import Job, JobSchedule
+from job.queue  import TASKS, enqueue
+
+logger = logging.getLogger(__name__)
+
+# job 결과 기록이 lock 충돌로 실패했을 때 다시 시도하는 횟수와 간격(초, 시도마다 늘어난다)
+FINISH_ATTEMPTS    = 5
+FINISH_RETRY_DELAY = 0.05
+
+def retry_delay(attempts):
+    """ attempts 번째 실패 후 다시 실행할 때까지 기다리는 시간(초) """
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX)
+    # 같은 원인으로 함께 실패한 job들이 동시에 다시 실행되지 않도록 흩어놓는다
+    return delay * random.uniform(0.5, 1.0)
+
+class Worker:
+    def __init__(self, threads, poll_interval):
+        self.threads       = threads
+        self.poll_interval = poll_interval
+        self.worker_id     = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.stopping      = threading.Event()
+        self.counts        = {'done' : 0, 'retried' : 0, 'failed' : 0}
+        self._counts_lock  = threading.Lock()
+        self._next_runs    = {}
+        self._renewed_at   = time.monotonic()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, once=False):
+        """ stop() 될 때까지 job을 실행한다. once면 지금 실행할 수 있는 job이 없어질 때 끝난다. """
+        # future -> 실행 중인 job
+        running = {}
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                self.enqueue_scheduled()
+                self.recover_stale()
+                jobs = self.claim(self.threads - len(running)) if len(running) < self.threads else []
+                for job in jobs:
+                    running[executor.submit(self.execute, job)] = job
+
+                if once and not jobs and not running:
+                    break
+                if running:
+                    done, _ = wait(running, timeout=0 if jobs else self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del running[future]
+                elif not jobs:
+                    self.stopping.wait(self.poll_interval)
+                self.renew_leases(running.values())
+            # 종료 시에는 실행 중인 job이 끝날 때까지 lease를 갱신하면서 기다린다
+            while running:
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                self.renew_leases(running.values())
+        close_old_connections()
+        return dict(self.counts)
+
+    def renew_leases(self, jobs):
+        """ 실행 중인 job의 locked_at을 JOB_LEASE_RENEW_INTERVAL 마다 갱신해서 recover_stale이 다시 실행하지 않게 한다 """
+        now = time.monotonic()
+        if now - self._renewed_at < settings.JOB_LEASE_RENEW_INTERVAL:
+            return
+        self._renewed_at = now
+        jobs             = list(jobs)
+        if jobs:
+            Job.objects.filter(
+                id__in=[job.id for job in jobs], locked_by__in={job.locked_by for job in jobs}, status=Job.RUNNING
+            ).update(locked_at=timezone.now())
+
+    def claim(self, limit):
+        """ 실행할 시간이 된 pending job을 최대 limit 개 가져간다 """
+        now   = timezone.now()
+        token = '{}:{}'.format(self.worker_id, uuid.uuid4().hex[:8])
+        with transaction.atomic():
+            job_ids = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.PENDING, run_at__lte=now)
+                .order_by('run_at', 'id')
+                .values_list('id', flat=True)[:limit]
+            )
+            if not job_ids:
+                return []
+            Job.objects.filter(id__in=job_ids, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=token, locked_at=now
+            )
+        return list(Job.objects.filter(status=Job.RUNNING, locked_by=token))
+
+    def execute(self, job):
+        task = TASKS.get(job.name)
+        try:
+            if task is None:
+                raise LookupError('등록되지 않은 job 입니다: {}'.format(job.name))
+            task.func(**job.payload)
+        except Exception:
+            logger.exception('job %s (%s) failed', job.id, job.name)
+            self.fail(job, traceback.format_exc(), retry=task is not None)
+        else:
+            if self.finish(job, status=Job.DONE, attempts=job.attempts + 1, dedup_key=None, finished_at=timezone.now()):
+                self.count('done')
+        finally:
+            close_old_connections()
+
+    def finish(self, job, **fields):
+        """ 이 worker가 가져간 상태 그대로인 job에만 결과를 기록한다.
+        lease가 만료되어 다시 pending이 되었거나 다른 worker가 가져간 job은 덮어쓰지 않고 False를 반환한다.
+        Note:
+            - 기록에 실패하면 job이 lease 만료까지 running으로 남았다가 다시 실행되므로, lock 충돌(deadlock 등)은 몇번 다시 시도한다.
+        """
+        for attempt in range(1, FINISH_ATTEMPTS + 1):
+            try:
+                updated = Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=job.locked_by).update(**fields)
+                break
+            except OperationalError:
+                if attempt == FINISH_ATTEMPTS:
+                    logger.exception('job %s (%s) result could not be saved', job.id, job.name)
+                    return False
+                time.sleep(FINISH_RETRY_DELAY * attempt)
+        if not updated:
+            logger.warning('job %s (%s) lease was lost, result is discarded', job.id, job.name)
+        return bool(updated)
+
+    def fail(self, job, error, retry=True):
+        attempts = job.attempts + 1
+        if retry and attempts < job.max_attempts:
+            if self.finish(
+                job,
+                status     = Job.PENDING,
+                attempts   = attempts,
+                run_at     = timezone.now() + datetime.timedelta(seconds=retry_delay(attempts)),
+                locked_by  = None,
+                locked_at  = None,
+                last_error = error,
+            ):
+                self.count('retried')
+        elif self.finish(
+            job, status=Job.FAILED, attempts=attempts, dedup_key=None, finished_at=timezone.now(), last_error=error
+        ):
+            self.count('failed')
+
+    def count(self, name):
+        with self._counts_lock:
+            self.counts[name] += 1
+
+    def recover_stale(self):
+        """ 실행하던 worker가 죽어서 running으로 남은 job을 다시 실행 대기로 돌린다 """
+        now     = timezone.now()
+        expired = now - datetime.timedelta(seconds=settings.JOB_LEASE_TIMEOUT)
+        stale   = Job.objects.filter(status=Job.RUNNING, locked_at__lt=expired)
+        error   = 'lease expired ({}s)'.format(settings.JOB_LEASE_TIMEOUT)
+        # 실행 중에 worker를 죽게 만드는 job이 계속 반복되지 않도록 실행 횟수에 포함한다
+        failed  = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+            status=Job.FAILED, attempts=F('attempts') + 1, dedup_key=None, finished_at=now, last_error=error
+        )
+        retried = stale.update(
+            status=Job.PENDING, attempts=F('attempts') + 1, locked_by=None, locked_at=None, last_error=error
+        )
+        if failed or retried:
+            logger.warning('job lease expired: %d requeued, %d failed', retried, failed)
+
+    def enqueue_scheduled(self):
+        """ JOB_SCHEDULE 중 실행할 시간이 된 job을 추가한다 """
+        now = timezone.now()
+        for name, entry in settings.JOB_SCHEDULE.items():
+            if self._next_runs.get(name, now) > now:
+                continue
+            schedule, _ = JobSchedule.objects.get_or_create(name=name, defaults={'next_run_at' : now})
+            if schedule.next_run_at <= now:
+                next_run_at = now + datetime.timedelta(seconds=entry['interval'])
+                # 여러 worker 중 next_run_at을 먼저 옮긴 worker만 job을 추가한다
+                if JobSchedule.objects.filter(id=schedule.id, next_run_at=schedule.next_run_at)\
+                        .update(next_run_at=next_run_at):
+                    enqueue(entry['task'], entry.get('payload'), dedup_key='schedule:{}'.format(name))
+                schedule.next_run_at = next_run_at
+            self._next_runs[name] = schedule.next_run_at
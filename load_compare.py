@@ -0,0 +1,100 @@
+"""
+같은 endpoint를 WSGI 서버와 ASGI 서버에 동시에 요청해서 처리량(req/s)과 latency를 비교한다.
+
+사용 예시:
+    gunicorn sweethome.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn sweethome.asgi:application --workers 4 --port 8001
+    python load_compare.py --wsgi http://127.0.0.1:8000 --asgi http://127.0.0.1:8001 --output load_compare.json
+
+- WSGI 서버에서는 sync view, ASGI 서버에서는 sync view와 /async/... view를 각각 측정한다.
+- 외부 패키지 없이 표준 라이브러리만 사용한다.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+
+# sync path -> async path
+ENDPOINTS = {
+    '/products'                : '/async/products',
+    '/products?order=review'   : '/async/products?order=review',
+    '/products/1'              : '/async/products/1',
+    '/products/category'       : '/async/products/category',
+    '/posting'                 : '/async/posting',
+    '/posting?order=best'      : '/async/posting?order=best',
+    '/posting/category'        : '/async/posting/category',
+}
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+def run(url, concurrency, duration):
+    latencies = []
+    errors    = 0
+    lock      = threading.Lock()
+    deadline  = time.monotonic() + duration
+
+    def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                    ok = response.status == 200
+            except Exception:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(client)
+
+    return {
+        'url'        : url,
+        'requests'   : len(latencies),
+        'errors'     : errors,
+        'throughput' : round(len(latencies) / duration, 1),
+        'p50_ms'     : round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms'     : round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms'     : round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'mean_ms'    : round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi', required=True, help='WSGI 서버 주소 (예: http://127.0.0.1:8000)')
+    parser.add_argument('--asgi', required=True, help='ASGI 서버 주소 (예: http://127.0.0.1:8001)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20, help='endpoint 당 측정 시간 (초)')
+    parser.add_argument('--output', help='결과를 저장할 JSON 파일')
+    args = parser.parse_args()
+
+    results = []
+    for sync_path, async_path in ENDPOINTS.items():
+        for server, base, path in (
+            ('wsgi', args.wsgi, sync_path),
+            ('asgi', args.asgi, sync_path),
+            ('asgi', args.asgi, async_path),
+        ):
+            result = dict(run(base + path, args.concurrency, args.duration), server=server, endpoint=sync_path)
+            results.append(result)
+            print('{server:4} {url:60} {throughput:>8} req/s  p50 {p50_ms} ms  p99 {p99_ms} ms  errors {errors}'.format(**result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
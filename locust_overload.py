@@ -0,0 +1,215 @@
+"""
+admission control(sweethome/admission.py) 과부하 테스트
+
+checkout(장바구니/주문)과 feed(게시글 목록) 요청을 일정하게 보내는 중에 signin과 상품 목록 요청을 대량으로 추가해서,
+보호 대상 route의 p99 latency가 과부하 전과 비슷하게 유지되는지 확인한다.
+
+준비:
+    python manage.py issue_load_tokens --users 200 --output load_tokens.json
+
+실행 예시:
+    locust -f locust_overload.py --host http://127.0.0.1:8000 --headless \
+        --token-file load_tokens.json --protected-users 20 --flood-users 300 \
+        --baseline-seconds 60 --overload-seconds 120 --results-file results/overload.json
+
+- 처음 --baseline-seconds 동안은 보호 대상 user만, 그 다음 --overload-seconds 동안은 flood user를 함께 실행한다.
+- 각 구간이 시작된 뒤 --settle-seconds 동안의 요청은 user가 늘어나는 중이므로 집계하지 않는다.
+- 보호 대상 route의 과부하 구간 p99가 기준 구간 p99의 --max-p99-ratio 배를 넘거나,
+  보호 대상 route의 실패율이 --max-error-rate 를 넘으면 exit code 1로 끝난다.
+- flood route의 503(SERVER_BUSY)은 의도한 거절이므로 실패로 보지 않고 따로 센다.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+
+from locust import HttpUser, LoadTestShape, constant, events, task
+
+PROTECTED_ROUTES = ('/orders/products', '/posting')
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument('--token-file', default='load_tokens.json', help='issue_load_tokens 로 만든 token pool 파일')
+    parser.add_argument('--results-file', default='', help='구간 별 p99와 거절 수를 저장할 JSON 파일')
+    parser.add_argument('--protected-users', type=int, default=20)
+    parser.add_argument('--flood-users', type=int, default=300)
+    parser.add_argument('--baseline-seconds', type=int, default=60)
+    parser.add_argument('--overload-seconds', type=int, default=120)
+    parser.add_argument('--settle-seconds', type=int, default=10)
+    parser.add_argument('--max-p99-ratio', type=float, default=2.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+
+class PhaseRecorder:
+    """ 구간(baseline / overload) 별 route latency와 status를 모은다 """
+    def __init__(self):
+        self.phase   = None
+        self.started = None
+        self.samples = {}
+        self._lock   = threading.Lock()
+
+    def start(self, phase):
+        with self._lock:
+            self.phase   = phase
+            self.started = time.monotonic()
+
+    def record(self, name, response_time, status):
+        with self._lock:
+            if self.phase is None or time.monotonic() - self.started < self.settle_seconds:
+                return
+            self.samples.setdefault((self.phase, name), []).append((response_time, status))
+
+recorder = PhaseRecorder()
+
+class Accounts:
+    """ token pool 파일의 유저를 돌아가며 사용한다 (locust_test.py 와 같은 파일 형식) """
+    def __init__(self):
+        self._cycle = None
+        self._lock  = threading.Lock()
+
+    def next(self, path):
+        with self._lock:
+            if self._cycle is None:
+                with open(path, encoding='utf-8') as f:
+                    self._cycle = itertools.cycle(json.load(f))
+            return dict(next(self._cycle))
+
+accounts = Accounts()
+
+@events.init.add_listener
+def configure(environment, **kwargs):
+    recorder.settle_seconds = environment.parsed_options.settle_seconds if environment.parsed_options else 0
+
+@events.request.add_listener
+def on_request(name, response_time, response=None, exception=None, **kwargs):
+    status = response.status_code if response is not None and exception is None else 0
+    recorder.record(name, response_time, status)
+
+class AccountUser(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        self.account = accounts.next(self.environment.parsed_options.token_file)
+
+    def headers(self):
+        return {'Authorization' : self.account['access_token']}
+
+class CheckoutUser(AccountUser):
+    """ 보호 대상 (critical): 장바구니 조회와 상품 담기 """
+    wait_time = constant(1)
+
+    def on_start(self):
+        super().on_start()
+        self.product = self.client.get('/products/1', name='/products/[id]').json().get('product')
+
+    @task(3)
+    def cart(self):
+        self.client.get('/orders/products', headers=self.headers(), name='/orders/products')
+
+    @task(1)
+    def cart_add(self):
+        if not self.product or not self.product['color'] or not self.product['size']:
+            return
+        self.client.post('/products/cart', headers=self.headers(), name='/products/cart', json={
+            'id'       : self.product['id'],
+            'color'    : random.choice(self.product['color']),
+            'size'     : random.choice(self.product['size']),
+            'quantity' : 1,
+        })
+
+class FeedUser(AccountUser):
+    """ 보호 대상 (high): 게시글 목록 """
+    wait_time = constant(1)
+
+    @task
+    def posting_list(self):
+        self.client.get('/posting', params={'order' : random.choice(['best', 'popular', 'old'])},
+            headers=self.headers(), name='/posting')
+
+class FloodUser(AccountUser):
+    """ 과부하 traffic: 대기 없이 signin(bcrypt)과 정렬된 상품 목록을 요청한다 """
+    wait_time = constant(0)
+
+    def expect_shedding(self, method, url, name, **kwargs):
+        with self.client.request(method, url, name=name, catch_response=True, **kwargs) as response:
+            if response.status_code in (200, 503):
+                response.success()
+            else:
+                response.failure('status {}'.format(response.status_code))
+
+    @task(1)
+    def signin(self):
+        self.expect_shedding('POST', '/user/signin', '/user/signin', json={
+            'email'    : self.account['email'],
+            'password' : self.account['password'],
+        })
+
+    @task(3)
+    def product_list(self):
+        self.expect_shedding('GET', '/products', '/products', params={'order' : random.choice(['review', 'recent', 'min_price'])})
+
+class OverloadShape(LoadTestShape):
+    """ baseline: 보호 대상 user만 -> overload: flood user 추가 -> 종료 """
+    def tick(self):
+        options   = self.runner.environment.parsed_options
+        run_time  = self.get_run_time()
+        protected = options.protected_users
+        if run_time < options.baseline_seconds:
+            self.enter('baseline')
+            return protected, protected, [CheckoutUser, FeedUser]
+        if run_time < options.baseline_seconds + options.overload_seconds:
+            self.enter('overload')
+            return protected + options.flood_users, 50, [CheckoutUser, FeedUser, FloodUser]
+        return None
+
+    def enter(self, phase):
+        if recorder.phase != phase:
+            recorder.start(phase)
+
+def percentile(values, percent):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * percent / 100))], 1) if values else None
+
+def summary(samples):
+    latencies = [response_time for response_time, status in samples if 200 <= status < 500]
+    failures  = [status for response_time, status in samples if not 200 <= status < 500]
+    return {
+        'requests'   : len(samples),
+        'failures'   : len(failures),
+        'rejected'   : sum(1 for status in failures if status == 503),
+        'error_rate' : round(len(failures) / len(samples), 4) if samples else 0,
+        'p50_ms'     : percentile(latencies, 50),
+        'p99_ms'     : percentile(latencies, 99),
+    }
+
+@events.quitting.add_listener
+def check_results(environment, **kwargs):
+    options = environment.parsed_options
+    results = {
+        '{} {}'.format(phase, name) : summary(samples) for (phase, name), samples in sorted(recorder.samples.items())
+    }
+
+    problems = []
+    for name in PROTECTED_ROUTES:
+        baseline = results.get('baseline {}'.format(name))
+        overload = results.get('overload {}'.format(name))
+        if not baseline or not overload or baseline['p99_ms'] is None or overload['p99_ms'] is None:
+            problems.append('{}: 구간 별 요청이 충분하지 않습니다'.format(name))
+            continue
+        if overload['p99_ms'] > baseline['p99_ms'] * options.max_p99_ratio:
+            problems.append('{}: p99 {}ms -> {}ms'.format(name, baseline['p99_ms'], overload['p99_ms']))
+        if overload['error_rate'] > options.max_error_rate:
+            problems.append('{}: 과부하 구간 실패율 {}'.format(name, overload['error_rate']))
+
+    for key, result in results.items():
+        print('{:<32} requests {:>7}  rejected {:>6}  p50 {:>7}ms  p99 {:>7}ms'.format(
+            key, result['requests'], result['rejected'], result['p50_ms'], result['p99_ms']
+        ))
+    for problem in problems:
+        print('FAIL', problem)
+
+    if options.results_file:
+        with open(options.results_file, 'w', encoding='utf-8') as f:
+            json.dump({'phases' : results, 'problems' : problems}, f, ensure_ascii=False, indent=2)
+    if problems:
+        environment.process_exit_code = 1
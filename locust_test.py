@@ -1,8 +1,234 @@
-from locust import HttpUser, task, between
+"""
+sweethome/urls.py 의 모든 route를 실제 사용 비율에 가깝게 호출하는 부하 테스트
 
-class PostingReadTest(HttpUser):
-    wait_time = between(1, 2)
+준비:
+    python manage.py issue_load_tokens --users 200 --output load_tokens.json
 
-    @task
-    def my_task(self):
-        self.client.get("/posting")
\ No newline at end of file
+실행 예시 (headless, 결과를 JSON 파일로 저장):
+    locust -f locust_test.py --host http://127.0.0.1:8000 --headless -u 200 -r 20 -t 5m \
+        --token-file load_tokens.json --results-file results/v1.json
+
+- 로그인 유저는 token pool 파일에서 하나씩 가져가며, access token이 만료되면 refresh token으로 재발급한다.
+- --results-file 을 지정하면 종료 시 endpoint 별 요청 수, 실패 수, p50/p95/p99(ms), 처리량(req/s)을 저장한다.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+
+from locust import HttpUser, events, task, between
+
+# 상품 목록 filtering / 정렬 조건
+PRODUCT_QUERIES = [
+    {},
+    {'order' : 'recent'},
+    {'order' : 'old'},
+    {'order' : 'min_price'},
+    {'order' : 'max_price'},
+    {'order' : 'review'},
+    {'top'   : 'discount'},
+    {'category' : 1},
+    {'subcategory' : 1, 'order' : 'min_price'},
+    {'color' : 1, 'size' : 1},
+]
+# 게시글 목록 정렬 / filtering 조건
+POSTING_QUERIES = [
+    {},
+    {'order' : 'best'},
+    {'order' : 'popular'},
+    {'order' : 'scrap'},
+    {'order' : 'old'},
+    {'housing' : 1},
+    {'style' : 1, 'order' : 'best'},
+]
+SEARCH_QUERIES = ['소파', '침대', '조명', '수납', '거실', '원목']
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument('--token-file', default='load_tokens.json', help='issue_load_tokens 로 만든 token pool 파일')
+    parser.add_argument('--results-file', default='', help='종료 시 p50/p95/p99와 처리량을 저장할 JSON 파일')
+
+class TokenPool:
+    """ locust user 들이 token pool 파일의 유저를 돌아가며 사용한다 """
+    def __init__(self):
+        self._entries = None
+        self._cycle   = None
+        self._lock    = threading.Lock()
+
+    def next(self, path):
+        with self._lock:
+            if self._entries is None:
+                with open(path, encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                self._cycle = itertools.cycle(self._entries)
+            # 여러 locust user가 같은 유저를 쓰더라도 token은 각자 재발급하도록 복사해서 넘긴다
+            return dict(next(self._cycle))
+
+token_pool = TokenPool()
+
+class Catalog:
+    """ 상세/리뷰/좋아요 요청에 사용할 상품 id, 게시글 id 목록 (첫 요청 때 한번만 가져온다) """
+    def __init__(self):
+        self.product_ids = []
+        self.posting_ids = []
+        self._loaded     = False
+        self._lock       = threading.Lock()
+
+    def load(self, client):
+        with self._lock:
+            if self._loaded:
+                return
+            products = client.get('/products', name='/products').json().get('products', [])
+            postings = client.get('/posting', name='/posting').json().get('message', [])
+            self.product_ids = [product['id'] for product in products] or [1]
+            self.posting_ids = [posting['id'] for posting in postings] or [1]
+            self._loaded     = True
+
+catalog = Catalog()
+
+class SweetHomeUser(HttpUser):
+    """ 상품/게시글 조회 위주에 장바구니, 결제, 좋아요, 스크랩, 로그인이 섞인 traffic """
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        self.account = token_pool.next(self.environment.parsed_options.token_file)
+        catalog.load(self.client)
+
+    def headers(self):
+        return {'Authorization' : self.account['access_token']}
+
+    def authorized(self, method, url, name, **kwargs):
+        """ 로그인이 필요한 요청. access token이 만료되었으면 재발급 후 한번 더 요청한다. """
+        with self.client.request(method, url, name=name, headers=self.headers(), catch_response=True, **kwargs) as response:
+            if response.status_code == 401 and self.refresh():
+                response.success()
+            else:
+                return self.check(response)
+        with self.client.request(method, url, name=name, headers=self.headers(), catch_response=True, **kwargs) as response:
+            return self.check(response)
+
+    def refresh(self):
+        response = self.client.post(
+            '/user/token/refresh', json={'refresh_token' : self.account['refresh_token']}, name='/user/token/refresh'
+        )
+        if response.status_code != 200:
+            return False
+        self.account['access_token'] = response.json()['access_token']
+        return True
+
+    def check(self, response):
+        # 좋아요/스크랩 취소(204), 조합이 없는 상품 옵션(404)은 정상 응답으로 본다
+        if response.status_code in (200, 201, 204, 404):
+            response.success()
+        else:
+            response.failure('status {}'.format(response.status_code))
+        return response
+
+    @task(20)
+    def product_list(self):
+        self.client.get('/products', params=random.choice(PRODUCT_QUERIES), name='/products')
+
+    @task(12)
+    def product_detail(self):
+        product_id = random.choice(catalog.product_ids)
+        self.client.get('/products/{}'.format(product_id), name='/products/[id]')
+
+    @task(6)
+    def product_reviews(self):
+        product_id = random.choice(catalog.product_ids)
+        params     = random.choice([{}, {'order' : 'like'}, {'order' : 'old'}, {'rate' : [4, 5]}])
+        self.client.get('/products/{}/review'.format(product_id), params=params, name='/products/[id]/review')
+
+    @task(4)
+    def product_category(self):
+        self.client.get('/products/category', name='/products/category')
+
+    @task(15)
+    def posting_list(self):
+        self.client.get('/posting', params=random.choice(POSTING_QUERIES), headers=self.headers(), name='/posting')
+
+    @task(3)
+    def posting_category(self):
+        self.client.get('/posting/category', name='/posting/category')
+
+    @task(5)
+    def search(self):
+        self.client.get('/search', params={'query' : random.choice(SEARCH_QUERIES)}, name='/search')
+
+    @task(2)
+    def profile(self):
+        self.client.get('/user/{}/profile'.format(self.account['user_id']), name='/user/[id]/profile')
+
+    @task(4)
+    def posting_like(self):
+        self.authorized('POST', '/posting/like', '/posting/like', json={'posting_id' : random.choice(catalog.posting_ids)})
+
+    @task(2)
+    def posting_scrap(self):
+        self.authorized('POST', '/posting/scrap', '/posting/scrap', json={'posting_id' : random.choice(catalog.posting_ids)})
+
+    @task(3)
+    def cart_add(self):
+        product_id = random.choice(catalog.product_ids)
+        product    = self.client.get('/products/{}'.format(product_id), name='/products/[id]').json().get('product')
+        if not product or not product['color'] or not product['size']:
+            return
+        self.authorized('POST', '/products/cart', '/products/cart', json={
+            'id'       : product_id,
+            'color'    : random.choice(product['color']),
+            'size'     : random.choice(product['size']),
+            'quantity' : random.randint(1, 3),
+        })
+
+    @task(2)
+    def checkout(self):
+        response = self.authorized('GET', '/orders/products', '/orders/products')
+        if response.status_code != 200:
+            return
+        cart = response.json().get('results')
+        if not cart:
+            return
+        item = random.choice(cart)
+        self.authorized('POST', '/orders/products', '/orders/products', json={
+            'id'          : item['product_option_id'],
+            'quantity'    : item['quantity'],
+            'total_price' : item['product_price'] * item['quantity'],
+        })
+
+    @task(1)
+    def signin(self):
+        self.client.post('/user/signin', json={
+            'email'    : self.account['email'],
+            'password' : self.account['password'],
+        }, name='/user/signin')
+
+@events.quitting.add_listener
+def write_results(environment, **kwargs):
+    path = environment.parsed_options.results_file
+    if not path:
+        return
+
+    def summary(entry):
+        duration = max(entry.last_request_timestamp - entry.start_time, 1) if entry.last_request_timestamp else 1
+        return {
+            'requests'   : entry.num_requests,
+            'failures'   : entry.num_failures,
+            'p50_ms'     : entry.get_response_time_percentile(0.5),
+            'p95_ms'     : entry.get_response_time_percentile(0.95),
+            'p99_ms'     : entry.get_response_time_percentile(0.99),
+            'throughput' : round(entry.num_requests / duration, 2),
+        }
+
+    stats   = environment.stats
+    results = {
+        'finished_at' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host'        : environment.host,
+        'users'       : environment.runner.user_count if environment.runner else None,
+        'total'       : summary(stats.total),
+        'endpoints'   : {
+            '{} {}'.format(method, name) : summary(entry) for (name, method), entry in sorted(stats.entries.items())
+        },
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,53 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+from django.db.models            import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions  import Coalesce, TruncDate
+from django.utils                import timezone
+
+from order.models import CART_STATUS_ID, OrderProduct, ProductSalesDaily
+
+class Command(BaseCommand):
+    help = '결제된 주문으로 product_sales_daily(상품 별 일 단위 판매량 / 매출)를 다시 만든다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+            help='최근 N일(오늘 포함)만 다시 만든다. 없으면 전체 기간')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # 결제 시각 column이 없으므로 주문 생성일을 판매일로 사용한다
+        lines   = OrderProduct.objects.filter(product_option__isnull=False, order__isnull=False)\
+            .exclude(order__status_id=CART_STATUS_ID)
+        rollups = ProductSalesDaily.objects.all()
+        if options['days']:
+            since   = timezone.localdate() - datetime.timedelta(days=options['days'] - 1)
+            lines   = lines.filter(order__created_at__date__gte=since)
+            rollups = rollups.filter(date__gte=since)
+
+        revenue = ExpressionWrapper(
+            F('quantity') * F('product_option__product__original_price')
+            * (100 - Coalesce(F('product_option__product__discount_percentage'), 0)) / 100,
+            output_field=DecimalField(decimal_places=2, max_digits=14),
+        )
+        rows = lines.annotate(date=TruncDate('order__created_at'))\
+            .values('product_option__product_id', 'date')\
+            .annotate(units=Sum('quantity'), revenue=Sum(revenue))\
+            .order_by()
+
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            created    = ProductSalesDaily.objects.bulk_create([
+                ProductSalesDaily(
+                    product_id = row['product_option__product_id'],
+                    date       = row['date'],
+                    units      = row['units'],
+                    revenue    = round(row['revenue'], 2),
+                ) for row in rows.iterator()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS('{:,} rows deleted, {:,} rows created ({:.1f}s)'.format(
+            deleted, len(created), time.monotonic() - started
+        )))
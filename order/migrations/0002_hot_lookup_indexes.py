@@ -0,0 +1,40 @@
+# Generated by Django 3.1.6 on 2026-10-19 12:38
+
+from django.db        import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """ 한 주문에 같은 옵션이 여러 row로 들어있으면 수량을 합쳐서 하나만 남긴다 """
+    OrderProduct = apps.get_model('order', 'OrderProduct')
+    groups       = (
+        OrderProduct.objects.filter(order__isnull=False, product_option__isnull=False)
+        .values('order', 'product_option')
+        .annotate(keep_id=Min('id'), rows=Count('id'), total_quantity=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for group in groups:
+        OrderProduct.objects.filter(id=group['keep_id']).update(quantity=group['total_quantity'])
+        OrderProduct.objects.filter(
+            order=group['order'], product_option=group['product_option']
+        ).exclude(id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_hot_lookup_indexes'),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status'], name='orders_user_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderproduct',
+            constraint=models.UniqueConstraint(fields=('order', 'product_option'), name='order_products_order_option_unique'),
+        ),
+    ]
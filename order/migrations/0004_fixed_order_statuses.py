@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+# order.models.CART_STATUS_ID, PAID_STATUS_ID 와 같은 id. 코드가 이 id로 status를 찾는다.
+ORDER_STATUSES = {1 : '장바구니', 2 : '결제완료'}
+
+
+def create_statuses(apps, schema_editor):
+    """ 장바구니/결제완료 status를 고정 id로 만든다. 이미 있는 id는 그대로 둔다. """
+    OrderStatus = apps.get_model('order', 'OrderStatus')
+    for status_id, name in ORDER_STATUSES.items():
+        OrderStatus.objects.get_or_create(id=status_id, defaults={'name' : name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_product_sales_daily'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_statuses, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,11 @@ from django.db import models
 from user.models    import User
 from product.models import ProductOption
 
+# order_statuses의 '장바구니' row (order/migrations/0004 에서 고정 id로 만든다). 그 외 status의 주문은 결제가 끝난 주문이다.
+CART_STATUS_ID = 1
+# order_statuses의 '결제완료' row. 장바구니에서 결제하면 이 status로 바뀐다.
+PAID_STATUS_ID = 2
+
 class Order(models.Model):
     user                   = models.ForeignKey('user.User', on_delete=models.CASCADE)
     status                 = models.ForeignKey('OrderStatus', on_delete=models.CASCADE)
@@ -17,6 +22,7 @@ class Order(models.Model):
 
     class Meta:
         db_table = 'orders'
+        indexes  = [models.Index(fields=['user', 'status'], name='orders_user_status_idx')]
 
 class OrderStatus(models.Model):
     name = models.CharField(max_length=45)
@@ -32,4 +38,21 @@ class OrderProduct(models.Model):
     order          = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True)
 
     class Meta:
-        db_table = 'order_products'
\ No newline at end of file
+        db_table    = 'order_products'
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product_option'], name='order_products_order_option_unique')
+        ]
+
+class ProductSalesDaily(models.Model):
+    """ 상품 별 일 단위 판매량 / 매출 rollup (order.sales) """
+    product = models.ForeignKey('product.Product', on_delete=models.CASCADE)
+    date    = models.DateField()
+    units   = models.IntegerField(default=0)
+    revenue = models.DecimalField(decimal_places=2, max_digits=14, default=0)
+
+    class Meta:
+        db_table    = 'product_sales_daily'
+        # order=popular 정렬의 상품 별 기간 합계를 (product, date) index 범위로 읽는다
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='product_sales_daily_product_date_unique')
+        ]
@@ -0,0 +1,61 @@
+"""
+상품 별 일 단위 판매량 rollup (product_sales_daily)
+
+- 주문이 장바구니(CART_STATUS_ID) 상태를 벗어나면 order.signals 에서 record_order_sales 로 그날의 판매량과 매출을 더한다.
+- 매출은 결제 시점의 할인가(정가 x (100 - 할인율) / 100) x 수량이다.
+- bulk_create, queryset.update() 로 만들거나 바꾼 주문은 signal이 없으므로 rebuild_sales_rollup 명령으로 다시 만든다.
+- 상품 목록의 order=popular 정렬은 최근 POPULAR_SALES_WINDOW_DAYS 일의 판매량 합계(popular_units)를 사용한다.
+"""
+import datetime
+
+from decimal import Decimal
+
+from django.conf                import settings
+from django.db                  import transaction, IntegrityError
+from django.db.models           import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils               import timezone
+
+from order.models import OrderProduct, ProductSalesDaily
+
+CENT = Decimal('0.01')
+
+def sale_price(original_price, discount_percentage):
+    return (original_price * (100 - (discount_percentage or 0)) / 100).quantize(CENT)
+
+def add_sales(product_id, date, units, revenue):
+    """ F()로 더해서 동시에 결제된 주문끼리도 값이 덮어써지지 않도록 한다 """
+    rows    = ProductSalesDaily.objects.filter(product_id=product_id, date=date)
+    changes = {'units' : F('units') + units, 'revenue' : F('revenue') + revenue}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            ProductSalesDaily.objects.create(product_id=product_id, date=date, units=units, revenue=revenue)
+    except IntegrityError:
+        # 다른 요청이 먼저 같은 날의 row를 만든 경우
+        rows.update(**changes)
+
+def record_order_sales(order_id, date=None):
+    """ 주문 하나의 상품 별 수량 / 매출을 date(기본: 오늘)의 rollup에 더한다 """
+    lines = OrderProduct.objects.filter(order_id=order_id, product_option__isnull=False).values_list(
+        'product_option__product_id', 'quantity',
+        'product_option__product__original_price', 'product_option__product__discount_percentage',
+    )
+    totals = {}
+    for product_id, quantity, original_price, discount_percentage in lines:
+        units, revenue     = totals.get(product_id, (0, Decimal(0)))
+        totals[product_id] = (units + quantity, revenue + sale_price(original_price, discount_percentage) * quantity)
+
+    date = date or timezone.localdate()
+    for product_id, (units, revenue) in totals.items():
+        add_sales(product_id, date, units, revenue)
+
+def popular_units(days=None):
+    """ 상품(OuterRef('pk'))의 최근 days일(오늘 포함) 판매량 합계. 판매가 없으면 0 """
+    since = timezone.localdate() - datetime.timedelta(days=(days or settings.POPULAR_SALES_WINDOW_DAYS) - 1)
+    return Coalesce(Subquery(
+        ProductSalesDaily.objects.filter(product=OuterRef('pk'), date__gte=since).order_by().values('product')\
+            .annotate(units=Sum('units')).values('units'),
+        output_field=IntegerField()
+    ), 0)
@@ -0,0 +1,20 @@
+from django.db                import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch          import receiver
+
+from order.models import CART_STATUS_ID, Order
+from order.sales  import record_order_sales
+
+@receiver(post_init, sender=Order)
+def remember_status(sender, instance, **kwargs):
+    # deferred field(only())를 읽으면 query가 발생하므로 이미 불러온 값만 기억한다
+    instance._saved_status_id = instance.__dict__.get('status_id')
+
+@receiver(post_save, sender=Order)
+def record_checkout(sender, instance, created, **kwargs):
+    """ 장바구니 상태였던 주문이 다른 상태로 저장되면 판매량 rollup에 더한다 """
+    left_cart = not created and instance._saved_status_id == CART_STATUS_ID and instance.status_id != CART_STATUS_ID
+    instance._saved_status_id = instance.status_id
+    if left_cart:
+        # rollback 된 결제는 반영하지 않는다
+        transaction.on_commit(lambda: record_order_sales(instance.id))
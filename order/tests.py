@@ -1,3 +1,77 @@
-from django.test import TestCase
+import datetime
+import io
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test            import TestCase, TransactionTestCase, override_settings
+from django.utils           import timezone
+
+from order.models   import CART_STATUS_ID, PAID_STATUS_ID, Order, OrderProduct, OrderStatus, ProductSalesDaily
+from order.sales    import sale_price
+from product.models import Product, ProductOption
+from sweethome      import testing
+from user.models    import User
+from utils          import create_access_token
+
+import order.urls
+
+def fill_cart(size):
+    """ 데이터 크기에 비례하는 상품 수(size // 10 + 1)로 유저 1의 장바구니를 채운다 """
+    Order.objects.filter(user_id=1, status_id=CART_STATUS_ID).delete()
+    cart    = Order.objects.create(user_id=1, status_id=CART_STATUS_ID)
+    options = ProductOption.objects.order_by('id')[:size // 10 + 1]
+    OrderProduct.objects.bulk_create([
+        OrderProduct(order=cart, product_option=option, quantity=1) for option in options
+    ])
+
+def checkout(size):
+    return {'id' : ProductOption.objects.order_by('id').first().id, 'quantity' : 2, 'total_price' : 10000}
+
+class OrderQueryBudgetTest(testing.QueryBudgetTestCase):
+    urls      = order.urls
+    endpoints = [
+        testing.Endpoint('GET', '/orders/products', login=True, prepare=fill_cart),
+        testing.Endpoint('POST', '/orders/products', data=checkout, login=True, prepare=fill_cart),
+    ]
+
+class OrderStatusTest(TestCase):
+    def test_migration_creates_statuses_with_fixed_ids(self):
+        self.assertEqual(OrderStatus.objects.get(id=CART_STATUS_ID).name, '장바구니')
+        self.assertEqual(OrderStatus.objects.get(id=PAID_STATUS_ID).name, '결제완료')
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class SalesRollupTest(TransactionTestCase):
+    def setUp(self):
+        testing.seed(100)
+        self.user    = User.objects.order_by('id').first()
+        self.headers = {'HTTP_AUTHORIZATION' : create_access_token(self.user)}
+        Order.objects.filter(user=self.user, status_id=CART_STATUS_ID).delete()
+
+    def test_checkout_is_added_to_rollup_and_popular_sort(self):
+        product = Product.objects.order_by('-id').first()
+        option  = ProductOption.objects.select_related('color', 'size').filter(product=product).first()
+        cart    = {'id' : product.id, 'color' : option.color.name, 'size' : option.size.name, 'quantity' : 1}
+        self.assertEqual(self.client.post('/products/cart', cart, content_type='application/json', **self.headers).status_code, 201)
+        self.assertFalse(ProductSalesDaily.objects.filter(product=product, date=timezone.localdate()).exists())
+
+        price    = sale_price(product.original_price, product.discount_percentage)
+        checkout = {'id' : option.id, 'quantity' : 4, 'total_price' : str(price * 4)}
+        response = self.client.post('/orders/products', checkout, content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        order = Order.objects.get(user=self.user, orderproduct__product_option=option)
+        self.assertEqual(order.status_id, PAID_STATUS_ID)
+        # 같은 상태로 다시 저장해도 두번 더하지 않는다
+        order.save()
+
+        today = ProductSalesDaily.objects.get(product=product, date=timezone.localdate())
+        self.assertEqual((today.units, today.revenue), (4, price * 4))
+
+        # 기간 밖의 판매량은 정렬에 포함하지 않는다
+        other = Product.objects.exclude(id=product.id).order_by('id').first()
+        ProductSalesDaily.objects.create(product=other, date=timezone.localdate() - datetime.timedelta(days=30), units=100)
+        products = self.client.get('/products?order=popular').json()['products']
+        self.assertEqual(products[0]['id'], product.id)
+
+        # 주문 생성일 기준으로 다시 만들어도 같은 값이다
+        call_command('rebuild_sales_rollup', '--days', '1', stdout=io.StringIO())
+        self.assertEqual(ProductSalesDaily.objects.get(product=product, date=timezone.localdate()).units, 4)
@@ -1,16 +1,28 @@
 import json
 
-from django.http      import JsonResponse
 from django.views     import View
 from django.db.models import Q
 from django.db.utils  import DataError
 
+from sweethome.renderers import JsonResponse
 from user.models    import User
 from utils     import login_decorator
-from order.models   import Order, OrderStatus, OrderProduct
+from order.models   import CART_STATUS_ID, PAID_STATUS_ID, Order, OrderStatus, OrderProduct
 from product.models import Product
 
+def order_products_of(order):
+    """ 장바구니/주문 목록 응답에 필요한 상품, 옵션, 배송 정보를 한번에 가져오는 order의 OrderProduct queryset """
+    return order.orderproduct_set.select_related(
+        'product_option__color',
+        'product_option__size',
+        'product_option__product__company',
+        'product_option__product__delivery__method',
+        'product_option__product__delivery__fee',
+    ).prefetch_related('product_option__product__productimage_set')
+
 class OrderProductView(View):
+    query_budget = {'get' : 5, 'post' : 8}
+
     @login_decorator
     def get(self, request):
         """ [Order] 장바구니 목록
@@ -25,11 +37,11 @@ class OrderProductView(View):
         try:
             user = request.user
             # 장바구니 목록을 반환하는데 상품이 없을 경우 (에러상황은 아니므로 status=200)
-            if not Order.objects.filter(Q(user=user)&Q(status=1)).exists():
+            if not Order.objects.filter(Q(user=user)&Q(status=CART_STATUS_ID)).exists():
                 return JsonResponse({'message':'장바구니에 담긴 상품 없음'}, status=200)
 
-            order           = Order.objects.get(Q(user=user)&Q(status=1))
-            order_products  = order.orderproduct_set.all()
+            order           = Order.objects.get(Q(user=user)&Q(status=CART_STATUS_ID))
+            order_products  = order_products_of(order)
 
             results = [
             {
@@ -88,19 +100,23 @@ class OrderProductView(View):
 
             if not product_option_id:
                 return JsonResponse({'message' : '구매하실 상품을 선택해 주세요'}, status=400)
-            if not Order.objects.filter(Q(user=user)&Q(status=1)).exists():
+            if not Order.objects.filter(Q(user=user)&Q(status=CART_STATUS_ID)).exists():
                 return JsonResponse({'message' : '유효하지 않은 접근입니다'}, status=400)
 
-            order_product          = OrderProduct.objects.get(Q(product_option_id=product_option_id)&Q(order__status=1))
+            order_product          = OrderProduct.objects.get(
+                Q(product_option_id=product_option_id)&Q(order__user=user)&Q(order__status=CART_STATUS_ID)
+            )
             # 장바구니에 담았을때와 비교하여 최종적으로 구매한 수량으로 값 update
             order_product.quantity = quantity
             order_product.save()
 
-            order = Order.objects.get(Q(user=user)&Q(status=1))
+            order = Order.objects.get(Q(user=user)&Q(status=CART_STATUS_ID))
             # 최종 주문 후 계산된 가격
             order.total_price = total_price
+            # 결제완료 상태로 저장해야 판매량 rollup(order.signals.record_checkout)에 반영된다
+            order.status_id   = PAID_STATUS_ID
             order.save()
-            order_products = order.orderproduct_set.all()
+            order_products = order_products_of(order)
 
             # 주문 완료한 상품에 대한 list
             results = [
@@ -0,0 +1 @@
+default_app_config = 'posting.apps.PostingConfig'
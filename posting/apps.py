@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PostingConfig(AppConfig):
     name = 'posting'
+
+    def ready(self):
+        from posting import signals
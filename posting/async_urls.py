@@ -0,0 +1,8 @@
+from django.urls import path
+
+from posting.async_views import AsyncPostingView, AsyncCategoryView
+
+urlpatterns = [
+    path('', AsyncPostingView.as_view()),
+    path('/category', AsyncCategoryView.as_view()),
+]
@@ -0,0 +1,75 @@
+"""
+ASGI 서버에서 사용하는 읽기 전용 async view
+
+- sync view(posting.views)와 응답 형식은 같다.
+- 서로 독립적인 query는 asyncio.gather + run_in_db_thread 로 동시에 실행한다.
+"""
+import asyncio
+
+from posting.models import (
+    Posting,
+    PostingSize,
+    PostingHousing,
+    PostingStyle,
+    PostingSpace,
+    PostingLike,
+    PostingScrap
+)
+from posting.views  import (
+    annotate_postings,
+    filter_postings,
+    first_comments,
+    posting_row,
+    user_posting_ids,
+    SORTINGS
+)
+from sweethome.renderers import JsonResponse
+from utils          import AsyncView, run_in_db_thread, async_non_user_accept_decorator
+
+class AsyncPostingView(AsyncView):
+    query_budget = {'get' : 4}
+
+    @async_non_user_accept_decorator
+    async def get(self, request):
+        """ [Posting] 메인페이지 : 게시글 list (async)
+        Note:
+            - 게시글 목록, 로그인 유저의 좋아요 목록, 스크랩 목록을 동시에 조회한다.
+            - 첫번째 댓글은 게시글 목록에서 구한 댓글 id로 한번에 조회한다.
+            - 좋아요/댓글/스크랩 수는 sync view와 같은 annotate_postings를 사용한다.
+        """
+        user     = request.user
+        postings = filter_postings(annotate_postings(Posting.objects.select_related('user')), request.GET)
+
+        postings, liked_ids, scrapped_ids = await asyncio.gather(
+            run_in_db_thread(list, postings),
+            run_in_db_thread(user_posting_ids, PostingLike, user),
+            run_in_db_thread(user_posting_ids, PostingScrap, user),
+        )
+        comments = await run_in_db_thread(first_comments, postings)
+
+        posting_list = [posting_row(posting, liked_ids, scrapped_ids, comments) for posting in postings]
+        return JsonResponse({'message' : posting_list}, status=200)
+
+class AsyncCategoryView(AsyncView):
+    query_budget = {'get' : 4}
+
+    async def get(self, request):
+        """ [Posting] 메인페이지 : 카테고리, filtering 조건 list (async)
+        Note:
+            - 주거형태 / 공간 / 평수 / 스타일 4개의 query를 동시에 실행한다.
+        """
+        housings, spaces, sizes, styles = await asyncio.gather(*[
+            run_in_db_thread(list, model.objects.values().order_by('id'))
+            for model in (PostingHousing, PostingSpace, PostingSize, PostingStyle)
+        ])
+
+        category_condition = {
+                "categories" : [
+                    {"id" : 1, "categoryName" : "정렬",     "categoryEName" : "order",   "category" : SORTINGS},
+                    {"id" : 2, "categoryName" : "주거형태", "categoryEName" : "housing", "category" : housings},
+                    {"id" : 3, "categoryName" : "공간",     "categoryEName" : "space",   "category" : spaces},
+                    {"id" : 4, "categoryName" : "평수",     "categoryEName" : "size",    "category" : sizes},
+                    {"id" : 5, "categoryName" : "스타일",   "categoryEName" : "style",   "category" : styles},
+                ]
+            }
+        return JsonResponse({'categories' : category_condition}, status=200)
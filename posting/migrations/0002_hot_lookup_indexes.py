@@ -0,0 +1,40 @@
+# Generated by Django 3.1.6 on 2026-10-19 12:38
+
+from django.db        import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """ unique constraint를 추가하기 전에 같은 유저의 중복 좋아요/스크랩을 하나만 남긴다 """
+    for name in ('PostingLike', 'PostingScrap'):
+        model  = apps.get_model('posting', name)
+        groups = (
+            model.objects.values('user', 'posting')
+            .annotate(keep_id=Min('id'), rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for group in groups:
+            model.objects.filter(user=group['user'], posting=group['posting']).exclude(id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['created_at'], name='postings_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postinglike',
+            constraint=models.UniqueConstraint(fields=('user', 'posting'), name='posting_likes_user_posting_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='postingscrap',
+            constraint=models.UniqueConstraint(fields=('user', 'posting'), name='posting_scraps_user_posting_unique'),
+        ),
+    ]
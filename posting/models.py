@@ -17,6 +17,7 @@ class Posting(models.Model):
 
     class Meta:
         db_table = 'postings'
+        indexes  = [models.Index(fields=['created_at'], name='postings_created_at_idx')]
 
 class PostingSize(models.Model):
     name = models.CharField(max_length=45, unique=True)
@@ -47,14 +48,16 @@ class PostingLike(models.Model):
     posting = models.ForeignKey('Posting', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'posting_likes'
+        db_table    = 'posting_likes'
+        constraints = [models.UniqueConstraint(fields=['user', 'posting'], name='posting_likes_user_posting_unique')]
 
 class PostingScrap(models.Model):
     user    = models.ForeignKey('user.User', on_delete=models.CASCADE)
     posting = models.ForeignKey('Posting', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'posting_scraps'
+        db_table    = 'posting_scraps'
+        constraints = [models.UniqueConstraint(fields=['user', 'posting'], name='posting_scraps_user_posting_unique')]
 
 class PostingComment(models.Model):
     user       = models.ForeignKey('user.User', on_delete=models.CASCADE)
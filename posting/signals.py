@@ -0,0 +1,17 @@
+from posting.models       import (
+    Posting,
+    PostingComment,
+    PostingHousing,
+    PostingLike,
+    PostingScrap,
+    PostingSize,
+    PostingSpace,
+    PostingStyle,
+)
+from sweethome.querycache import invalidate_on_change
+
+for model in (
+    Posting, PostingLike, PostingScrap, PostingComment,
+    PostingHousing, PostingSpace, PostingSize, PostingStyle,
+):
+    invalidate_on_change(model)
@@ -1,3 +1,61 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from posting.models       import Posting, PostingComment, PostingLike, PostingScrap
+from sweethome            import testing
+from sweethome.querycache import query_cache
+from user.models          import User
+from utils                import create_access_token
+
+import posting.async_urls
+import posting.urls
+
+NEW_POSTING = {'size' : 1, 'housing' : 1, 'style' : 1, 'space' : 1, 'card_image' : 'https://picsum.photos/640', 'card_content' : '거실 인테리어'}
+
+def in_first_housing(size):
+    # 필터 결과가 비지 않고 댓글이 있는 게시글이 포함되도록 데이터 크기에 비례하는 수의 게시글을 옮긴다
+    Posting.objects.filter(id__lte=size // 10 + 1).update(housing_id=1)
+    PostingComment.objects.filter(id__lte=size // 10 + 1).update(posting_id=1)
+
+def clear_like(size):
+    PostingLike.objects.filter(user_id=1, posting_id=1).delete()
+
+def clear_scrap(size):
+    PostingScrap.objects.filter(user_id=1, posting_id=1).delete()
+
+class PostingQueryBudgetTest(testing.QueryBudgetTestCase):
+    urls      = posting.urls
+    endpoints = [
+        testing.Endpoint('GET', '/posting'),
+        testing.Endpoint('GET', '/posting', login=True),
+        testing.Endpoint('GET', '/posting?stream=1'),
+        testing.Endpoint('GET', '/posting?order=best&housing=1', prepare=in_first_housing),
+        testing.Endpoint('GET', '/posting/category'),
+        testing.Endpoint('POST', '/posting', data=NEW_POSTING, login=True),
+        testing.Endpoint('POST', '/posting/like', data={'posting_id' : 1}, login=True, prepare=clear_like),
+        testing.Endpoint('POST', '/posting/scrap', data={'posting_id' : 1}, login=True, prepare=clear_scrap),
+    ]
+
+class PostingAsyncQueryBudgetTest(testing.AsyncQueryBudgetTestCase):
+    urls      = posting.async_urls
+    endpoints = [
+        testing.Endpoint('GET', '/async/posting'),
+        testing.Endpoint('GET', '/async/posting', login=True),
+        testing.Endpoint('GET', '/async/posting/category'),
+    ]
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR, STREAMING_CHUNK_SIZE=4)
+class PostingStreamingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(30)
+
+    def test_streamed_list_matches_regular_list(self):
+        headers = {'HTTP_AUTHORIZATION' : create_access_token(User.objects.get(id=1))}
+        for path, login in [('/posting?order=old', False), ('/posting?order=best', True)]:
+            with self.subTest(path=path, login=login):
+                query_cache.clear()
+                regular  = self.client.get(path, **(headers if login else {}))
+                streamed = self.client.get(path + '&stream=1', **(headers if login else {}))
+
+                self.assertTrue(streamed.streaming)
+                self.assertEqual(b''.join(streamed.streaming_content), regular.content)
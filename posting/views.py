@@ -1,11 +1,14 @@
 import json
 
-from django.http            import JsonResponse
-from django.views           import View
-from django.db.models       import Count
+from django.views               import View
+from django.db                  import IntegrityError, transaction
+from django.db.models           import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
+from sweethome.querycache import query_cache, table_tag
+from sweethome.renderers  import JsonResponse
 from user.models    import User
-from utils     import login_decorator, non_user_accept_decorator
+from utils     import cache_response, login_decorator, non_user_accept_decorator, queryset_chunks, stream_json_response
 from posting.models import (
         Posting,
         PostingSize,
@@ -17,12 +20,123 @@ from posting.models import (
         PostingScrap
 )
 
+# query cache tag: 응답을 만들 때 읽는 table
+CATEGORY_TAGS     = [table_tag(model) for model in (PostingHousing, PostingSpace, PostingSize, PostingStyle)]
+POSTING_LIST_TAGS = [table_tag(model) for model in (Posting, PostingLike, PostingScrap, PostingComment, User)]
+
+# 정렬 조건에 대한 값 (CategoryView에서 사용)
+SORTINGS = [
+        {"id" : 1, "name" : "역대인기순", "Ename" : "best"},
+        {"id" : 2, "name" : "댓글많은순", "Ename" : "popular"},
+        {"id" : 3, "name" : "스크랩많은순", "Ename" : "scrap"},
+        {"id" : 4, "name" : "최신순", "Ename" : "recent"},
+        {"id" : 5, "name" : "오래된순", "Ename" : "old"}
+]
+
+def count_per_posting(model):
+    return Coalesce(Subquery(
+        model.objects.filter(posting=OuterRef('pk')).order_by().values('posting')\
+            .annotate(count=Count('id')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+def annotate_postings(postings):
+    """ 좋아요/댓글/스크랩 수와 첫번째 댓글 id를 annotate 한다.
+    Note:
+        - 세 table을 JOIN 해서 COUNT 하면 row 수가 (좋아요 x 댓글 x 스크랩) 만큼 곱해지므로 게시글 별 subquery로 계산한다.
+    """
+    return postings.annotate(
+        like_num         = count_per_posting(PostingLike),
+        comment_num      = count_per_posting(PostingComment),
+        scrap_num        = count_per_posting(PostingScrap),
+        first_comment_id = Subquery(PostingComment.objects.filter(posting=OuterRef('pk')).order_by('id').values('id')[:1]),
+    )
+
+def user_posting_ids(model, user):
+    """ 로그인 유저가 좋아요(PostingLike) / 스크랩(PostingScrap) 한 게시글 id 집합. 비회원이면 빈 집합. """
+    # LazyUser는 bool 평가 시 User를 조회하므로 None 비교를 사용한다
+    if user is None:
+        return set()
+    return set(model.objects.filter(user_id=user.id).values_list('posting_id', flat=True))
+
+def first_comments(postings):
+    """ annotate_postings 로 구한 첫번째 댓글 id로 댓글(작성자 포함)을 한번에 조회한다 {댓글 id: PostingComment} """
+    return PostingComment.objects.select_related('user').in_bulk(
+        [posting.first_comment_id for posting in postings if posting.first_comment_id]
+    )
+
+def posting_row(posting, liked_ids, scrapped_ids, comments):
+    """ PostingView 목록의 게시글 하나 """
+    return {
+        "id"                        : posting.id,
+        "card_user_image"           : posting.user.image_url,
+        "card_user_name"            : posting.user.name,
+        "card_user_introduction"    : posting.user.description,
+        "card_image"                : posting.image_url,
+        "card_content"              : posting.content,
+        "like_status"               : posting.id in liked_ids,
+        "scrap_status"              : posting.id in scrapped_ids,
+        "comments" : {
+            "comment_num"               : posting.comment_num,
+            "comment_user_image"        : comments[posting.first_comment_id].user.image_url,
+            "comment_user_name"         : comments[posting.first_comment_id].user.name,
+            "comment_content"           : comments[posting.first_comment_id].content
+            } if posting.first_comment_id in comments else {
+                "comment_num"               : 0,
+                "comment_user_image"        : None,
+                "comment_user_name"         : None,
+                "comment_content"           : None
+            },
+        "like_num"                  : posting.like_num,
+        "scrap_num"                 : posting.scrap_num,
+        "created_at"                : posting.created_at
+    }
+
+def filter_postings(postings, params):
+    """ PostingView의 query parameter(정렬, filtering 조건)를 postings queryset에 적용한다.
+    Args:
+        - postings: like_num, comment_num, scrap_num 이 annotate 된 Posting queryset
+        - params: request.GET
+    Note:
+        - PostingView와 async view(posting.async_views)가 같은 조건을 사용하도록 분리
+    """
+    order_request   = params.get('order', 'recent')
+
+    # 정렬 조건 고정 : 좋아요 많은 순 / 댓글 많은 순 / 스크랩 많은 순 / 최신순 / 오래된순
+    order_prefixes = {
+            "best"      : "-like_num",
+            "popular"   : "-comment_num",
+            "scrap"     : "-scrap_num",
+            "recent"    : "-created_at",
+            "old"       : "created_at"
+            }
+    
+    # filtering 조건 : 주거형태 / 공간형태 / 평수 / 스타일
+    filter_prefixes = {
+            'housing'    : 'housing_id__in',
+            'space'      : 'space_id__in',
+            'size'       : 'size_id__in',
+            'style'      : 'style_id__in'
+            }
+
+    # request.GET 으로 "filter_prefixes"에 있는 key와 그에 대한 값이 존재할 경우 해당 로직 수행 / id로 받은 값들
+    filter_set = {
+            filter_prefixes.get(key) : value for (key, value) in dict(params).items() 
+            if filter_prefixes.get(key)
+            }
+
+    # 결정된 정렬조건과 filtering 조건에 맞게 Posting 객체들을 변수에 담는다.
+    return postings.filter(**filter_set).order_by(order_prefixes[order_request])
+
 class PostingView(View):
+    query_budget = {'get' : 4, 'post' : 2}
+
     @non_user_accept_decorator
     def get(self, request):
         """ [Posting] 메인페이지 : 게시글 list
         Args:
             - order_request : query parameter로 들어올 "정렬"조건이 들어있는 dict 형식. 값이 들어오지 않을 경우 기본으로 "최신순"으로 정렬되도록 함.
+            - stream : 값이 있으면 목록을 StreamingHttpResponse로 chunk 단위로 나눠서 보낸다 (export 등 전체 목록 조회용)
         User:
             - 비회원일 경우 "request.user"에 None을 담는 decorator 작성 (non_user_accept_decorator)
         Returns: 
@@ -30,66 +144,35 @@ class PostingView(View):
         """
 
         user            = request.user
-        postings        = Posting.objects.prefetch_related('comment').select_related('user').all()
-        order_request   = request.GET.get('order', 'recent')
-
-        # 좋아요, 댓글, 스크랩 순으로 정렬하기 위해 해당 값을 "count"메소드를 사용해 계산하고 query를 annotate 한다.
-        postings        = postings.annotate(
-                            like_num=Count("postinglike"),
-                            comment_num=Count("comment"),
-                            scrap_num=Count("postingscrap")
-                            )
-        # 정렬 조건 고정 : 좋아요 많은 순 / 댓글 많은 순 / 스크랩 많은 순 / 최신순 / 오래된순
-        order_prefixes = {
-                "best"      : "-like_num",
-                "popular"   : "-comment_num",
-                "scrap"     : "-scrap_num",
-                "recent"    : "-created_at",
-                "old"       : "created_at"
-                }
-        
-        # filtering 조건 : 주거형태 / 공간형태 / 평수 / 스타일
-        filter_prefixes = {
-                'housing'    : 'housing_id__in',
-                'space'      : 'space_id__in',
-                'size'       : 'size_id__in',
-                'style'      : 'style_id__in'
-                }
-
-        # request.GET 으로 "filter_prefixes"에 있는 key와 그에 대한 값이 존재할 경우 해당 로직 수행 / id로 받은 값들
-        filter_set = {
-                filter_prefixes.get(key) : value for (key, value) in dict(request.GET).items() 
-                if filter_prefixes.get(key)
-                }
 
+        # 좋아요, 댓글, 스크랩 순으로 정렬하기 위해 해당 값을 계산해서 query에 annotate 한다.
+        postings        = annotate_postings(Posting.objects.select_related('user'))
         # 결정된 정렬조건과 filtering 조건에 맞게 Posting 객체들을 변수에 담는다.
-        postings = postings.filter(**filter_set).order_by(order_prefixes[order_request])
-        
-        # posting_list 변수에 Posting 객체 각각을 담는다.
-        posting_list = [{
-                "id"                        : posting.id,
-                "card_user_image"           : posting.user.image_url,
-                "card_user_name"            : posting.user.name,
-                "card_user_introduction"    : posting.user.description,
-                "card_image"                : posting.image_url,
-                "card_content"              : posting.content,
-                "like_status"               : posting.postinglike_set.filter(user=user).exists(),
-                "scrap_status"              : posting.postingscrap_set.filter(user=user).exists(),
-                "comments" : {
-                    "comment_num"               : posting.comment.count(),
-                    "comment_user_image"        : posting.comment.first().user.image_url,
-                    "comment_user_name"         : posting.comment.first().user.name,
-                    "comment_content"           : posting.comment.first().content
-                    } if posting.comment.exists() else {
-                        "comment_num"               : 0,
-                        "comment_user_image"        : None,
-                        "comment_user_name"         : None,
-                        "comment_content"           : None
-                    },
-                "like_num"                  : posting.postinglike_set.filter(posting_id=posting.id).count(),
-                "scrap_num"                 : posting.postingscrap_set.filter(posting_id=posting.id).count(),
-                "created_at"                : posting.created_at
-                } for posting in postings
+        postings        = filter_postings(postings, request.GET)
+
+        # 게시글 마다 query를 실행하지 않도록 좋아요/스크랩 여부와 첫번째 댓글은 한번에 조회한다.
+        liked_ids    = user_posting_ids(PostingLike, user)
+        scrapped_ids = user_posting_ids(PostingScrap, user)
+
+        # ?stream=1: 게시글 전체를 chunk 단위로 가져와(첫번째 댓글도 chunk 마다 조회) 직렬화하면서 바로 응답한다
+        if request.GET.get('stream'):
+            rows = (
+                posting_row(posting, liked_ids, scrapped_ids, comments)
+                for chunk in queryset_chunks(postings)
+                for comments in [first_comments(chunk)]
+                for posting in chunk
+            )
+            return stream_json_response('message', rows)
+
+        # 유저와 무관한 게시글 목록은 query cache에 저장하고, 유저 별 좋아요/스크랩 여부만 매번 채운다
+        def shared_rows():
+            posting_list = list(postings)
+            comments     = first_comments(posting_list)
+            return [posting_row(posting, set(), set(), comments) for posting in posting_list]
+
+        posting_list = [
+            dict(row, like_status=row['id'] in liked_ids, scrap_status=row['id'] in scrapped_ids)
+            for row in query_cache.get_or_set('posting-list', request.GET, POSTING_LIST_TAGS, shared_rows)
         ]
         return JsonResponse({'message' : posting_list}, status=200)
 
@@ -148,6 +231,9 @@ class PostingView(View):
             return JsonResponse({'message' : 'KEY_ERROR'}, status=400)
 
 class CategoryView(View):
+    query_budget = {'get' : 4}
+
+    @cache_response(CATEGORY_TAGS)
     def get(self, request):
         """ [Posting] 메인페이지 : 카테고리, filtering 조건 list
         Returns: 
@@ -157,13 +243,7 @@ class CategoryView(View):
             - filtering조건들이 각각 정규화 되어 있기 때문에 코드상에서 직접 id를 지정해줌
         """
         # 정렬 조건에 대한 값
-        sortings    = [
-                {"id" : 1, "name" : "역대인기순", "Ename" : "best"},
-                {"id" : 2, "name" : "댓글많은순", "Ename" : "popular"},
-                {"id" : 3, "name" : "스크랩많은순", "Ename" : "scrap"},
-                {"id" : 4, "name" : "최신순", "Ename" : "recent"},
-                {"id" : 5, "name" : "오래된순", "Ename" : "old"}
-        ]
+        sortings    = SORTINGS
         
         # 정렬조건과 filtering 조건을 하나의 table에 작성된 값 처럼 id를 지정해줌.
         category_condition = {
@@ -202,6 +282,8 @@ class CategoryView(View):
         return JsonResponse({'categories' : category_condition}, status=200)
 
 class PostingLikeView(View):
+    query_budget = {'post' : 6}
+
     @login_decorator
     def post(self, request):
         """ [Posting] 메인페이지 : 게시글 좋아요 기능
@@ -224,10 +306,17 @@ class PostingLikeView(View):
             PostingLike.objects.filter(user_id=user.id, posting_id=posting_id).delete()
             return JsonResponse({'message' : '게시물 좋아요 취소'}, status=204)
         
-        PostingLike.objects.create(user_id=user.id, posting_id=posting_id)
+        try:
+            with transaction.atomic():
+                PostingLike.objects.create(user_id=user.id, posting_id=posting_id)
+        except IntegrityError:
+            # 같은 요청이 동시에 들어와 다른 요청이 먼저 만든 경우 (user, posting unique)
+            pass
         return JsonResponse({'message' : '게시물 좋아요 완료'}, status=201)
 
 class PostingScrapView(View):
+    query_budget = {'post' : 6}
+
     @login_decorator
     def post(self, request):
         """ [Posting] 메인페이지 : 게시글 스크랩 기능
@@ -243,12 +332,16 @@ class PostingScrapView(View):
         user       = request.user
         posting_id = data['posting_id']
 
-        if not PostingScrap.objects.get(posting_id=posting_id):
+        if not Posting.objects.filter(id=posting_id).exists():
             return JsonResponse({'message' : '존재하지 않는 posting 입니다'}, status=400)
 
         if PostingScrap.objects.filter(user_id=user.id, posting_id=posting_id):
             PostingScrap.objects.filter(user_id=user.id, posting_id=posting_id).delete()
             return JsonResponse({'message' : '게시물 스크랩 취소'}, status=204)
 
-        PostingScrap.objects.create(user_id=user.id, posting_id=posting_id)
+        try:
+            with transaction.atomic():
+                PostingScrap.objects.create(user_id=user.id, posting_id=posting_id)
+        except IntegrityError:
+            pass
         return JsonResponse({'message' : '게시물 스크랩 완료'}, status=201)
\ No newline at end of file
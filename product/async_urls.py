@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .async_views import AsyncProductView, AsyncProductDetailView, AsyncCategoryView
+
+urlpatterns = [
+    path('', AsyncProductView.as_view()),
+    path('/<int:product_id>', AsyncProductDetailView.as_view()),
+    path('/category', AsyncCategoryView.as_view()),
+]
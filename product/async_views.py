@@ -0,0 +1,148 @@
+"""
+ASGI 서버에서 사용하는 읽기 전용 async view
+
+- sync view(product.views)와 응답 형식은 같다.
+- 서로 독립적인 query는 asyncio.gather + run_in_db_thread 로 동시에 실행한다.
+"""
+import asyncio
+
+from django.db.models import Avg, Count
+
+from product.models import (
+    Product,
+    ProductImage,
+    ProductReview,
+    ProductOption,
+    Category,
+    SubCategory,
+    DetailCategory
+)
+from product.ratings import get_summary, rating_stats
+from product.views  import filter_products
+from sweethome.renderers import JsonResponse
+from utils          import AsyncView, run_in_db_thread
+
+def first_images(product_ids):
+    images = {}
+    for product_id, image_url in ProductImage.objects.filter(product_id__in=product_ids)\
+            .order_by('id').values_list('product_id', 'image_url'):
+        images.setdefault(product_id, image_url)
+    return images
+
+def review_stats(product_ids):
+    return {
+        row['product_id'] : (row['rate_average'], row['review_count'])
+        for row in ProductReview.objects.filter(product_id__in=product_ids)\
+            .values('product_id').annotate(rate_average=Avg('rate'), review_count=Count('id'))
+    }
+
+class AsyncCategoryView(AsyncView):
+    query_budget = {'get' : 3}
+
+    async def get(self, request):
+        """ [Product] 상품의 category list 반환 (async)
+        Note:
+            - 메인 / 서브 / 상세 카테고리 3개의 query를 동시에 실행한 뒤 python에서 합친다.
+        """
+        categories, sub_categories, detail_categories = await asyncio.gather(
+            run_in_db_thread(list, Category.objects.order_by('id').values('id', 'name')),
+            run_in_db_thread(list, SubCategory.objects.order_by('id').values('id', 'name', 'category_id')),
+            run_in_db_thread(list, DetailCategory.objects.order_by('id').values('id', 'name', 'sub_category_id')),
+        )
+
+        detail_by_sub = {}
+        for detail_category in detail_categories:
+            detail_by_sub.setdefault(detail_category['sub_category_id'], []).append({
+                'id'   : detail_category['id'],
+                'name' : detail_category['name']
+            })
+        sub_by_category = {}
+        for sub_category in sub_categories:
+            sub_by_category.setdefault(sub_category['category_id'], []).append({
+                'id'              : sub_category['id'],
+                'name'            : sub_category['name'],
+                'detail_category' : detail_by_sub.get(sub_category['id'], [])
+            })
+
+        category_list = [{
+            'id'           : category['id'],
+            'name'         : category['name'],
+            'sub_category' : sub_by_category.get(category['id'], [])
+        } for category in categories]
+        return JsonResponse({'categories': category_list}, status=200)
+
+class AsyncProductView(AsyncView):
+    query_budget = {'get' : 3}
+
+    async def get(self, request):
+        """ [Product] 상품 list (async)
+        Note:
+            - 조건에 맞는 상품 row를 가져온 뒤, 대표 이미지와 리뷰 집계(평균 별점, 리뷰 수) query를 동시에 실행한다.
+        """
+        products = filter_products(Product.objects.select_related('company', 'delivery__fee'), request.GET)
+        products = await run_in_db_thread(list, products)
+
+        product_ids   = [product.id for product in products]
+        images, stats = await asyncio.gather(
+            run_in_db_thread(first_images, product_ids),
+            run_in_db_thread(review_stats, product_ids),
+        )
+
+        products_list = [{
+            'id'                  : product.id,
+            'name'                : product.name,
+            'discount_percentage' : int(product.discount_percentage),
+            'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
+            'company'             : product.company.name,
+            'image'               : images.get(product.id),
+            'rate_average'        : round(stats[product.id][0], 1) if product.id in stats else 0,
+            'review_count'        : stats[product.id][1] if product.id in stats else 0,
+            'is_free_delivery'    : product.delivery.fee.price == 0,
+            'is_on_sale'          : not (int(product.discount_percentage) == 0),
+            } for product in products
+        ]
+        return JsonResponse({'products' : products_list, 'count' : len(products_list)}, status=200)
+
+class AsyncProductDetailView(AsyncView):
+    query_budget = {'get' : 3}
+
+    async def get(self, request, product_id):
+        """ [Product] 상품 상세 페이지 (async)
+        Note:
+            - 상품(별점 분포 포함), 이미지, 옵션 query가 모두 product_id 만으로 조회 가능하므로 3개를 동시에 실행한다.
+        """
+        products, images, options = await asyncio.gather(
+            run_in_db_thread(list, Product.objects.filter(id=product_id).select_related(
+                'company', 'delivery__method', 'delivery__period', 'delivery__fee', 'rating_summary'
+            )),
+            run_in_db_thread(list, ProductImage.objects.filter(product_id=product_id)\
+                .order_by('id').values_list('image_url', flat=True)),
+            run_in_db_thread(list, ProductOption.objects.filter(product_id=product_id)\
+                .values_list('size__name', 'color__name')),
+        )
+        if not products:
+            return JsonResponse({'message':'존재하지 않는 상품입니다'}, status=404)
+
+        product = products[0]
+        stats   = rating_stats(await run_in_db_thread(get_summary, product))
+
+        product_detail = {
+            'id'                  : product.id,
+            'name'                : product.name,
+            'original_price'      : int(product.original_price),
+            'discount_percentage' : int(product.discount_percentage),
+            'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
+            'company'             : product.company.name,
+            'image'               : images,
+            'rate_average'        : stats['rate_average'],
+            'review_count'        : stats['review_count'],
+            'rating_histogram'    : stats['rating_histogram'],
+            'delivery_type'       : product.delivery.method.name,
+            'delivery_period'     : product.delivery.period.day,
+            'delivery_fee'        : product.delivery.fee.price,
+            'is_free_delivery'    : product.delivery.fee.price == 0,
+            'is_on_sale'          : not (int(product.discount_percentage) == 0),
+            'size'                : list(set(size for size, _ in options)),
+            'color'               : list(set(color for _, color in options)),
+        }
+        return JsonResponse({'product': product_detail}, status=200)
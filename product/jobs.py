@@ -0,0 +1,16 @@
+import io
+
+from django.core.management import call_command
+
+from job.queue import task
+
+@task('product.build_related_products', max_attempts=3)
+def build_related_products(full=False):
+    """ 함께 구매한 상품 추천을 다시 계산한다 (numpy/scipy는 worker에서만 import 한다) """
+    from product import related
+    related.build(full=full)
+
+@task('product.recount_ratings')
+def recount_ratings():
+    """ product_rating_summaries를 실제 COUNT 값으로 다시 계산한다 """
+    call_command('recount_rating_summaries', stdout=io.StringIO())
@@ -0,0 +1,37 @@
+import time
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = '결제된 주문으로 함께 구매한 상품 추천(related_products)을 계산한다. 기본은 새 주문만 반영하는 증분 계산'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='저장된 상태를 버리고 전체 주문으로 다시 계산한다')
+        parser.add_argument('--state', default=settings.RELATED_PRODUCTS_STATE, help='공동 구매 행렬을 저장하는 .npz 파일')
+        parser.add_argument('--top-k', type=int, default=settings.RELATED_PRODUCTS_TOP_K)
+        parser.add_argument('--min-support', type=int, default=settings.RELATED_PRODUCTS_MIN_SUPPORT)
+        parser.add_argument('--batch-size', type=int, default=settings.RELATED_PRODUCTS_BATCH_SIZE,
+            help='한번에 읽는 주문 수')
+
+    def handle(self, *args, **options):
+        try:
+            from product import related
+        except ImportError as error:
+            raise CommandError('numpy, scipy가 필요합니다 ({})'.format(error))
+
+        started = time.monotonic()
+        try:
+            result = related.build(
+                full        = options['full'],
+                state_path  = options['state'],
+                top_k       = options['top_k'],
+                min_support = options['min_support'],
+                batch_size  = options['batch_size'],
+            )
+        except related.BuildInProgress as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            '{orders:,} new orders, {products:,} products updated, {pairs:,} pairs'.format(**result)
+            + ' ({:.1f}s)'.format(time.monotonic() - started)
+        ))
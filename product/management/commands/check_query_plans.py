@@ -0,0 +1,177 @@
+import re
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import connections
+from django.test                 import Client, override_settings
+
+from sweethome.querylog import QueryRecorder, recording
+from user.models        import User
+from utils              import create_access_token
+
+# 실행 계획을 확인할 GET 요청 (path, 로그인 여부)
+ENDPOINTS = [
+    ('/products', False),
+    ('/products?order=recent', False),
+    ('/products?order=review', False),
+    ('/products?order=popular', False),
+    ('/products?top=discount', False),
+    ('/products?category=1&order=min_price', False),
+    ('/products/1', False),
+    ('/products/1/related', False),
+    ('/products/1/review', False),
+    ('/products/1/review?rate=5', False),
+    ('/products/1/review?rate=4&rate=5', False),
+    ('/products/1/review?order=like', False),
+    ('/products/category', False),
+    ('/posting', False),
+    ('/posting', True),
+    ('/posting?order=best', False),
+    ('/posting?housing=1', False),
+    ('/posting/category', False),
+    ('/orders/products', True),
+    ('/user/1/profile', False),
+]
+
+# 설계상 피할 수 없는 full scan / filesort는 (path, table) 단위로 허용한다
+# - 전체 목록을 반환하는 endpoint는 table 전체를 읽는다
+# - 좋아요 수처럼 계산된 값으로 정렬하거나, filtering 된 일부 row를 정렬하는 경우는 filesort가 필요하다
+ALLOWED = {
+    ('/products', 'products')                              : ('scan',),
+    ('/products?order=recent', 'products')                 : ('scan', 'filesort'),
+    ('/products?order=review', 'products')                 : ('scan', 'filesort'),
+    ('/products?order=popular', 'products')                : ('scan', 'filesort'),
+    ('/products?top=discount', 'products')                 : ('scan', 'filesort'),
+    ('/products/1/review?order=like', 'product_reviews')   : ('filesort',),
+    ('/posting', 'postings')                               : ('scan',),
+    ('/posting?order=best', 'postings')                    : ('scan', 'filesort'),
+    ('/posting?housing=1', 'postings')                     : ('filesort',),
+}
+
+SQLITE_TABLE_RE = re.compile(r'^(SCAN|SEARCH)(?: TABLE)? (\w+)(.*)$')
+# subquery, self join에서 Django가 붙이는 table alias (FROM "posting_likes" U0, INNER JOIN `users` T4)
+TABLE_ALIAS_RE  = re.compile(r'[`"](\w+)[`"] (?:AS )?([A-Z]\d+)\b')
+
+class Problem:
+    def __init__(self, path, kind, table, rows, sql, plan):
+        self.path  = path
+        self.kind  = kind
+        self.table = table
+        self.rows  = rows
+        self.sql   = sql
+        self.plan  = plan
+
+    def __str__(self):
+        return '{} {} on {} ({} rows)\n    {}\n    {}'.format(self.path, self.kind, self.table, self.rows, self.sql, self.plan)
+
+class Command(BaseCommand):
+    help = 'view의 주요 query를 EXPLAIN 해서 큰 table의 full table scan, filesort가 있으면 실패한다 (seed_dataset 이후 실행)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+            help='이 row 수보다 작은 table의 full scan, filesort는 무시한다')
+        parser.add_argument('--verbose-plans', action='store_true',
+            help='문제가 없는 query의 실행 계획도 출력한다')
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('id').first()
+        if not user:
+            raise CommandError('데이터가 없습니다. seed_dataset 으로 데이터를 먼저 만드세요.')
+
+        self.min_rows    = options['min_rows']
+        self.verbose     = options['verbose_plans']
+        self.table_sizes = {}
+        client           = Client()
+        token            = create_access_token(user)
+        problems         = []
+
+        # cache에 남은 응답은 query를 실행하지 않으므로 모든 cache를 DummyCache로 바꿔서 요청마다 query를 실행한다
+        # (같은 path를 로그인 여부만 바꿔서 다시 요청하는 경우도 cache에 가려지지 않고, 운영 cache의 값은 건드리지 않는다)
+        dummy_caches = {alias : {'BACKEND' : 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES}
+        with override_settings(CACHES=dummy_caches):
+            for path, login in ENDPOINTS:
+                headers  = {'HTTP_AUTHORIZATION' : token} if login else {}
+                recorder = QueryRecorder(keep_statements=True)
+                with recording(recorder):
+                    response = client.get(path, **headers)
+                if response.status_code >= 500:
+                    raise CommandError('{} 요청이 실패했습니다 ({})'.format(path, response.status_code))
+
+                statements = {(alias, sql, tuple(params or ())) for alias, sql, params in recorder.statements}
+                for alias, sql, params in sorted(statements, key=str):
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    problems += self.inspect(path, connections[alias], sql, params)
+
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(str(problem)))
+        if problems:
+            raise CommandError('{}개의 query에서 full table scan 또는 filesort가 발견되었습니다'.format(len(problems)))
+        self.stdout.write(self.style.SUCCESS('{}개 endpoint의 실행 계획에 문제가 없습니다'.format(len(ENDPOINTS))))
+
+    def inspect(self, path, connection, sql, params):
+        aliases = dict((alias, table) for table, alias in TABLE_ALIAS_RE.findall(sql))
+        if connection.vendor == 'mysql':
+            findings, plan = self.explain_mysql(connection, sql, params)
+        elif connection.vendor == 'sqlite':
+            findings, plan = self.explain_sqlite(connection, sql, params)
+        else:
+            raise CommandError('{} 는 지원하지 않는 DB 입니다'.format(connection.vendor))
+
+        if self.verbose:
+            self.stdout.write('{}\n    {}\n    {}'.format(path, sql, plan))
+        problems = []
+        for kind, table in findings:
+            table = aliases.get(table, table)
+            rows  = self.table_size(connection, table)
+            if rows >= self.min_rows and kind not in ALLOWED.get((path, table), ()):
+                problems.append(Problem(path, kind, table, rows, sql, plan))
+        return problems
+
+    def explain_mysql(self, connection, sql, params):
+        """ type = ALL 이면 full table scan, Extra에 Using filesort 가 있으면 filesort """
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows    = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        findings = []
+        for row in rows:
+            table = row['table'] or ''
+            if table.startswith('<'):
+                # derived table, union 결과 등은 원본 table의 행에서 확인한다
+                continue
+            if row['type'] == 'ALL':
+                findings.append(('scan', table))
+            if 'Using filesort' in (row['Extra'] or ''):
+                findings.append(('filesort', table))
+        plan = ' | '.join('{table}:{type}:{key}:{Extra}'.format(**row) for row in rows)
+        return findings, plan
+
+    def explain_sqlite(self, connection, sql, params):
+        """ 'SCAN table' (covering index 없이) 이면 full table scan, 'USE TEMP B-TREE FOR ORDER BY' 이면 filesort """
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+
+        findings = []
+        outer    = None
+        for detail in details:
+            match = SQLITE_TABLE_RE.match(detail)
+            if match:
+                operation, table, rest = match.groups()
+                outer = outer or table
+                if operation == 'SCAN' and 'INDEX' not in rest:
+                    findings.append(('scan', table))
+            elif 'TEMP B-TREE FOR ORDER BY' in detail and outer:
+                # 정렬 대상은 가장 바깥쪽 loop의 table 기준으로 보고한다
+                findings.append(('filesort', outer))
+        return findings, ' | '.join(details)
+
+    def table_size(self, connection, table):
+        key = (connection.alias, table)
+        if key not in self.table_sizes:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM {}'.format(connection.ops.quote_name(table)))
+                self.table_sizes[key] = cursor.fetchone()[0]
+        return self.table_sizes[key]
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import time
+
+from decimal   import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management      import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import transaction
+
+from product.models        import (
+    DetailCategory,
+    Product,
+    ProductColor,
+    ProductCompany,
+    ProductDelivery,
+    ProductImage,
+    ProductOption,
+    ProductRatingSummary,
+    ProductSize,
+)
+from sweethome.querycache import query_cache, row_tag, table_tag
+
+# 상품을 다시 가져올 때 덮어쓰는 필드
+UPDATE_FIELDS = ['detail_category', 'original_price', 'discount_percentage', 'company', 'delivery']
+# 출력할 오류 row 수
+MAX_REPORTED_ERRORS = 20
+
+def read_rows(path, file_format):
+    with open(path, encoding='utf-8', newline='') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                # 깨진 줄은 중단하지 않고 validate에서 건너뛴 row로 센다
+                yield error
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def split_list(value):
+    """ JSONL은 list 그대로, CSV는 '|'로 구분된 문자열 """
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in (value or '').split('|') if item.strip()]
+
+def parse_options(value):
+    """ [{'color': .., 'size': ..}] 또는 CSV의 '색상:사이즈|색상:사이즈' -> [(색상, 사이즈)] """
+    options = []
+    for option in split_list(value):
+        if isinstance(option, dict):
+            color, size = option.get('color'), option.get('size')
+        else:
+            color, _, size = option.partition(':')
+        if not color or not size:
+            raise ValueError('옵션은 색상과 사이즈가 모두 필요합니다: {}'.format(option))
+        options.append((str(color).strip(), str(size).strip()))
+    return options
+
+class Command(BaseCommand):
+    help = (
+        'JSONL/CSV 상품 파일을 chunk 단위로 가져온다. 같은 이름의 상품이 있으면 덮어쓴다. '
+        '(name, category, sub_category, detail_category, company, original_price, [discount_percentage], '
+        'delivery_type, delivery_period, [delivery_fee], [images], [options])'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None,
+            help='파일 형식. 지정하지 않으면 확장자로 판단한다.')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+            help='한 transaction에서 처리할 상품 row 수')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='bulk_create / bulk_update 한번에 보낼 row 수')
+
+    def handle(self, *args, **options):
+        path        = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        if not os.path.exists(path):
+            raise CommandError('file not found: {}'.format(path))
+
+        self.batch_size = options['batch_size']
+        self.read       = 0
+        self.created    = 0
+        self.updated    = 0
+        self.skipped    = 0
+        self.started    = time.monotonic()
+        self.load_lookups()
+
+        updated_ids = []
+        for rows in chunked(read_rows(path, file_format), options['chunk_size']):
+            products     = self.validate(rows)
+            self.read   += len(rows)
+            updated_ids += self.import_chunk(products)
+            self.report()
+
+        # 색인과 cache는 row 마다가 아니라 마지막에 한번만 갱신한다
+        # (bulk_create / bulk_update 는 search, querycache의 signal을 보내지 않는다)
+        if self.created or self.updated:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            query_cache.invalidate(
+                *[table_tag(model) for model in (Product, ProductImage, ProductOption, ProductCompany, ProductColor, ProductSize)],
+                *[row_tag(Product, product_id) for product_id in updated_ids]
+            )
+        self.stdout.write(self.style.SUCCESS('done ({:.1f}s)'.format(time.monotonic() - self.started)))
+
+    def load_lookups(self):
+        """ 이름 -> id map. 회사, 색상, 사이즈는 없으면 만들고, 카테고리와 배송 조건은 이미 있어야 한다. """
+        self.detail_categories = {
+            (category, sub_category, name) : detail_id for detail_id, category, sub_category, name in
+            DetailCategory.objects.values_list('id', 'sub_category__category__name', 'sub_category__name', 'name')
+        }
+        self.deliveries = {
+            (method, day, fee) : delivery_id for delivery_id, method, day, fee in ProductDelivery.objects.values_list(
+                'id', 'method__name', 'period__day', 'fee__price'
+            )
+        }
+        self.companies = dict(ProductCompany.objects.values_list('name', 'id'))
+        self.colors    = dict(ProductColor.objects.values_list('name', 'id'))
+        self.sizes     = dict(ProductSize.objects.values_list('name', 'id'))
+
+    def validate(self, rows):
+        """ 이름 -> 정리된 row. 파일 안에서 같은 이름이 다시 나오면 뒤의 row를 사용한다. JSON이 아닌 줄도 건너뛴 row로 센다. """
+        products = {}
+        for number, row in enumerate(rows, self.read + 1):
+            try:
+                if isinstance(row, json.JSONDecodeError):
+                    raise row
+                products[row['name'].strip()] = self.parse(row)
+            except (KeyError, TypeError, ValueError, InvalidOperation, AttributeError) as error:
+                self.skipped += 1
+                if self.skipped <= MAX_REPORTED_ERRORS:
+                    self.stderr.write('row {}: {!r} {}'.format(number, error, row.get('name', '') if isinstance(row, dict) else ''))
+        return products
+
+    def parse(self, row):
+        name = row['name'].strip()
+        if not name or len(name) > Product._meta.get_field('name').max_length:
+            raise ValueError('상품명이 비어있거나 너무 깁니다')
+        if not row['company'].strip():
+            raise ValueError('회사명이 필요합니다')
+        names    = (row['category'].strip(), row['sub_category'].strip(), row['detail_category'].strip())
+        fee      = row.get('delivery_fee')
+        delivery = (row['delivery_type'].strip(), int(row['delivery_period']), int(fee) if fee not in (None, '') else None)
+        if names not in self.detail_categories:
+            raise ValueError('존재하지 않는 카테고리입니다: {}'.format(' > '.join(names)))
+        if delivery not in self.deliveries:
+            raise ValueError('존재하지 않는 배송 조건입니다: {}'.format(delivery))
+        return {
+            'detail_category_id'  : self.detail_categories[names],
+            'delivery_id'         : self.deliveries[delivery],
+            'company'             : row['company'].strip(),
+            'original_price'      : Decimal(str(row['original_price'])),
+            'discount_percentage' : Decimal(str(row.get('discount_percentage') or 0)),
+            # images가 없는 row는 기존 이미지를 그대로 둔다
+            'images'              : split_list(row['images']) if row.get('images') else None,
+            'options'             : parse_options(row.get('options')),
+        }
+
+    def resolve(self, lookup, model, names):
+        """ lookup(이름 -> id)에 없는 이름을 한번에 만들고 id를 채운다 """
+        missing = set(names) - set(lookup)
+        if missing:
+            # 동시에 실행된 다른 import가 먼저 만든 이름은 무시한다 (name unique)
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            lookup.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def import_chunk(self, products):
+        """ chunk 하나를 한 transaction으로 upsert 하고, 덮어쓴 상품 id를 반환한다 """
+        if not products:
+            return []
+        with transaction.atomic():
+            self.resolve(self.companies, ProductCompany, [product['company'] for product in products.values()])
+            self.resolve(self.colors, ProductColor, [color for product in products.values() for color, _ in product['options']])
+            self.resolve(self.sizes, ProductSize, [size for product in products.values() for _, size in product['options']])
+
+            def build(name, product, product_id=None):
+                return Product(
+                    id                  = product_id,
+                    name                = name,
+                    detail_category_id  = product['detail_category_id'],
+                    original_price      = product['original_price'],
+                    discount_percentage = product['discount_percentage'],
+                    company_id          = self.companies[product['company']],
+                    delivery_id         = product['delivery_id'],
+                )
+
+            existing = dict(Product.objects.filter(name__in=list(products)).values_list('name', 'id'))
+            Product.objects.bulk_update(
+                [build(name, products[name], product_id) for name, product_id in existing.items()],
+                UPDATE_FIELDS, batch_size=self.batch_size
+            )
+            Product.objects.bulk_create(
+                [build(name, product) for name, product in products.items() if name not in existing],
+                batch_size=self.batch_size
+            )
+            # bulk_create는 DB에 따라 id를 돌려주지 않으므로 이름으로 다시 읽는다
+            product_ids = dict(Product.objects.filter(name__in=list(products)).values_list('name', 'id'))
+            new_ids     = [product_ids[name] for name in products if name not in existing]
+
+            # 이미지는 통째로 바꾸고, 옵션은 장바구니/주문이 참조하므로 지우지 않고 없는 조합만 추가한다
+            ProductImage.objects.filter(product_id__in=[
+                product_id for name, product_id in existing.items() if products[name]['images'] is not None
+            ]).delete()
+            ProductImage.objects.bulk_create([
+                ProductImage(product_id=product_ids[name], image_url=image_url)
+                for name, product in products.items() if product['images'] is not None
+                for image_url in product['images']
+            ], batch_size=self.batch_size)
+            ProductOption.objects.bulk_create([
+                ProductOption(product_id=product_ids[name], color_id=self.colors[color], size_id=self.sizes[size])
+                for name, product in products.items()
+                for color, size in product['options']
+            ], batch_size=self.batch_size, ignore_conflicts=True)
+            # 새 상품은 리뷰가 없으므로 별점 분포를 0으로 만들어서 첫 조회 때 다시 계산하지 않도록 한다
+            ProductRatingSummary.objects.bulk_create(
+                [ProductRatingSummary(product_id=product_id) for product_id in new_ids],
+                batch_size=self.batch_size, ignore_conflicts=True
+            )
+
+        self.created += len(new_ids)
+        self.updated += len(existing)
+        return list(existing.values())
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write('read {:,} / created {:,} / updated {:,} / skipped {:,} ({:,.0f} rows/s)'.format(
+            self.read, self.created, self.updated, self.skipped, self.read / elapsed if elapsed else 0
+        ))
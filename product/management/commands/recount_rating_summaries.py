@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from product.models  import Product
+from product.ratings import recount
+
+class Command(BaseCommand):
+    help = 'product_rating_summaries의 별점 별 리뷰 수를 실제 COUNT 값으로 batch 단위로 다시 계산한다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started  = time.monotonic()
+        last_id  = 0
+        finished = 0
+        while True:
+            # id 기준 keyset pagination (OFFSET 없이)
+            product_ids = list(Product.objects.filter(id__gt=last_id).order_by('id')\
+                .values_list('id', flat=True)[:options['batch_size']])
+            if not product_ids:
+                break
+            recount(product_ids)
+            last_id   = product_ids[-1]
+            finished += len(product_ids)
+            self.stdout.write('recounted {:,} products'.format(finished))
+
+        self.stdout.write(self.style.SUCCESS('done ({:.1f}s)'.format(time.monotonic() - started)))
@@ -0,0 +1,481 @@
+import bisect
+import random
+import time
+
+from array       import array
+from contextlib  import contextmanager
+from datetime    import datetime, timedelta, timezone
+from itertools   import islice, product as combinations
+
+from django.conf                 import settings
+from django.core.management      import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import connection, transaction
+
+from order.models          import CART_STATUS_ID, PAID_STATUS_ID, Order, OrderProduct, OrderStatus, ProductSalesDaily
+from posting.models        import (
+    Posting,
+    PostingComment,
+    PostingHousing,
+    PostingLike,
+    PostingScrap,
+    PostingSize,
+    PostingSpace,
+    PostingStyle,
+)
+from product.models        import (
+    Category,
+    DeliveryFee,
+    DeliveryPeriod,
+    DeliveryType,
+    DetailCategory,
+    Product,
+    ProductColor,
+    ProductCompany,
+    ProductDelivery,
+    ProductImage,
+    ProductOption,
+    ProductRatingSummary,
+    ProductReview,
+    ProductSize,
+    RelatedProduct,
+    ReviewLike,
+    SubCategory,
+)
+from sweethome.querycache import query_cache
+from sweethome.routers    import use_primary
+from user.hashers         import _hashpw
+from user.models          import Follow, User, UserCounter
+
+# --scale 1 일 때의 row 수. --scale 1000 이면 수백만 row가 된다.
+DEFAULT_COUNTS = {
+    'users'         : 1000,
+    'follows'       : 5000,
+    'products'      : 500,
+    'reviews'       : 5000,
+    'review_likes'  : 10000,
+    'postings'      : 2000,
+    'posting_likes' : 20000,
+    'scraps'        : 5000,
+    'comments'      : 10000,
+    'carts'         : 200,
+    'orders'        : 2000,
+}
+
+CATEGORIES = {
+    '가구'      : {'소파/거실가구' : ['리클라이너 소파', '패브릭 소파', '거실장'], '침실가구' : ['침대', '매트리스', '화장대']},
+    '패브릭'    : {'침구' : ['이불', '베개'], '커튼/블라인드' : ['암막커튼', '블라인드']},
+    '조명'      : {'실내조명' : ['스탠드', '펜던트', '레일조명']},
+    '수납/정리' : {'수납장' : ['서랍장', '선반', '옷장']},
+    '주방용품'  : {'식기' : ['접시', '머그컵'], '조리도구' : ['프라이팬', '냄비']},
+}
+PRODUCT_ADJECTIVES = ['원목', '모던', '북유럽', '빈티지', '미니멀', '거실', '원룸', '호텔식', '패브릭', '철제']
+PRODUCT_NOUNS      = ['소파', '침대', '조명', '수납장', '식탁', '의자', '러그', '커튼', '선반', '책상', '협탁', '거울']
+PRODUCT_SIZES      = ['S', 'M', 'L', 'XL', '1인용', '2인용', '3인용']
+PRODUCT_COLORS     = ['화이트', '블랙', '그레이', '베이지', '네이비', '월넛', '오크']
+DELIVERY_PERIODS   = [1, 2, 3, 7]
+DELIVERY_FEES      = [0, 2500, 3000, 30000]
+DELIVERY_TYPES     = ['일반택배', '화물택배', '직접배송']
+POSTING_SIZES      = ['10평 미만', '10평대', '20평대', '30평대', '40평 이상']
+POSTING_HOUSINGS   = ['원룸', '아파트', '빌라', '단독주택', '오피스텔']
+POSTING_STYLES     = ['모던', '북유럽', '빈티지', '내추럴', '미니멀']
+POSTING_SPACES     = ['거실', '침실', '주방', '욕실', '서재']
+ORDER_STATUSES     = ['장바구니', '결제완료']
+REVIEW_RATES       = [1, 2, 3, 4, 5]
+REVIEW_RATE_WEIGHT = [3, 4, 13, 35, 45]
+DISCOUNTS          = [0, 0, 0, 5, 10, 15, 20, 30, 50]
+# 생성 시각의 기준. 실행 시점과 무관하게 항상 같은 데이터를 만들기 위해 고정한다.
+BASE_TIME          = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+class ZipfSampler:
+    """ ids 중 하나를 Zipf 분포(k 번째로 인기 있는 id의 가중치 = 1 / k^exponent)로 뽑는다.
+    - 인기 순위는 seed로 섞어서 id 순서와 인기도가 무관하도록 한다.
+    - exponent 가 0이면 균등 분포이다.
+    """
+    def __init__(self, rng, ids, exponent):
+        self.rng = rng
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cumulative = []
+        total           = 0.0
+        for rank in range(1, len(self.ids) + 1):
+            total += 1 / rank ** exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample(self):
+        return self.ids[bisect.bisect_right(self.cumulative, self.rng.random() * self.total)]
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def unique_pairs(rng, count, left, right, allow_same=True):
+    """ (left id, right id) 쌍을 중복 없이 count 개까지 만든다. 분포가 치우쳐 있어 count를 다 못 채우면 시도 횟수에서 멈춘다. """
+    seen     = set()
+    attempts = 0
+    while len(seen) < count and attempts < count * 20:
+        attempts += 1
+        pair      = (left.sample(), right.sample())
+        if (not allow_same and pair[0] == pair[1]) or pair in seen:
+            continue
+        seen.add(pair)
+        yield pair
+
+@contextmanager
+def explicit_timestamps(*models):
+    """ auto_now / auto_now_add 필드에 생성기에서 정한 시각이 그대로 저장되도록 잠시 끈다 """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now     = auto_now
+            field.auto_now_add = auto_now_add
+
+@contextmanager
+def bulk_load_session():
+    """ 적재하는 동안 FK 검사를 끄고, MySQL에서는 unique 검사도 꺼서 보조 index 갱신을 change buffer로 미룬다 """
+    with connection.constraint_checks_disabled():
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET SESSION unique_checks = 0')
+        try:
+            yield
+        finally:
+            if connection.vendor == 'mysql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET SESSION unique_checks = 1')
+
+class Command(BaseCommand):
+    help = 'seed 값으로 재현 가능한 대용량 테스트 데이터(유저, 상품, 리뷰, 게시글, 장바구니/주문)를 만든다'
+
+    # --reset 시 비우는 table (FK 역순)
+    GENERATED_MODELS = [
+        ProductSalesDaily, RelatedProduct, OrderProduct, Order, ReviewLike, ProductRatingSummary, ProductReview,
+        ProductImage, ProductOption, Product,
+        PostingComment, PostingScrap, PostingLike, Posting, Follow, UserCounter, User,
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', type=float, default=1,
+            help='모든 row 수에 곱하는 배수')
+        for name, count in DEFAULT_COUNTS.items():
+            parser.add_argument('--{}'.format(name.replace('_', '-')), type=int, default=None,
+                help='{} 수 (기본값: {} x scale)'.format(name, count))
+        parser.add_argument('--zipf', type=float, default=1.1,
+            help='인기도 분포의 Zipf 지수. 클수록 소수의 상품/게시글/유저에 활동이 몰린다. 0이면 균등 분포.')
+        parser.add_argument('--days', type=int, default=365,
+            help='생성 시각을 분산시킬 기간 (BASE_TIME 부터)')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+            help='bulk_create 한번(transaction 한번)에 insert 할 row 수')
+        parser.add_argument('--password', default='seed1234',
+            help='생성되는 모든 유저의 비밀번호')
+        parser.add_argument('--reset', action='store_true',
+            help='생성 대상 table의 기존 row를 모두 지우고 시작한다')
+
+    def handle(self, *args, **options):
+        self.rng        = random.Random(options['seed'])
+        self.zipf       = options['zipf']
+        self.span       = options['days'] * 24 * 60 * 60
+        self.chunk_size = options['chunk_size']
+        self.counts     = {
+            name : options[name] if options[name] is not None else int(count * options['scale'])
+            for name, count in DEFAULT_COUNTS.items()
+        }
+        if self.counts['users'] < 1 or self.counts['products'] < 1:
+            raise CommandError('users, products 는 1 이상이어야 합니다')
+        started = time.monotonic()
+
+        with use_primary():
+            if options['reset']:
+                self.reset()
+            elif any(model.objects.exists() for model in (User, Product, Posting, Order)):
+                raise CommandError('users/products/postings/orders 에 row가 있습니다. --reset 으로 비운 뒤 다시 실행하세요.')
+
+            lookups = self.create_lookups()
+            with bulk_load_session(), explicit_timestamps(*self.GENERATED_MODELS):
+                self.create_users(options['password'])
+                self.create_products(lookups)
+                self.create_reviews()
+                self.create_postings(lookups)
+                self.create_orders(lookups)
+
+            # bulk_create는 signal을 보내지 않으므로 집계 값과 검색 색인은 마지막에 한번에 만든다
+            call_command('recount_user_counters', stdout=self.stdout)
+            call_command('recount_rating_summaries', stdout=self.stdout)
+            call_command('rebuild_sales_rollup', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+            # 전체 데이터를 다시 만들었으므로 row tag 단위가 아니라 query cache 전체를 비운다
+            query_cache.clear()
+
+        self.stdout.write(self.style.SUCCESS('done ({:.1f}s)'.format(time.monotonic() - started)))
+
+    def reset(self):
+        with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+            for model in self.GENERATED_MODELS:
+                cursor.execute('DELETE FROM {}'.format(connection.ops.quote_name(model._meta.db_table)))
+
+    def timestamp(self):
+        return BASE_TIME + timedelta(seconds=self.rng.randrange(self.span))
+
+    def insert(self, model, objects):
+        """ objects(generator)를 chunk 단위로 bulk_create 하고 처리 속도를 출력한다
+        - id를 지정하지 않은 row는 1부터 순서대로 id를 붙인다 (--reset 후에도 auto increment 값과 무관하게 같은 id가 되도록)
+        """
+        started = time.monotonic()
+        total   = 0
+        for chunk in chunked(objects, self.chunk_size):
+            for number, obj in enumerate(chunk, total + 1):
+                if obj.pk is None:
+                    obj.pk = number
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size)
+            total += len(chunk)
+        elapsed = time.monotonic() - started
+        self.stdout.write('{:<18} {:>12,} rows ({:,.0f} rows/s)'.format(
+            model._meta.db_table, total, total / elapsed if elapsed else 0
+        ))
+        return total
+
+    def lookup(self, model, field, values):
+        """ 이름(값)이 고정된 소규모 table은 있으면 재사용하고 없으면 만든다. 값 순서대로 id를 반환한다. """
+        existing = dict(model.objects.filter(**{field + '__in' : values}).values_list(field, 'id'))
+        model.objects.bulk_create([model(**{field : value}) for value in values if value not in existing])
+        ids = dict(model.objects.filter(**{field + '__in' : values}).values_list(field, 'id'))
+        return [ids[value] for value in values]
+
+    def create_lookups(self):
+        detail_categories = []
+        for category_name, sub_categories in CATEGORIES.items():
+            category = Category.objects.get_or_create(name=category_name)[0]
+            for sub_category_name, detail_names in sub_categories.items():
+                sub_category = SubCategory.objects.get_or_create(name=sub_category_name, category=category)[0]
+                detail_categories += [
+                    DetailCategory.objects.get_or_create(name=name, sub_category=sub_category)[0].id
+                    for name in detail_names
+                ]
+
+        periods    = self.lookup(DeliveryPeriod, 'day', DELIVERY_PERIODS)
+        fees       = self.lookup(DeliveryFee, 'price', DELIVERY_FEES)
+        types      = self.lookup(DeliveryType, 'name', DELIVERY_TYPES)
+        deliveries = [
+            ProductDelivery.objects.get_or_create(period_id=period, fee_id=fee, method_id=method)[0].id
+            for period, fee, method in combinations(periods, fees, types)
+        ]
+        # 장바구니/결제완료는 코드가 고정 id로 찾으므로 (order/migrations/0004) 같은 id로 만든다
+        for status_id, name in zip((CART_STATUS_ID, PAID_STATUS_ID), ORDER_STATUSES):
+            OrderStatus.objects.get_or_create(id=status_id, defaults={'name' : name})
+        return {
+            'detail_categories' : detail_categories,
+            'deliveries'        : deliveries,
+            'companies'         : self.lookup(ProductCompany, 'name', ['브랜드{}'.format(n) for n in range(1, 51)]),
+            'sizes'             : self.lookup(ProductSize, 'name', PRODUCT_SIZES),
+            'colors'            : self.lookup(ProductColor, 'name', PRODUCT_COLORS),
+            'posting_sizes'     : self.lookup(PostingSize, 'name', POSTING_SIZES),
+            'housings'          : self.lookup(PostingHousing, 'name', POSTING_HOUSINGS),
+            'styles'            : self.lookup(PostingStyle, 'name', POSTING_STYLES),
+            'spaces'            : self.lookup(PostingSpace, 'name', POSTING_SPACES),
+            'cart_status'       : CART_STATUS_ID,
+            'paid_status'       : PAID_STATUS_ID,
+        }
+
+    def create_users(self, password):
+        count = self.counts['users']
+        # 모든 유저가 같은 비밀번호를 사용하므로 hash는 한번만 계산한다
+        hashed_password = _hashpw(password, settings.BCRYPT_ROUNDS)
+
+        def users():
+            for user_id in range(1, count + 1):
+                created_at = self.timestamp()
+                yield User(
+                    id         = user_id,
+                    email      = 'user{}@seed.sweethome'.format(user_id),
+                    password   = hashed_password,
+                    name       = 'user{}'.format(user_id),
+                    created_at = created_at,
+                    updated_at = created_at,
+                )
+        self.insert(User, users())
+
+        # 활동량(작성, 좋아요, 주문)이 많은 유저와 팔로워가 많은 유저는 따로 섞는다
+        self.active_users  = ZipfSampler(self.rng, range(1, count + 1), self.zipf)
+        self.popular_users = ZipfSampler(self.rng, range(1, count + 1), self.zipf)
+        self.insert(Follow, (
+            Follow(from_user_id=from_user, to_user_id=to_user) for from_user, to_user
+            in unique_pairs(self.rng, self.counts['follows'], self.active_users, self.popular_users, allow_same=False)
+        ))
+
+    def create_products(self, lookups):
+        count        = self.counts['products']
+        combos       = list(combinations(lookups['sizes'], lookups['colors']))
+        # 상품 id -> 할인가, 상품 id -> (첫 옵션 id, 옵션 수), 옵션 id -> 상품 id (index 0은 비워둔다)
+        self.prices          = array('d', [0.0])
+        self.options         = [None]
+        self.option_products = array('I', [0])
+
+        def products():
+            for product_id in range(1, count + 1):
+                price    = self.rng.randrange(10000, 2000000, 100)
+                discount = self.rng.choice(DISCOUNTS)
+                self.prices.append(price * (100 - discount) / 100)
+                yield Product(
+                    id                  = product_id,
+                    name                = '{} {} {}'.format(
+                        self.rng.choice(PRODUCT_ADJECTIVES), self.rng.choice(PRODUCT_NOUNS), product_id
+                    ),
+                    detail_category_id  = self.rng.choice(lookups['detail_categories']),
+                    original_price      = price,
+                    discount_percentage = discount,
+                    created_at          = self.timestamp(),
+                    company_id          = self.rng.choice(lookups['companies']),
+                    delivery_id         = self.rng.choice(lookups['deliveries']),
+                )
+        self.insert(Product, products())
+
+        def images():
+            for product_id in range(1, count + 1):
+                for number in range(self.rng.randint(1, 3)):
+                    yield ProductImage(
+                        product_id = product_id,
+                        image_url  = 'https://picsum.photos/seed/product{}-{}/640/640'.format(product_id, number),
+                    )
+        self.insert(ProductImage, images())
+
+        def options():
+            option_id = 0
+            for product_id in range(1, count + 1):
+                chosen = self.rng.sample(combos, self.rng.randint(1, 4))
+                self.options.append((option_id + 1, len(chosen)))
+                for size, color in chosen:
+                    option_id += 1
+                    self.option_products.append(product_id)
+                    yield ProductOption(id=option_id, product_id=product_id, size_id=size, color_id=color)
+        self.insert(ProductOption, options())
+
+        self.popular_products = ZipfSampler(self.rng, range(1, count + 1), self.zipf)
+
+    def create_reviews(self):
+        count        = self.counts['reviews']
+        review_users = array('I', [0])
+
+        def reviews():
+            for review_id in range(1, count + 1):
+                user_id = self.active_users.sample()
+                review_users.append(user_id)
+                yield ProductReview(
+                    id         = review_id,
+                    user_id    = user_id,
+                    product_id = self.popular_products.sample(),
+                    content    = '리뷰 {}'.format(review_id),
+                    image_url  = 'https://picsum.photos/seed/review{}/640/640'.format(review_id)\
+                        if self.rng.random() < 0.3 else None,
+                    rate       = self.rng.choices(REVIEW_RATES, REVIEW_RATE_WEIGHT)[0],
+                    created_at = self.timestamp(),
+                )
+        self.insert(ProductReview, reviews())
+        if not count:
+            return
+
+        # 본인 리뷰에는 좋아요를 할 수 없다 (ReviewLikeView와 같은 조건)
+        popular_reviews = ZipfSampler(self.rng, range(1, count + 1), self.zipf)
+        self.insert(ReviewLike, (
+            ReviewLike(user_id=user_id, review_id=review_id) for user_id, review_id
+            in unique_pairs(self.rng, self.counts['review_likes'], self.active_users, popular_reviews)
+            if review_users[review_id] != user_id
+        ))
+
+    def create_postings(self, lookups):
+        count = self.counts['postings']
+
+        def postings():
+            for posting_id in range(1, count + 1):
+                created_at = self.timestamp()
+                yield Posting(
+                    id         = posting_id,
+                    user_id    = self.active_users.sample(),
+                    image_url  = 'https://picsum.photos/seed/posting{}/640/640'.format(posting_id),
+                    content    = '{} {} 인테리어 {}'.format(
+                        self.rng.choice(PRODUCT_ADJECTIVES), self.rng.choice(PRODUCT_NOUNS), posting_id
+                    ),
+                    created_at = created_at,
+                    updated_at = created_at,
+                    size_id    = self.rng.choice(lookups['posting_sizes']),
+                    housing_id = self.rng.choice(lookups['housings']),
+                    style_id   = self.rng.choice(lookups['styles']),
+                    space_id   = self.rng.choice(lookups['spaces']),
+                )
+        self.insert(Posting, postings())
+        if not count:
+            return
+
+        popular_postings = ZipfSampler(self.rng, range(1, count + 1), self.zipf)
+        self.insert(PostingLike, (
+            PostingLike(user_id=user_id, posting_id=posting_id) for user_id, posting_id
+            in unique_pairs(self.rng, self.counts['posting_likes'], self.active_users, popular_postings)
+        ))
+        self.insert(PostingScrap, (
+            PostingScrap(user_id=user_id, posting_id=posting_id) for user_id, posting_id
+            in unique_pairs(self.rng, self.counts['scraps'], self.active_users, popular_postings)
+        ))
+        self.insert(PostingComment, (
+            PostingComment(
+                user_id    = self.active_users.sample(),
+                posting_id = popular_postings.sample(),
+                content    = '댓글 {}'.format(number),
+                created_at = self.timestamp(),
+            ) for number in range(1, self.counts['comments'] + 1)
+        ))
+
+    def create_orders(self, lookups):
+        # 장바구니(status 1)는 유저 당 하나이다
+        cart_users = self.rng.sample(range(1, self.counts['users'] + 1), min(self.counts['carts'], self.counts['users']))
+        order_rows = [(user_id, lookups['cart_status']) for user_id in cart_users]
+        order_rows += [
+            (self.active_users.sample(), lookups['paid_status']) for _ in range(self.counts['orders'])
+        ]
+        order_items = []
+
+        def orders():
+            for order_id, (user_id, status_id) in enumerate(order_rows, 1):
+                items = {}
+                for _ in range(self.rng.randint(1, 4)):
+                    first_option, option_count = self.options[self.popular_products.sample()]
+                    option_id        = first_option + self.rng.randrange(option_count)
+                    items[option_id] = self.rng.randint(1, 3)
+                created_at = self.timestamp()
+                order_items.append((created_at, items))
+                yield Order(
+                    id          = order_id,
+                    user_id     = user_id,
+                    status_id   = status_id,
+                    created_at  = created_at,
+                    total_price = None if status_id == lookups['cart_status'] else sum(
+                        round(self.prices[self.option_products[option_id]]) * quantity
+                        for option_id, quantity in items.items()
+                    ),
+                )
+        self.insert(Order, orders())
+
+        def order_products():
+            for order_id, (created_at, items) in enumerate(order_items, 1):
+                for option_id, quantity in items.items():
+                    yield OrderProduct(
+                        order_id          = order_id,
+                        product_option_id = option_id,
+                        quantity          = quantity,
+                        created_at        = created_at,
+                        updated_at        = created_at,
+                    )
+        self.insert(OrderProduct, order_products())
@@ -0,0 +1,53 @@
+# Generated by Django 3.1.6 on 2026-10-19 12:38
+
+from django.db        import migrations, models
+from django.db.models import Count, Min
+
+
+def duplicate_groups(model, fields):
+    """ unique constraint를 추가하기 전에 남아있는 중복 row 묶음 (가장 작은 id를 남긴다) """
+    return (
+        model.objects.values(*fields)
+        .annotate(keep_id=Min('id'), rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+
+def remove_duplicates(apps, schema_editor):
+    ReviewLike    = apps.get_model('product', 'ReviewLike')
+    ProductOption = apps.get_model('product', 'ProductOption')
+    OrderProduct  = apps.get_model('order', 'OrderProduct')
+
+    for group in duplicate_groups(ReviewLike, ['user', 'review']):
+        ReviewLike.objects.filter(user=group['user'], review=group['review']).exclude(id=group['keep_id']).delete()
+
+    # 같은 조합의 옵션을 가리키던 장바구니/주문 상품은 남기는 옵션으로 옮긴다
+    for group in duplicate_groups(ProductOption, ['product', 'color', 'size']):
+        duplicates = ProductOption.objects.filter(
+            product=group['product'], color=group['color'], size=group['size']
+        ).exclude(id=group['keep_id'])
+        OrderProduct.objects.filter(product_option__in=duplicates).update(product_option=group['keep_id'])
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0001_initial'),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'created_at'], name='reviews_product_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productoption',
+            constraint=models.UniqueConstraint(fields=('product', 'color', 'size'), name='product_options_product_color_size_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='reviewlike',
+            constraint=models.UniqueConstraint(fields=('user', 'review'), name='review_likes_user_review_unique'),
+        ),
+    ]
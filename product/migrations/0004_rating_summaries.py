@@ -0,0 +1,32 @@
+# Generated by Django 3.1.6 on 2026-10-19 13:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='product.product')),
+                ('rate_1', models.IntegerField(default=0)),
+                ('rate_2', models.IntegerField(default=0)),
+                ('rate_3', models.IntegerField(default=0)),
+                ('rate_4', models.IntegerField(default=0)),
+                ('rate_5', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'product_rating_summaries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'rate', 'created_at'], name='reviews_product_rate_idx'),
+        ),
+    ]
@@ -34,6 +34,19 @@ class Product(models.Model):
     class Meta:
         db_table = 'products'
 
+class RelatedProduct(models.Model):
+    """ 함께 구매한 상품 추천 (product.related 에서 batch로 계산해서 저장한다) """
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='related_products')
+    related = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='+')
+    rank    = models.SmallIntegerField()
+    score   = models.FloatField()
+
+    class Meta:
+        db_table    = 'related_products'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='related_products_product_rank_unique')
+        ]
+
 class ProductImage(models.Model):
     image_url = models.URLField(max_length=2000)
     product   = models.ForeignKey('Product', on_delete=models.CASCADE)
@@ -58,13 +71,31 @@ class ProductReview(models.Model):
 
     class Meta:
         db_table = 'product_reviews'
+        indexes  = [
+            models.Index(fields=['product', 'created_at'], name='reviews_product_created_idx'),
+            # 별점 filter(rate=...)가 다른 별점의 리뷰를 읽지 않고 최신순으로 가져오도록
+            models.Index(fields=['product', 'rate', 'created_at'], name='reviews_product_rate_idx'),
+        ]
+
+class ProductRatingSummary(models.Model):
+    """ 상품 별 별점(1~5) 별 리뷰 수 (product.ratings 에서 리뷰 생성/삭제 시 갱신한다) """
+    product = models.OneToOneField('Product', on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    rate_1  = models.IntegerField(default=0)
+    rate_2  = models.IntegerField(default=0)
+    rate_3  = models.IntegerField(default=0)
+    rate_4  = models.IntegerField(default=0)
+    rate_5  = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'product_rating_summaries'
 
 class ReviewLike(models.Model):
     user   = models.ForeignKey('user.User', on_delete=models.CASCADE)
     review = models.ForeignKey('ProductReview', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'review_likes'
+        db_table    = 'review_likes'
+        constraints = [models.UniqueConstraint(fields=['user', 'review'], name='review_likes_user_review_unique')]
 
 class ProductOption(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
@@ -72,7 +103,10 @@ class ProductOption(models.Model):
     color   = models.ForeignKey('ProductColor', on_delete=models.CASCADE)
 
     class Meta:
-        db_table = 'product_options'
+        db_table    = 'product_options'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'color', 'size'], name='product_options_product_color_size_unique')
+        ]
 
 class ProductSize(models.Model):
     name = models.CharField(max_length=45, unique=True)
@@ -0,0 +1,69 @@
+"""
+상품 별 별점 분포(1~5점 별 리뷰 수)를 product_rating_summaries에 미리 저장해둔다.
+
+- 리뷰가 생성, 삭제될 때(별점이 바뀔 때) product.signals 에서 add_rating 으로 갱신한다.
+- 상품 상세와 리뷰 목록은 이 값으로 평균 별점, 리뷰 수, 별점 별 리뷰 수를 반환하므로 product_reviews를 집계하지 않는다.
+- 값이 어긋났을 경우 recount_rating_summaries 명령으로 다시 계산한다.
+"""
+from django.db        import transaction, IntegrityError
+from django.db.models import Count, F
+
+from product.models import Product, ProductRatingSummary, ProductReview
+
+RATES = (1, 2, 3, 4, 5)
+
+def rate_field(rate):
+    return 'rate_{}'.format(rate)
+
+def add_rating(product_id, rate, amount):
+    """ F()를 사용해서 동시에 들어온 요청끼리도 값이 덮어써지지 않도록 update 한다.
+    Note:
+        - summary가 아직 없으면 처음 조회할 때(get_summary) 계산하므로 여기서는 만들지 않는다.
+          (상품 삭제로 리뷰가 cascade 삭제될 때 이미 지워진 summary를 다시 만들지 않도록)
+    """
+    if rate not in RATES:
+        return
+    field = rate_field(rate)
+    ProductRatingSummary.objects.filter(product_id=product_id).update(**{field : F(field) + amount})
+
+def recount(product_ids):
+    """ product_ids의 별점 분포를 실제 COUNT 값으로 다시 계산해서 저장한다. (GROUP BY query 1번) """
+    counts = {product_id : {rate_field(rate) : 0 for rate in RATES} for product_id in product_ids}
+    rows   = ProductReview.objects.filter(product_id__in=product_ids, rate__in=RATES)\
+        .values('product_id', 'rate').annotate(count=Count('id')).values_list('product_id', 'rate', 'count')
+    for product_id, rate, count in rows:
+        counts[product_id][rate_field(rate)] = count
+
+    fields   = [rate_field(rate) for rate in RATES]
+    products = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    existing = set(ProductRatingSummary.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+    ProductRatingSummary.objects.bulk_update(
+        [ProductRatingSummary(product_id=product_id, **counts[product_id]) for product_id in existing], fields
+    )
+    try:
+        with transaction.atomic():
+            ProductRatingSummary.objects.bulk_create([
+                ProductRatingSummary(product_id=product_id, **counts[product_id]) for product_id in products - existing
+            ])
+    except IntegrityError:
+        # 다른 요청이 먼저 summary를 만든 경우: 그 값을 그대로 사용한다
+        pass
+
+def get_summary(product):
+    """ 상품의 ProductRatingSummary (select_related('rating_summary') 된 Product). 아직 없으면 계산해서 만든다. """
+    try:
+        return product.rating_summary
+    except ProductRatingSummary.DoesNotExist:
+        recount([product.id])
+        return ProductRatingSummary.objects.get(product_id=product.id)
+
+def rating_stats(summary):
+    """ 응답에 포함할 평균 별점, 리뷰 수, 별점 별 리뷰 수 """
+    histogram    = {rate : getattr(summary, rate_field(rate)) for rate in RATES}
+    review_count = sum(histogram.values())
+    rate_total   = sum(rate * count for rate, count in histogram.items())
+    return {
+        'rate_average'     : round(rate_total / review_count, 1) if review_count else 0,
+        'review_count'     : review_count,
+        'rating_histogram' : histogram,
+    }
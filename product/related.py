@@ -0,0 +1,213 @@
+"""
+함께 구매한 상품 추천 (offline batch)
+
+- 결제가 끝난 주문의 OrderProduct로 상품 x 상품 공동 구매 행렬(co-occurrence)을 만든다.
+  주문 x 상품 구매 여부 행렬 X 에 대해 C = XᵀX 이고, 대각 성분 C[i, i]는 상품 i가 포함된 주문 수이다.
+- 유사도는 cosine: C[i, j] / sqrt(C[i, i] * C[j, j]). 많이 팔리는 상품이 모든 상품의 추천 상위에 오지 않도록 정규화한다.
+- 상품마다 유사도 상위 RELATED_PRODUCTS_TOP_K 개를 related_products table에 저장한다.
+- 주문은 RELATED_PRODUCTS_BATCH_SIZE 개씩 읽어서 희소 행렬로 누적하므로 메모리는 C의 0이 아닌 값 수에 비례한다.
+- 누적된 C와 반영한 주문 id는 RELATED_PRODUCTS_STATE(.npz)에 저장하고, 다음 실행 때는 새로 결제된 주문만 더한다.
+  추천은 새 주문에 포함된 상품과, 그 상품과 함께 구매된 적이 있는 상품만 다시 계산한다.
+- 주문 취소처럼 C에서 빼야 하는 변경은 반영하지 않으므로 주기적으로 full rebuild 한다.
+"""
+import os
+
+from contextlib import contextmanager
+
+import numpy as np
+
+from django.conf      import settings
+from django.db        import transaction
+from django.db.models import Max
+from scipy            import sparse
+
+from order.models   import CART_STATUS_ID, Order, OrderProduct
+from product.models import Product, RelatedProduct
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# related_products에 한번에 다시 쓰는 상품 수
+WRITE_BATCH_SIZE = 1000
+
+class BuildInProgress(Exception):
+    pass
+
+@contextmanager
+def build_lock(state_path):
+    """ 추천 계산을 process 간에 하나만 실행하기 위한 lock. 기다리지 않고 얻었는지 여부를 yield 한다.
+    Note:
+        - singleflight.file_lock은 query cache key들과 lock file(stripe)을 나눠 쓰므로, 상태 파일 옆의 전용 lock file을 사용한다.
+    """
+    if fcntl is None:
+        yield True
+        return
+
+    directory = os.path.dirname(os.path.abspath(state_path))
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, 'build_related_products.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def empty_state(size):
+    return sparse.csr_matrix((size, size), dtype=np.int32), np.zeros(0, dtype=np.int64)
+
+def load_state(path, size):
+    """ 저장된 (C, 반영한 주문 id). 상품이 늘었으면 C의 크기를 늘린다. """
+    if not os.path.exists(path):
+        return empty_state(size)
+    with np.load(path) as state:
+        matrix = sparse.csr_matrix(
+            (state['data'], state['indices'], state['indptr']), shape=tuple(state['shape'])
+        )
+        order_ids = state['order_ids']
+    if matrix.shape[0] < size:
+        matrix.resize((size, size))
+    return matrix, order_ids
+
+def save_state(path, matrix, order_ids):
+    # 다른 process가 읽는 중인 파일을 덮어쓰지 않도록 임시 파일에 쓴 뒤 바꾼다
+    temp_path = '{}.tmp'.format(path)
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+            order_ids=order_ids,
+        )
+    os.replace(temp_path, path)
+
+def completed_order_ids():
+    """ 결제가 끝난 주문 id (정렬된 배열) """
+    ids = Order.objects.exclude(status_id=CART_STATUS_ID).order_by('id').values_list('id', flat=True)
+    return np.fromiter(ids.iterator(chunk_size=10000), dtype=np.int64)
+
+def order_lines(order_ids, batch_size):
+    """ order_ids(정렬된 배열)의 주문 line을 batch_size 개의 주문 단위로 (주문 id 배열, 상품 id 배열)로 반환한다
+    Note:
+        - id가 촘촘하면 IN (...) 대신 order_id 범위로 읽고, 범위 안의 다른 주문(장바구니, 이미 반영한 주문)은 np.isin으로 걸러낸다.
+    """
+    for start in range(0, len(order_ids), batch_size):
+        batch = order_ids[start:start + batch_size]
+        queryset = OrderProduct.objects.filter(product_option__isnull=False)
+        if batch[-1] - batch[0] < len(batch) * 4:
+            queryset = queryset.filter(order_id__gte=int(batch[0]), order_id__lte=int(batch[-1]))
+        else:
+            # 오래된 장바구니가 뒤늦게 결제된 경우처럼 id가 흩어져 있으면 범위로 읽을 때 불필요한 row가 많다
+            queryset = queryset.filter(order_id__in=batch.tolist())
+        rows  = queryset.values_list('order_id', 'product_option__product_id')
+        lines = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+        lines = lines[np.isin(lines[:, 0], batch)]
+        yield lines[:, 0], lines[:, 1]
+
+def cooccurrence(order_column, product_column, size):
+    """ 주문 line으로 만든 C = XᵀX (size x size) """
+    _, order_index = np.unique(order_column, return_inverse=True)
+    baskets        = sparse.csr_matrix(
+        (np.ones(len(order_index), dtype=np.int32), (order_index, product_column)),
+        shape=(int(order_index.max()) + 1 if len(order_index) else 0, size),
+    )
+    # 한 주문에 같은 상품의 옵션이 여러개 있어도 한번만 센다
+    baskets.data[:] = 1
+    return (baskets.T @ baskets).tocsr()
+
+def top_related(matrix, product_ids, valid, top_k, min_support):
+    """ product_ids 각각의 (추천 상품 id 배열, 유사도 배열)
+    Args:
+        - valid: 상품 id -> 현재 존재하는 상품인지 (bool 배열)
+        - min_support: 함께 구매된 주문 수가 이보다 적은 상품은 추천하지 않는다
+    """
+    counts = matrix.diagonal().astype(np.float64)
+    rows   = matrix[product_ids]
+    owners = np.repeat(product_ids, np.diff(rows.indptr))
+    scores = rows.data / np.sqrt(counts[owners] * counts[rows.indices])
+    keep   = (rows.indices != owners) & (rows.data >= min_support) & valid[rows.indices]
+
+    for position, product_id in enumerate(product_ids):
+        start, end = rows.indptr[position], rows.indptr[position + 1]
+        mask       = keep[start:end]
+        related    = rows.indices[start:end][mask]
+        similarity = scores[start:end][mask]
+        if len(related) > top_k:
+            best       = np.argpartition(-similarity, top_k)[:top_k]
+            related    = related[best]
+            similarity = similarity[best]
+        # 유사도 내림차순, 같으면 상품 id 오름차순
+        order = np.lexsort((related, -similarity))
+        yield int(product_id), related[order], similarity[order]
+
+def write_related(results):
+    """ 상품 WRITE_BATCH_SIZE 개 단위로 기존 추천을 지우고 새로 저장한다 """
+    batch = []
+    for result in results:
+        batch.append(result)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            write_batch(batch)
+            batch = []
+    if batch:
+        write_batch(batch)
+
+def write_batch(batch):
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=[product_id for product_id, _, _ in batch]).delete()
+        RelatedProduct.objects.bulk_create([
+            RelatedProduct(product_id=product_id, related_id=int(related_id), rank=rank, score=float(score))
+            for product_id, related, similarity in batch
+            for rank, (related_id, score) in enumerate(zip(related, similarity), 1)
+        ], batch_size=1000)
+
+def build(full=False, state_path=None, top_k=None, min_support=None, batch_size=None):
+    """ 새로 결제된 주문을 C에 더하고, 영향을 받은 상품의 추천을 다시 계산해서 저장한다
+    Args:
+        - full: 저장된 상태를 버리고 전체 주문으로 다시 만든다
+    Returns:
+        - {'orders': 새로 반영한 주문 수, 'products': 추천을 다시 계산한 상품 수, 'pairs': C의 0이 아닌 값 수}
+    """
+    state_path  = state_path or settings.RELATED_PRODUCTS_STATE
+    top_k       = top_k or settings.RELATED_PRODUCTS_TOP_K
+    min_support = min_support or settings.RELATED_PRODUCTS_MIN_SUPPORT
+    batch_size  = batch_size or settings.RELATED_PRODUCTS_BATCH_SIZE
+
+    with build_lock(state_path) as acquired:
+        if not acquired:
+            raise BuildInProgress('다른 process에서 추천을 계산하고 있습니다')
+
+        size                = (Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        matrix, known_order = empty_state(size) if full else load_state(state_path, size)
+        new_orders          = np.setdiff1d(completed_order_ids(), known_order, assume_unique=True)
+
+        touched = np.zeros(size, dtype=bool)
+        for order_column, product_column in order_lines(new_orders, batch_size):
+            if len(order_column):
+                matrix                  = matrix + cooccurrence(order_column, product_column, size)
+                touched[product_column] = True
+
+        # C는 대칭이므로 touched 상품의 행에 값이 있는 상품이 touched 상품과 함께 구매된 적이 있는 상품이다
+        if full:
+            affected = np.flatnonzero(np.diff(matrix.indptr))
+        else:
+            touched_ids = np.flatnonzero(touched)
+            affected    = np.union1d(touched_ids, matrix[touched_ids].indices)
+
+        valid = np.zeros(size, dtype=bool)
+        valid[np.fromiter(Product.objects.values_list('id', flat=True).iterator(), dtype=np.int64)] = True
+        affected = affected[valid[affected]]
+        write_related(top_related(matrix, affected, valid, top_k, min_support))
+        if full:
+            # 이제 추천이 없는 상품(주문이 취소된 경우 등)의 이전 추천을 지운다
+            stale = set(RelatedProduct.objects.values_list('product_id', flat=True).distinct()) - set(affected.tolist())
+            RelatedProduct.objects.filter(product_id__in=list(stale)).delete()
+
+        save_state(state_path, matrix, np.union1d(known_order, new_orders))
+    return {'orders' : len(new_orders), 'products' : len(affected), 'pairs' : matrix.nnz}
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch          import receiver
+
+from product.models       import (
+    Category,
+    DeliveryFee,
+    DeliveryPeriod,
+    DeliveryType,
+    DetailCategory,
+    Product,
+    ProductColor,
+    ProductCompany,
+    ProductDelivery,
+    ProductImage,
+    ProductOption,
+    ProductReview,
+    ProductSize,
+    ReviewLike,
+    SubCategory,
+)
+from product.ratings      import add_rating
+from sweethome.querycache import invalidate_on_change, row_tag
+
+# table tag만 사용하는 model
+for model in (
+    Category, SubCategory, DetailCategory, ProductCompany, ProductDelivery,
+    DeliveryFee, DeliveryPeriod, DeliveryType, ProductSize, ProductColor, ReviewLike,
+):
+    invalidate_on_change(model)
+
+# 상품 상세/리뷰 목록은 상품 row tag를 사용하므로, 상품에 속한 row가 바뀌면 해당 상품의 tag도 바꾼다
+invalidate_on_change(Product, lambda product: [row_tag(Product, product.id)])
+for model in (ProductImage, ProductOption, ProductReview):
+    invalidate_on_change(model, lambda instance: [row_tag(Product, instance.product_id)])
+
+# 리뷰: 상품의 별점 분포 갱신
+@receiver(post_init, sender=ProductReview)
+def remember_rate(sender, instance, **kwargs):
+    # deferred field(only())를 읽으면 query가 발생하므로 이미 불러온 값만 기억한다
+    instance._saved_rate = instance.__dict__.get('rate')
+
+@receiver(post_save, sender=ProductReview)
+def count_rating(sender, instance, created, **kwargs):
+    if created:
+        add_rating(instance.product_id, instance.rate, 1)
+    elif instance._saved_rate is not None and instance._saved_rate != instance.rate:
+        add_rating(instance.product_id, instance._saved_rate, -1)
+        add_rating(instance.product_id, instance.rate, 1)
+    instance._saved_rate = instance.rate
+
+@receiver(pre_delete, sender=ProductReview)
+def load_rate(sender, instance, **kwargs):
+    # only()로 rate를 불러오지 않은 review는 row가 지워지기 전에 읽어둔다 (deferred field를 읽으면 refresh query가 발생한다)
+    if instance._saved_rate is None:
+        instance._saved_rate = instance.rate
+    instance._saved_product_id = instance.product_id
+
+@receiver(post_delete, sender=ProductReview)
+def uncount_rating(sender, instance, **kwargs):
+    add_rating(instance._saved_product_id, instance._saved_rate, -1)
@@ -1,3 +1,350 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.cache      import cache
+from django.core.management import call_command
+from django.db.models       import Count
+from django.test            import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils           import timezone
+
+from order.models                import CART_STATUS_ID, Order, OrderProduct, OrderStatus
+from order.sales                 import add_sales
+from product                     import ratings, related
+from product.management.commands import check_query_plans
+from product.models              import (
+    DetailCategory, Product, ProductDelivery, ProductOption, ProductReview, RelatedProduct, ReviewLike
+)
+from sweethome                   import testing
+from sweethome.querycache        import query_cache
+from sweethome.singleflight      import file_lock
+from user.models                 import User
+from utils                       import create_access_token
+
+import product.async_urls
+import product.urls
+
+def in_first_category(size):
+    # 필터 결과가 비지 않도록 데이터 크기에 비례하는 수의 상품을 카테고리 1로 옮긴다
+    detail_category = DetailCategory.objects.filter(sub_category__category_id=1).order_by('id').first()
+    Product.objects.filter(id__lte=size // 10 + 1).update(detail_category=detail_category)
+
+def reviews_of_first_product(size):
+    reviews     = ProductReview.objects.filter(id__lte=size // 10 + 1)
+    product_ids = set(reviews.values_list('product_id', flat=True)) | {1}
+    reviews.update(product_id=1, rate=5)
+    # queryset.update()는 signal을 보내지 않으므로 별점 분포를 다시 계산한다
+    ratings.recount(list(product_ids))
+
+RELATED_STATE = os.path.join(tempfile.mkdtemp(prefix='sweethome-test-related-'), 'related_products.npz')
+
+def buy_together(product_ids):
+    order = Order.objects.create(user_id=1, status=OrderStatus.objects.exclude(id=CART_STATUS_ID).first())
+    OrderProduct.objects.bulk_create([
+        OrderProduct(order=order, quantity=1, product_option=ProductOption.objects.filter(product_id=product_id).first())
+        for product_id in product_ids
+    ])
+
+def build_related(size):
+    # 데이터 크기와 무관하게 상품 1의 추천이 있도록 함께 구매한 주문을 추가한다
+    buy_together([1, 2])
+    related.build(full=True, state_path=RELATED_STATE, min_support=1)
+
+def recent_sales(size):
+    # 데이터 크기와 무관하게 최근 판매 기록이 있는 상품을 둔다
+    add_sales(1, timezone.localdate(), 3, 30000)
+
+def cart_option(size):
+    option = ProductOption.objects.select_related('size', 'color').filter(product_id=1).order_by('id').first()
+    return {'id' : 1, 'color' : option.color.name, 'size' : option.size.name, 'quantity' : 1}
+
+def clear_cart(size):
+    # 항상 "장바구니 새로 생성" 분기를 측정한다
+    Order.objects.filter(user_id=1, status_id=CART_STATUS_ID).delete()
+
+def review_to_like(size):
+    review = ProductReview.objects.exclude(user_id=1).order_by('id').first()
+    return {'review_id' : review.id}
+
+def clear_review_like(size):
+    ReviewLike.objects.filter(user_id=1).delete()
+
+class ProductQueryBudgetTest(testing.QueryBudgetTestCase):
+    urls      = product.urls
+    endpoints = [
+        testing.Endpoint('GET', '/products'),
+        testing.Endpoint('GET', '/products?order=review'),
+        testing.Endpoint('GET', '/products?order=min_price'),
+        testing.Endpoint('GET', '/products?order=popular', prepare=recent_sales),
+        testing.Endpoint('GET', '/products?stream=1'),
+        testing.Endpoint('GET', '/products?top=discount'),
+        testing.Endpoint('GET', '/products?category=1&order=max_price', prepare=in_first_category),
+        testing.Endpoint('GET', '/products/1'),
+        testing.Endpoint('GET', '/products/1/related', prepare=build_related),
+        testing.Endpoint('GET', '/products/1/review', prepare=reviews_of_first_product),
+        testing.Endpoint('GET', '/products/1/review?order=like&rate=4&rate=5', prepare=reviews_of_first_product),
+        testing.Endpoint('GET', '/products/1/review?stream=1', prepare=reviews_of_first_product),
+        testing.Endpoint('GET', '/products/category'),
+        testing.Endpoint('POST', '/products/1/review-like', data=review_to_like, login=True, prepare=clear_review_like),
+        testing.Endpoint('POST', '/products/cart', data=cart_option, login=True, prepare=clear_cart),
+    ]
+
+class ProductAsyncQueryBudgetTest(testing.AsyncQueryBudgetTestCase):
+    urls      = product.async_urls
+    endpoints = [
+        testing.Endpoint('GET', '/async/products'),
+        testing.Endpoint('GET', '/async/products/1'),
+        testing.Endpoint('GET', '/async/products/category'),
+    ]
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class RelatedProductBuildTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(100)
+
+    def related_rows(self):
+        return sorted(RelatedProduct.objects.values_list('product_id', 'rank', 'related_id'))
+
+    def checkout(self, user, products):
+        """ 장바구니에 담고(/products/cart) 결제(/orders/products)하는 실제 요청 흐름으로 products를 함께 구매한다 """
+        headers = {'HTTP_AUTHORIZATION' : create_access_token(user)}
+        Order.objects.filter(user=user, status_id=CART_STATUS_ID).delete()
+        for product in products:
+            option = ProductOption.objects.select_related('color', 'size').filter(product=product).order_by('id').first()
+            cart   = {'id' : product.id, 'color' : option.color.name, 'size' : option.size.name, 'quantity' : 1}
+            self.assertEqual(self.client.post('/products/cart', cart, content_type='application/json', **headers).status_code, 201)
+        data     = {'id' : option.id, 'quantity' : 1, 'total_price' : 10000}
+        response = self.client.post('/orders/products', data, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_incremental_build_matches_full_build(self):
+        related.build(full=True, state_path=RELATED_STATE, min_support=1)
+        for _ in range(3):
+            buy_together([1, 2, 3])
+        result = related.build(state_path=RELATED_STATE, min_support=1)
+        self.assertEqual(result['orders'], 3)
+        incremental = self.related_rows()
+
+        related.build(full=True, state_path=RELATED_STATE, min_support=1)
+        self.assertEqual(incremental, self.related_rows())
+
+        response = self.client.get('/products/1/related').json()['products']
+        self.assertEqual(response[0]['id'], 2)
+        self.assertEqual([row['score'] for row in response], sorted((row['score'] for row in response), reverse=True))
+
+    def test_checked_out_order_is_recommended_after_build(self):
+        related.build(full=True, state_path=RELATED_STATE, min_support=1)
+        product      = Product.objects.order_by('-id').first()
+        bought_with  = set(OrderProduct.objects.filter(
+            order__in=Order.objects.exclude(status_id=CART_STATUS_ID).filter(orderproduct__product_option__product=product)
+        ).values_list('product_option__product_id', flat=True))
+        never_bought = Product.objects.exclude(id__in=bought_with | {product.id}).order_by('id').first()
+
+        self.checkout(User.objects.order_by('id').first(), [product, never_bought])
+        result = related.build(state_path=RELATED_STATE, min_support=1)
+        self.assertEqual(result['orders'], 1)
+
+        response = self.client.get('/products/{}/related'.format(product.id)).json()['products']
+        self.assertIn(never_bought.id, [row['id'] for row in response])
+
+    def test_build_lock_is_separate_from_query_cache_locks(self):
+        with related.build_lock(RELATED_STATE):
+            with self.assertRaises(related.BuildInProgress):
+                related.build(state_path=RELATED_STATE, min_support=1)
+            with file_lock('build_related_products', blocking=False) as acquired:
+                self.assertTrue(acquired)
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class RatingSummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(100)
+
+    def histogram(self, path):
+        return {int(rate) : count for rate, count in self.client.get(path).json()['rating_histogram'].items()}
+
+    def test_histogram_follows_review_create_update_and_delete(self):
+        expected = {rate : ProductReview.objects.filter(product_id=1, rate=rate).count() for rate in range(1, 6)}
+        self.assertEqual(self.histogram('/products/1/review'), expected)
+
+        review = ProductReview.objects.create(user_id=1, product_id=1, content='좋아요', rate=2)
+        review.rate = 4
+        review.save()
+        expected[4] += 1
+        self.assertEqual(self.histogram('/products/1/review?rate=4'), expected)
+
+        ProductReview.objects.get(id=review.id).delete()
+        expected[4] -= 1
+        detail = self.client.get('/products/1').json()['product']
+        self.assertEqual({int(rate) : count for rate, count in detail['rating_histogram'].items()}, expected)
+        self.assertEqual(detail['review_count'], sum(expected.values()))
+
+    def test_deleting_a_review_loaded_without_rate_updates_histogram(self):
+        review   = ProductReview.objects.create(user_id=1, product_id=1, content='좋아요', rate=2)
+        expected = {rate : ProductReview.objects.filter(product_id=1, rate=rate).count() for rate in range(1, 6)}
+        self.assertEqual(self.histogram('/products/1/review'), expected)
+
+        ProductReview.objects.only('id', 'product_id').get(id=review.id).delete()
+        expected[2] -= 1
+        self.assertEqual(self.histogram('/products/1/review'), expected)
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class ImportCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(10)
+
+    def catalog_row(self, name, price):
+        detail   = DetailCategory.objects.select_related('sub_category__category').order_by('id').first()
+        delivery = ProductDelivery.objects.select_related('method', 'period', 'fee').exclude(fee=None).order_by('id').first()
+        return {
+            'name'            : name,
+            'category'        : detail.sub_category.category.name,
+            'sub_category'    : detail.sub_category.name,
+            'detail_category' : detail.name,
+            'company'         : '가져온 회사',
+            'original_price'  : price,
+            'delivery_type'   : delivery.method.name,
+            'delivery_period' : delivery.period.day,
+            'delivery_fee'    : delivery.fee.price,
+            'images'          : ['https://example.com/{}.jpg'.format(price)],
+            'options'         : [{'color' : '가져온 색상', 'size' : '가져온 사이즈'}],
+        }
+
+    def test_import_upserts_by_name_and_invalidates_cached_products(self):
+        existing = Product.objects.order_by('id').first()
+        self.assertEqual(self.client.get('/products/{}'.format(existing.id)).status_code, 200)
+
+        rows = [self.catalog_row(existing.name, 12000), self.catalog_row('가져온 상품', 34000), {'name' : '잘못된 상품'}]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as f:
+            f.write('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows))
+        stderr = io.StringIO()
+        call_command('import_catalog', f.name, '--chunk-size', '2', stdout=io.StringIO(), stderr=stderr)
+        os.remove(f.name)
+
+        self.assertIn('잘못된 상품', stderr.getvalue())
+        created = Product.objects.get(name='가져온 상품')
+        self.assertEqual(created.company.name, '가져온 회사')
+        self.assertEqual(list(created.productoption_set.values_list('color__name', 'size__name')), [('가져온 색상', '가져온 사이즈')])
+
+        detail = self.client.get('/products/{}'.format(existing.id)).json()['product']
+        self.assertEqual((detail['original_price'], detail['image']), (12000, ['https://example.com/12000.jpg']))
+        self.assertEqual(self.client.get('/products/{}'.format(created.id)).json()['product']['review_count'], 0)
+
+    def test_malformed_line_is_skipped_and_rest_of_file_is_imported(self):
+        existing = Product.objects.order_by('id').first()
+        self.assertEqual(self.client.get('/products/{}'.format(existing.id)).status_code, 200)
+
+        lines = [
+            json.dumps(self.catalog_row(existing.name, 12000), ensure_ascii=False),
+            '{"name" : "깨진 줄"',
+            '[]',
+            json.dumps(self.catalog_row('깨진 줄 다음 상품', 34000), ensure_ascii=False),
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as f:
+            f.write('\n'.join(lines))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_catalog', f.name, '--chunk-size', '2', stdout=stdout, stderr=stderr)
+        os.remove(f.name)
+
+        self.assertIn('row 2: JSONDecodeError', stderr.getvalue())
+        self.assertIn('skipped 2', stdout.getvalue())
+        created = Product.objects.get(name='깨진 줄 다음 상품')
+        self.assertEqual(self.client.get('/products/{}'.format(existing.id)).json()['product']['original_price'], 12000)
+        products = self.client.get('/search', {'query' : created.name, 'type' : 'product'}).json()['products']
+        self.assertEqual(products[0]['id'], created.id)
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class QueryPlanCheckTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(10)
+
+    def test_every_variant_is_explained_even_when_responses_are_cached(self):
+        # 응답이 cache에 남아 있어도 같은 path의 두번째 variant(로그인 /posting)까지 query를 실행해야 한다
+        self.client.get('/posting')
+        stdout = io.StringIO()
+        call_command('check_query_plans', '--verbose-plans', stdout=stdout)
+
+        lines     = stdout.getvalue().splitlines()
+        explained = [(path, sql) for path, sql in zip(lines, lines[1:]) if path.startswith('/')]
+        self.assertEqual({path for path, _ in explained}, {path for path, _ in check_query_plans.ENDPOINTS})
+        self.assertEqual(len([sql for path, sql in explained if path == '/posting' and 'FROM "postings"' in sql]), 2)
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class AsyncViewTest(TransactionTestCase):
+    """ async view는 다른 thread의 DB 연결로 조회하므로 commit 된 데이터가 필요하다 """
+    def setUp(self):
+        testing.seed(10)
+        query_cache.clear()
+
+    def test_async_views_match_sync_views(self):
+        paths = [
+            '/products?order=recent', '/products?category=1&order=max_price', '/products/1', '/products/category',
+            '/posting?order=old', '/posting/category',
+        ]
+        async def fetch_all():
+            client = AsyncClient()
+            return [await client.get('/async' + path) for path in paths]
+
+        for path, response in zip(paths, asyncio.run(fetch_all())):
+            with self.subTest(path=path):
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), self.client.get(path).json())
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR, STREAMING_CHUNK_SIZE=4)
+class StreamingResponseTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(30)
+
+    def test_streamed_lists_match_regular_lists(self):
+        # 리뷰가 가장 많은 상품 (여러 chunk로 나눠지도록)
+        product_id = ProductReview.objects.values('product_id').annotate(count=Count('id')).order_by('-count')[0]['product_id']
+        for path in ['/products?order=recent', '/products?category=1&order=review', '/products/{}/review'.format(product_id)]:
+            with self.subTest(path=path):
+                # 같은 목록이 cache에 있어도 stream 요청은 streaming 응답을 받는다
+                query_cache.clear()
+                regular  = self.client.get(path)
+                streamed = self.client.get(path + ('&' if '?' in path else '?') + 'stream=1')
+
+                self.assertTrue(streamed.streaming)
+                self.assertEqual(b''.join(streamed.streaming_content), regular.content)
+
+@override_settings(BCRYPT_ROUNDS=4, SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR)
+class ProductQueryCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(10)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_is_cached_until_review_changes(self):
+        before = self.client.get('/products/1').json()['product']
+        with self.assertNumQueries(0):
+            self.client.get('/products/1')
+
+        ProductReview.objects.create(user_id=1, product_id=1, content='좋아요', rate=5)
+        after = self.client.get('/products/1').json()['product']
+        self.assertEqual(after['review_count'], before['review_count'] + 1)
+
+    def test_other_product_stays_cached(self):
+        self.client.get('/products/2')
+        ProductReview.objects.create(user_id=1, product_id=1, content='좋아요', rate=5)
+        with self.assertNumQueries(0):
+            self.client.get('/products/2')
+
+    def test_query_parameter_order_is_normalized(self):
+        first = self.client.get('/products/1/review?rate=4&rate=5&order=old')
+        with self.assertNumQueries(0):
+            second = self.client.get('/products/1/review?order=old&rate=5&rate=4')
+        self.assertEqual(json.loads(first.content), json.loads(second.content))
+
+# worker 마다 따로인 cache(single-flight를 worker 안에서만 하는 경우)에서도 같은 결과여야 한다
+@override_settings(CACHES={'default' : {'BACKEND' : 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductLocMemQueryCacheTest(ProductQueryCacheTest):
+    pass
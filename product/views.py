@@ -1,25 +1,139 @@
 import json
 
-from django.http      import JsonResponse
-from django.views     import View
-from django.db.models import Avg, Count, Q
+from django.views               import View
+from django.db.models           import Avg, Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 
+from sweethome.renderers import JsonResponse
 from user.models    import User
 from product.models import (
   Product, 
   ProductReview, 
   ReviewLike,
+  RelatedProduct,
   ProductOption,
   ProductColor,
   ProductSize,
-  Category
+  ProductImage,
+  ProductCompany,
+  ProductDelivery,
+  DeliveryFee,
+  DeliveryPeriod,
+  DeliveryType,
+  Category,
+  SubCategory,
+  DetailCategory
 )
-from order.models   import OrderProduct, Order, OrderStatus
-from utils     import login_decorator
+from order.models   import CART_STATUS_ID, OrderProduct, Order, OrderStatus
+from order.sales    import popular_units
+from product.ratings import get_summary, rating_stats
+from sweethome.querycache import row_tag, table_tag
+from utils     import cache_response, login_decorator, queryset_chunks, stream_json_response
 
 DISCOUNT_PROUDCTS_COUNT = 5
 
+# query cache tag: 응답을 만들 때 읽는 table (상품 상세/리뷰는 상품 row tag도 사용한다)
+CATEGORY_TAGS     = [table_tag(model) for model in (Category, SubCategory, DetailCategory)]
+PRODUCT_LIST_TAGS = [
+    table_tag(model) for model in
+    (Product, ProductImage, ProductReview, ProductOption, ProductCompany, ProductDelivery, DeliveryFee)
+]
+DELIVERY_TAGS     = [table_tag(model) for model in (ProductDelivery, DeliveryFee, DeliveryPeriod, DeliveryType)]
+
+def product_detail_tags(product_id):
+    return [row_tag(Product, product_id), table_tag(ProductCompany), table_tag(ProductSize), table_tag(ProductColor)] \
+        + DELIVERY_TAGS
+
+def product_review_tags(product_id):
+    return [row_tag(Product, product_id), table_tag(ReviewLike), table_tag(User)]
+
+def filter_products(products, params):
+    """ ProductView의 query parameter(filtering, 정렬, 할인상품 조건)를 products queryset에 적용한다.
+    Args:
+        - products: 조건을 적용할 Product queryset
+        - params: request.GET
+    Note:
+        - ProductView와 async view(product.async_views)가 같은 조건을 사용하도록 분리
+    """
+    # 상품의 정렬 조건
+    order_condition    = params.get('order', None)
+    # 상품 메인페이지의 할인상품 조건
+    top_list_condition = params.get('top', None)
+
+    # 상품 메인페이지의 할인중인 상품 조건이 필요할 경우 (해당 목록은 5개의 상품만 반환한다)
+    if top_list_condition == 'discount': 
+        return products.order_by('-discount_percentage')[:DISCOUNT_PROUDCTS_COUNT]
+
+    # query parameter로 들어올 filtering 조건 기본 값 dictionary
+    filter_prefixes = {
+        'category'       : 'detail_category__sub_category__category__in',
+        'subcategory'    : 'detail_category__sub_category__in',
+        'detailcategory' : 'detail_category__in',
+        'color'          : 'productoption__color__in',
+        'size'           : 'productoption__size__in'
+    }
+
+    # id로 들어온 filtering 조건에 맞춰 filter_set 이라는 변수에 조건을 담는다
+    filter_set = {
+        filter_prefixes.get(key) : value for (key, value) in dict(params).items() if filter_prefixes.get(key)
+    }
+    products = products.filter(**filter_set).distinct()
+    
+    # 시간에 따른 정렬조건: 최신순 / 오래된 순
+    order_by_time  = {'recent' : 'created_at', 'old' : '-created_at'}
+    # 가격에 따른정렬조건: 저가순 / 고가순
+    order_by_price = {'min_price' : 'discount_price', 'max_price' : '-discount_price'}
+
+    # 정렬 조건이 시간에 따랐을 경우
+    if order_condition in order_by_time:
+        products = products.order_by(order_by_time[order_condition])
+
+    # 정렬 조건이 가격에 따랐을 경우
+    if order_condition in order_by_price:
+        # extra(): 메인 query에 sql문을 추가하여 반영할 수 있는 메소드 / 정가에서 할인률을 계산한 값을 가져오기 위해 사용
+        products = products.extra(
+                select={'discount_price' : 'original_price * (100 - discount_percentage) / 100'}).order_by(
+                order_by_price[order_condition])
+    # 정렬 조건이 리뷰순일 경우 (리뷰 많은 순)
+    if order_condition == 'review':
+        products = products.annotate(review_count=Count('productreview')).order_by('-review_count')
+    # 정렬 조건이 판매순일 경우 (최근 POPULAR_SALES_WINDOW_DAYS 일 판매량 많은 순, order.sales)
+    if order_condition == 'popular':
+        products = products.annotate(popular_units=popular_units()).order_by('-popular_units', 'id')
+    return products
+
+def product_row(product):
+    """ ProductView 목록의 상품 하나 (productimage_set, productreview_set이 prefetch 된 Product) """
+    return {
+        'id'                  : product.id,
+        'name'                : product.name,
+        'discount_percentage' : int(product.discount_percentage),
+        'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
+        'company'             : product.company.name,
+        'image'               : product.productimage_set.all()[0].image_url,
+        'rate_average'        : round(product.rate_average, 1) if product.rate_average else 0,
+        'review_count'        : product.productreview_set.count(),
+        'is_free_delivery'    : product.delivery.fee.price == 0,
+        'is_on_sale'          : not (int(product.discount_percentage) == 0),
+    }
+
+def review_row(product, product_review):
+    """ ProductReviewView 목록의 리뷰 하나 (user가 select_related, review_like가 annotate 된 ProductReview) """
+    return {
+        "review_id"        : product_review.id,
+        "review_content"   : product_review.content,
+        "review_image"     : product_review.image_url,
+        "review_rate"      : product_review.rate,
+        "product_name"     : product.name,
+        "day"              : str(product_review.created_at).split(" ")[0],
+        "review_user_name" : product_review.user.name,
+        "review_like"      : product_review.review_like,
+    }
+
 class CategoryView(View):
+    query_budget = {'get' : 3}
+
+    @cache_response(CATEGORY_TAGS)
     def get(self, request):
         """ [Product] 상품의 category list 반환
         Returns: 
@@ -39,15 +153,21 @@ class CategoryView(View):
                     'name': detail_category.name
                 } for detail_category in sub_category.detailcategory_set.all()]
             } for sub_category in category.subcategory_set.all()]
-        } for category in Category.objects.all().order_by('id')]
+        } for category in Category.objects.prefetch_related('subcategory_set__detailcategory_set').order_by('id')]
         return JsonResponse({'categories': category_list}, status=200)
 
 class ProductView(View):
+    # ?stream=1 은 목록과 별도로 전체 개수(count) query를 실행한다
+    query_budget = {'get' : 4}
+
+    @cache_response(PRODUCT_LIST_TAGS)
     def get(self, request):
         """ [Product] 상품 list
         Args:
             - order_condition: 'order'라는 키값에 담길 정렬 조건. 값이 들어오지 않을 경우 None 처리한다.
+                (recent / old / min_price / max_price / review / popular: 최근 판매량 순)
             - top_list_condition: 상품 메인페이지에서 상단에 보여질 할인상품 목록에 대한 조건. 값이 들어오지 않을 경우 None 처리한다.
+            - stream: 값이 있으면 목록을 StreamingHttpResponse로 chunk 단위로 나눠서 보낸다 (export 등 전체 목록 조회용)
         Returns: 
             - products_list: 상품 목록
             - count: 상품의 총 갯수
@@ -55,93 +175,52 @@ class ProductView(View):
             - 출력 예시: 메인 category (가구) > 서브 카테고리 (소파/거실가구) > 상세 카테고리 (리클라이너 소파)
             - 서브 카테고리에 따라 상세 카테고리 항목이 없을 수 있다.
         """
-        # 상품의 정렬 조건
-        order_condition    = request.GET.get('order', None)
-        # 상품 메인페이지의 할인상품 조건
-        top_list_condition = request.GET.get('top', None)
-
-        # query parameter로 들어올 filtering 조건 기본 값 dictionary
-        filter_prefixes = {
-            'category'       : 'detail_category__sub_category__category__in',
-            'subcategory'    : 'detail_category__sub_category__in',
-            'detailcategory' : 'detail_category__in',
-            'color'          : 'productoption__color__in',
-            'size'           : 'productoption__size__in'
-        }
-
-        # id로 들어온 filtering 조건에 맞춰 filter_set 이라는 변수에 조건을 담는다
-        filter_set = {
-            filter_prefixes.get(key) : value for (key, value) in dict(request.GET).items() if filter_prefixes.get(key)
-        }
-
         # filtering 조건에 맞춰 Product 객체 불러오기
         '''
         - DB hit을 고려하여 select_related와 prefetch_related 사용
-        - 설정된 filtering 조건 적용 (**filter_set)
+        - 설정된 filtering, 정렬 조건 적용 (filter_products)
         - annotate사용: 상품 리뷰의 별점(rate)값의 평균을 계산해서 하나의 값으로 데이터 반환
         '''
-        products = Product.objects.select_related('company', 'delivery__fee')\
-            .filter(**filter_set)\
-            .prefetch_related('productimage_set', 'productreview_set')\
-            .annotate(rate_average=Avg('productreview__rate')).distinct()
-        
-        # 시간에 따른 정렬조건: 최신순 / 오래된 순
-        order_by_time  = {'recent' : 'created_at', 'old' : '-created_at'}
-        # 가격에 따른정렬조건: 저가순 / 고가순
-        order_by_price = {'min_price' : 'discount_price', 'max_price' : '-discount_price'}
-
-        # 정렬 조건이 시간에 따랐을 경우
-        if order_condition in order_by_time:
-            products = products.order_by(order_by_time[order_condition])
-
-        # 정렬 조건이 가격에 따랐을 경우
-        if order_condition in order_by_price:
-            # extra(): 메인 query에 sql문을 추가하여 반영할 수 있는 메소드 / 정가에서 할인률을 계산한 값을 가져오기 위해 사용
-            products = products.extra(
-                    select={'discount_price' : 'original_price * (100 - discount_percentage) / 100'}).order_by(
-                    order_by_price[order_condition])
-        # 정렬 조건이 리뷰순일 경우 (리뷰 많은 순)
-        if order_condition == 'review':
-            products = products.annotate(review_count=Count('productreview')).order_by('-review_count')
-        # 상품 메인페이지의 할인중인 상품 조건이 필요할 경우 (해당 목록은 5개의 상품만 반환한다) / 5개의 상품목록에 대해 위와 같은 조건의 정보를 담는다   
-        if top_list_condition == 'discount': 
-            products = Product.objects.select_related('company', 'delivery__fee')\
+        products = filter_products(
+            Product.objects.select_related('company', 'delivery__fee')\
                 .prefetch_related('productimage_set', 'productreview_set')\
-                .annotate(rate_average=Avg('productreview__rate'))\
-                .order_by('-discount_percentage')[:DISCOUNT_PROUDCTS_COUNT]
+                .annotate(rate_average=Avg('productreview__rate')),
+            request.GET
+        )
+
+        # ?stream=1: 목록 전체(export 등)를 chunk 단위로 가져와 직렬화하면서 바로 응답한다
+        if request.GET.get('stream'):
+            rows = (product_row(product) for chunk in queryset_chunks(products) for product in chunk)
+            return stream_json_response('products', rows, count=products.count())
 
         # products_list : 불러온 Product 객체들을 반복문을 통해 각각의 정보를 가공한다.
-        products_list = [{
-            'id'                  : product.id,
-            'name'                : product.name,
-            'discount_percentage' : int(product.discount_percentage),
-            'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
-            'company'             : product.company.name,
-            'image'               : product.productimage_set.all()[0].image_url,
-            'rate_average'        : round(product.rate_average, 1) if product.rate_average else 0,
-            'review_count'        : product.productreview_set.count(),
-            'is_free_delivery'    : product.delivery.fee.price == 0,
-            'is_on_sale'          : not (int(product.discount_percentage) == 0),
-            } for product in products
-        ]
+        products_list  = [product_row(product) for product in products]
         # 불러온 product 객체들의 총 갯수 반환
         products_count = products.count()
 
         return JsonResponse({'products' : products_list, 'count' : products_count}, status=200)
 
 class ProductDetailView(View):
+    query_budget = {'get' : 3}
+
+    @cache_response(product_detail_tags)
     def get(self, request, product_id):
         """ [Product] 상품 상세 페이지
         Args:
             - product_id: path paramter로 들어오는 선택한 상품 id
         Returns: 
-            - 200: {'product': 상품의 상세 정보}
+            - 200: {'product': 상품의 상세 정보 (rating_histogram: 별점 별 리뷰 수)}
             - 404: 유효하지 않은 상품 id로 접근했을 경우
         """
-        if not Product.objects.filter(id=product_id).exists():
+        product = Product.objects.select_related(
+                'company', 'delivery__method', 'delivery__period', 'delivery__fee', 'rating_summary'
+            ).prefetch_related('productimage_set').filter(id=product_id).first()
+        if not product:
             return JsonResponse({'message':'존재하지 않는 상품입니다'}, status=404)
 
-        product = Product.objects.get(id=product_id)
+        # 평균 별점, 리뷰 수, 별점 별 리뷰 수는 미리 집계된 별점 분포(product.ratings)로, 옵션은 색상/사이즈와 함께 한번에 가져온다
+        review_stats = rating_stats(get_summary(product))
+        options      = product.productoption_set.select_related('size', 'color')
 
         product_detail = {
             'id'                  : product.id,
@@ -151,39 +230,83 @@ class ProductDetailView(View):
             'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
             'company'             : product.company.name,
             'image'               : [i.image_url for i in product.productimage_set.all()],
-            'rate_average'        : round(product.productreview_set.aggregate(Avg('rate'))['rate__avg'], 1)\
-                if product.productreview_set.aggregate(Avg('rate'))['rate__avg'] else 0,
-            'review_count'        : product.productreview_set.count(),
+            'rate_average'        : review_stats['rate_average'],
+            'review_count'        : review_stats['review_count'],
+            'rating_histogram'    : review_stats['rating_histogram'],
             'delivery_type'       : product.delivery.method.name,
             'delivery_period'     : product.delivery.period.day,
             'delivery_fee'        : product.delivery.fee.price,
             'is_free_delivery'    : product.delivery.fee.price == 0,
             'is_on_sale'          : not (int(product.discount_percentage) == 0),
-            'size'                : list(set([i.size.name for i in product.productoption_set.all()])),
-            'color'               : list(set([i.color.name for i in product.productoption_set.all()])),
+            'size'                : list(set([i.size.name for i in options])),
+            'color'               : list(set([i.color.name for i in options])),
         }
         return JsonResponse({'product': product_detail}, status=200)
 
+class ProductRelatedView(View):
+    query_budget = {'get' : 2}
+
+    def get(self, request, product_id):
+        """ [Product] 함께 구매한 상품 추천
+        Args:
+            - product_id: path paramter로 들어오는 상품 id
+        Returns:
+            - 200: {'products': 함께 구매된 상품 목록 (유사도 순, score: cosine 유사도)}
+            - 404: 유효하지 않은 상품 id로 접근했을 경우
+        Note:
+            - 추천은 build_related_products(product/related.py)가 미리 계산해둔 related_products를 (product, rank) index로 한번에 읽는다.
+            - 추천이 없을 때만 상품이 존재하는지 한번 더 확인한다.
+        """
+        first_image = ProductImage.objects.filter(product=OuterRef('related')).order_by('id').values('image_url')[:1]
+        related     = RelatedProduct.objects.filter(product_id=product_id).select_related('related__company')\
+            .annotate(image=Subquery(first_image)).order_by('rank')
+
+        products = [{
+            'id'                  : row.related.id,
+            'name'                : row.related.name,
+            'company'             : row.related.company.name,
+            'image'               : row.image,
+            'discount_percentage' : int(row.related.discount_percentage),
+            'discount_price'      : int(row.related.original_price) * (100 - int(row.related.discount_percentage)) // 100,
+            'score'               : round(row.score, 4),
+        } for row in related]
+        if not products and not Product.objects.filter(id=product_id).exists():
+            return JsonResponse({'message':'존재하지 않는 상품입니다'}, status=404)
+        return JsonResponse({'products' : products}, status=200)
+
+def review_like_count():
+    return Coalesce(Subquery(
+        ReviewLike.objects.filter(review=OuterRef('pk')).order_by().values('review')\
+            .annotate(count=Count('id')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
 class ProductReviewView(View):
+    query_budget = {'get' : 2}
+
+    @cache_response(product_review_tags)
     def get(self, request, product_id):
         """ [Product] 단일 상품(in 상품 상세 페이지)의 리뷰 목록
         Args:
             - product_id: path paramter로 들어오는 선택한 상품 id
             - rate: filtering 조건에 필요한 별점 조건
             - order: 정렬조건에 필요한 dict값. 지정된 값이 없을 경우 기본적으로 "최신순"으로 정렬된다.
+            - stream: 값이 있으면 목록을 StreamingHttpResponse로 chunk 단위로 나눠서 보낸다
             - like: 
         Returns: 
-            - 200: {'result': 상품의 리뷰정보}
+            - 200: {'result': 상품의 리뷰정보, 'rating_histogram': 별점(1~5) 별 리뷰 수}
             - 200 (리뷰가 없는 상품일 경우): {'results' : '리뷰가 존재하지 않는 상품입니다'}
             - 404: 유효하지 않은 상품 id로 접근했을 경우
         Note:
             - Q(): 리뷰를 별점별로 확인할때 여러 조건 선택 가능 / Q()를 사용해 or 조건으로 SQL문의 WHERE 구문 지정 + product_id도 Q()로 함께 처리해주었다.
         """
-        if not Product.objects.get(id=product_id):
+        product   = Product.objects.select_related('rating_summary').filter(id=product_id).first()
+        if not product:
             return JsonResponse({'message':'존재하지 않는 상품입니다'}, status=404)
 
-        product   = Product.objects.get(id=product_id)
-        if not product.productreview_set.all():
+        # 별점 별 리뷰 수는 별점 filter 옆에 표시한다 (product_reviews를 GROUP BY 하지 않고 미리 집계된 값을 사용)
+        histogram = rating_stats(get_summary(product))['rating_histogram']
+        if not any(histogram.values()):
             return JsonResponse({'results' : '리뷰가 존재하지 않는 상품입니다'}, status=200)
         order     = request.GET.get('order', 'recent')
         rate_list = request.GET.getlist('rate', None)
@@ -209,23 +332,22 @@ class ProductReviewView(View):
         }
 
         # filtering 조건과 정렬 조건에 따라 ProductReview 객체 불러오기
-        product_reviews = ProductReview.objects.filter(q)\
-            .annotate(review_like=Count('reviewlike')).order_by(order_dict[order])
+        # 좋아요 수는 GROUP BY 대신 subquery로 계산해서 최신순/오래된순 정렬에 (product, created_at) index를 사용한다
+        product_reviews = ProductReview.objects.filter(q).select_related('user')\
+            .annotate(review_like=review_like_count()).order_by(order_dict[order])
         
-        review_list = [{
-                    "review_id"        : product_review.id,
-                    "review_content"   : product_review.content,
-                    "review_image"     : product_review.image_url,
-                    "review_rate"      : product_review.rate,
-                    "product_name"     : product.name,
-                    "day"              : str(product_review.created_at).split(" ")[0],
-                    "review_user_name" : product_review.user.name,
-                    "review_like"      : product_review.review_like,
-                } for product_review in product_reviews]
-
-        return JsonResponse({'results':review_list}, status=200)
+        # ?stream=1: 리뷰 전체를 chunk 단위로 가져와 직렬화하면서 바로 응답한다
+        if request.GET.get('stream'):
+            rows = (review_row(product, review) for chunk in queryset_chunks(product_reviews) for review in chunk)
+            return stream_json_response('results', rows, rating_histogram=histogram)
+
+        review_list = [review_row(product, product_review) for product_review in product_reviews]
+
+        return JsonResponse({'results':review_list, 'rating_histogram':histogram}, status=200)
 
 class ReviewLikeView(View):
+    query_budget = {'post' : 8}
+
     @login_decorator
     def post(self, request, product_id):
         """ [Product] 단일 상품(in 상품 상세 페이지)의 리뷰에 "좋아요" 달기
@@ -267,6 +389,8 @@ class ReviewLikeView(View):
             return JsonResponse({'message':'JSON_DECODE_ERROR'}, status=400)
 
 class ProductCartView(View):
+    query_budget = {'post' : 14}
+
     @login_decorator
     def post(self, request):
         """ [Product] 장바구니에 상품 담기 구현
@@ -311,9 +435,9 @@ class ProductCartView(View):
             product_option = ProductOption.objects.get(
                 product_id=product_id,color=color, size=size
             )
-            order = Order.objects.update_or_create(user=user, status_id=1)[0]
-            # 장바구니에 넣은 상태(order__status=1)일 경우 기존 값을 수정한다 
-            if OrderProduct.objects.filter(order=order, product_option=product_option, order__status=1).exists(): 
+            order = Order.objects.update_or_create(user=user, status_id=CART_STATUS_ID)[0]
+            # 장바구니에 넣은 상태(order__status=CART_STATUS_ID)일 경우 기존 값을 수정한다 
+            if OrderProduct.objects.filter(order=order, product_option=product_option, order__status=CART_STATUS_ID).exists(): 
                 order_product = OrderProduct.objects.get(order=order, product_option=product_option)
                 # 기존에 있는 상품-옵션 항목에 수량이 추가된 경우라면 수량만 추가해서 저장한다
                 order_product.quantity+=quantity
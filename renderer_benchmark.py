@@ -0,0 +1,113 @@
+"""
+JSON renderer(sweethome/renderers.py) 별 직렬화 속도를 비교한다.
+
+사용 예시:
+    python renderer_benchmark.py --rows 1000 --repeat 50 --output renderer_benchmark.json
+
+- 상품 목록, 게시글 목록(datetime), 주문 목록(Decimal)과 같은 형태의 응답을 만들어서 측정한다.
+- 모든 renderer의 결과를 json.loads 로 다시 읽어서 내용이 같은지 먼저 확인한다.
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import time
+
+from decimal import Decimal
+
+from sweethome.renderers import RENDERERS, orjson
+
+def product_list(rows):
+    return {
+        'products' : [{
+            'id'             : number,
+            'name'           : '원목 수납 선반 {}호'.format(number),
+            'company'        : '스위트홈 가구',
+            'original_price' : random.randint(10, 500) * 1000,
+            'discount_rate'  : random.randint(0, 70),
+            'rate_average'   : round(random.uniform(1, 5), 1),
+            'review_count'   : random.randint(0, 300),
+            'image'          : 'https://image.sweethome.test/products/{}.jpg'.format(number),
+            'is_free_delivery' : number % 2 == 0,
+        } for number in range(1, rows + 1)],
+        'count' : rows,
+    }
+
+def posting_list(rows):
+    created_at = datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+    return {
+        'message' : [{
+            'id'          : number,
+            'user_name'   : '집꾸미기{}'.format(number),
+            'content'     : '거실을 따뜻한 색감으로 바꿔봤어요. ' * 4,
+            'image'       : 'https://image.sweethome.test/postings/{}.jpg'.format(number),
+            'like_count'  : random.randint(0, 1000),
+            'scrap_count' : random.randint(0, 500),
+            'is_liked'    : False,
+            'created_at'  : created_at + datetime.timedelta(minutes=number, microseconds=number * 1001),
+            'comment'     : {'user_name' : '댓글러', 'content' : '예뻐요!', 'created_at' : created_at},
+        } for number in range(1, rows + 1)],
+    }
+
+def order_list(rows):
+    return {
+        'results' : [{
+            'product_option_id' : number,
+            'product_name'      : '패브릭 소파 {}'.format(number),
+            'color'             : '아이보리',
+            'size'              : '3인용',
+            'quantity'          : random.randint(1, 5),
+            'product_price'     : Decimal(random.randint(10, 500) * 1000) + Decimal('0.50'),
+            'total_price'       : Decimal('12000.00'),
+            'ordered_at'        : datetime.date(2021, 3, 1) + datetime.timedelta(days=number % 30),
+        } for number in range(1, rows + 1)],
+    }
+
+PAYLOADS = {
+    'product_list' : product_list,
+    'posting_list' : posting_list,
+    'order_list'   : order_list,
+}
+
+def measure(renderer, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        renderer.dumps(data)
+        timings.append(time.perf_counter() - started)
+    return {
+        'median_ms' : round(statistics.median(timings) * 1000, 3),
+        'min_ms'    : round(min(timings) * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000, help='응답 하나에 들어가는 row 수')
+    parser.add_argument('--repeat', type=int, default=50, help='payload 당 직렬화 횟수')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='', help='결과를 저장할 JSON 파일')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    renderers = {name : renderer() for name, renderer in RENDERERS.items() if name != 'orjson' or orjson}
+    results   = {}
+    for payload, build in PAYLOADS.items():
+        data    = build(args.rows)
+        outputs = {name : renderer.dumps(data) for name, renderer in renderers.items()}
+        decoded = [json.loads(output) for output in outputs.values()]
+        if any(value != decoded[0] for value in decoded[1:]):
+            raise SystemExit('{}: renderer 별 결과가 다릅니다'.format(payload))
+
+        results[payload] = {name : measure(renderer, data, args.repeat) for name, renderer in renderers.items()}
+        for name, result in results[payload].items():
+            print('{:<14} {:<8} median {:>9.3f}ms  min {:>9.3f}ms  {:>8} bytes'.format(
+                payload, name, result['median_ms'], result['min_ms'], len(outputs[name])
+            ))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
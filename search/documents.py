@@ -0,0 +1,20 @@
+from product.models import Product
+from posting.models import Posting
+
+CHUNK_SIZE = 2000
+
+def product_text(product):
+    return '{} {}'.format(product.name, product.company.name)
+
+def posting_text(posting):
+    return posting.content
+
+def iter_documents():
+    """ 색인 대상 전체 문서를 (kind, object_id) 순으로 반환한다. """
+    products = Product.objects.select_related('company').order_by('id')
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        yield 'product', product.id, product_text(product)
+
+    postings = Posting.objects.only('id', 'content').order_by('id')
+    for posting in postings.iterator(chunk_size=CHUNK_SIZE):
+        yield 'posting', posting.id, posting_text(posting)
@@ -0,0 +1,368 @@
+"""
+상품/게시글 검색용 로컬 역색인(inverted index)
+
+- segment.bin : rebuild 시점의 전체 색인. 모든 worker가 mmap으로 같은 파일을 공유한다.
+- delta.log   : rebuild 이후 모델 저장/삭제로 발생한 변경분 (JSON lines, append only)
+
+검색 시에는 segment + delta를 합쳐서 BM25로 점수를 매긴다.
+delta에 들어있는 문서는 segment의 같은 문서를 가린다(mask).
+"""
+import fcntl
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+
+from array       import array
+from collections import Counter
+
+MAGIC   = b'SHIX'
+VERSION = 1
+
+# magic, version, doc_count, term_count, total_length, docs_offset, terms_offset, strings_offset, postings_offset
+HEADER  = struct.Struct('<4sIIIQQQQQ')
+# kind, object_id, length
+DOC     = struct.Struct('<III')
+# string_offset, string_length, postings_offset, postings_count
+TERM    = struct.Struct('<IIII')
+# doc_index, term_frequency
+POSTING = struct.Struct('<II')
+
+KINDS      = ('product', 'posting')
+KIND_CODES = {kind : code for code, kind in enumerate(KINDS)}
+
+BM25_K1 = 1.2
+BM25_B  = 0.75
+
+SEGMENT_FILE = 'segment.bin'
+DELTA_FILE   = 'delta.log'
+
+WORD_RE = re.compile(r'\w+')
+
+def tokenize(text):
+    """ 한글 검색을 위한 bigram 토큰화
+    - 띄어쓰기가 일정하지 않은 한글 특성상 형태소 분석 대신 글자 단위 2-gram을 사용한다.
+    - 한 글자 단어는 그대로 하나의 토큰이 된다.
+    """
+    text   = unicodedata.normalize('NFKC', text or '').lower()
+    tokens = []
+    for word in WORD_RE.findall(text):
+        if len(word) == 1:
+            tokens.append(word)
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+def _native_uint32(entries):
+    # segment 파일은 little endian으로 고정
+    if sys.byteorder == 'big':
+        entries = array('I', entries)
+        entries.byteswap()
+    return entries.tobytes()
+
+def write_segment(path, documents):
+    """ 전체 문서로 segment 파일을 만든다.
+    Args:
+        - documents: (kind, object_id, text) iterable. (kind, object_id) 순으로 정렬되어 있어야 한다.
+    Note:
+        - 임시 파일에 쓴 뒤 os.replace로 교체하므로 검색 중인 worker는 기존 파일을 계속 읽을 수 있다.
+    """
+    postings     = {}
+    docs         = array('I')
+    total_length = 0
+    last_key     = None
+
+    for kind, object_id, text in documents:
+        key = (KIND_CODES[kind], object_id)
+        if last_key is not None and key <= last_key:
+            raise ValueError('documents must be sorted by (kind, object_id)')
+        last_key = key
+
+        terms     = Counter(tokenize(text))
+        length    = sum(terms.values())
+        doc_index = len(docs) // 3
+        docs.extend((key[0], object_id, length))
+        total_length += length
+        for term, frequency in terms.items():
+            postings.setdefault(term, array('I')).extend((doc_index, frequency))
+
+    strings    = bytearray()
+    term_table = bytearray()
+    blob       = array('I')
+    for term, entries in sorted((term.encode('utf-8'), entries) for term, entries in postings.items()):
+        term_table += TERM.pack(len(strings), len(term), len(blob) // 2, len(entries) // 2)
+        strings    += term
+        blob.extend(entries)
+
+    doc_count       = len(docs) // 3
+    docs_offset     = HEADER.size
+    terms_offset    = docs_offset + doc_count * DOC.size
+    strings_offset  = terms_offset + len(term_table)
+    postings_offset = strings_offset + len(strings)
+
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, doc_count, len(term_table) // TERM.size, total_length,
+            docs_offset, terms_offset, strings_offset, postings_offset
+        ))
+        f.write(_native_uint32(docs))
+        f.write(term_table)
+        f.write(strings)
+        f.write(_native_uint32(blob))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+class Segment:
+    """ mmap으로 연 segment 파일 (read only) """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, version, self.doc_count, self.term_count, self.total_length,
+            self._docs, self._terms, self._strings, self._postings
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError('invalid search segment: {}'.format(path))
+
+    def close(self):
+        self._mm.close()
+
+    def doc(self, index):
+        return DOC.unpack_from(self._mm, self._docs + index * DOC.size)
+
+    def find_doc(self, key):
+        """ (kind, object_id)에 해당하는 문서의 길이, 없으면 None """
+        low, high = 0, self.doc_count
+        while low < high:
+            middle = (low + high) // 2
+            kind, object_id, length = self.doc(middle)
+            if (kind, object_id) < key:
+                low = middle + 1
+            elif (kind, object_id) > key:
+                high = middle
+            else:
+                return length
+        return None
+
+    def _term(self, index):
+        string_offset, string_length, _, _ = TERM.unpack_from(self._mm, self._terms + index * TERM.size)
+        start = self._strings + string_offset
+        return self._mm[start:start + string_length]
+
+    def _lower_bound(self, term):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _entries(self, index):
+        _, _, offset, count = TERM.unpack_from(self._mm, self._terms + index * TERM.size)
+        start = self._postings + offset * POSTING.size
+        return POSTING.iter_unpack(self._mm[start:start + count * POSTING.size])
+
+    def postings(self, term):
+        term  = term.encode('utf-8')
+        index = self._lower_bound(term)
+        if index < self.term_count and self._term(index) == term:
+            return list(self._entries(index))
+        return []
+
+    def prefix_terms(self, prefix):
+        prefix = prefix.encode('utf-8')
+        index  = self._lower_bound(prefix)
+        terms  = []
+        while index < self.term_count:
+            term = self._term(index)
+            if not term.startswith(prefix):
+                break
+            terms.append(term.decode('utf-8'))
+            index += 1
+        return terms
+
+class SearchIndex:
+    """ segment + delta 를 합쳐서 검색하는 process 단위 객체
+    - 검색할 때마다 파일의 변경 여부(stat)만 확인하고, 바뀐 부분만 다시 읽는다.
+    """
+    def __init__(self, directory):
+        self.directory    = str(directory)
+        self.segment_path = os.path.join(self.directory, SEGMENT_FILE)
+        self.delta_path   = os.path.join(self.directory, DELTA_FILE)
+        self._lock        = threading.Lock()
+        self._segment     = None
+        self._segment_sig = None
+        self._reset_delta()
+
+    def _reset_delta(self):
+        # key(kind_code, object_id) -> (Counter, length) / 삭제된 문서는 None
+        self._delta        = {}
+        # delta 때문에 가려진 segment 문서들의 길이
+        self._masked       = {}
+        self._delta_inode  = None
+        self._delta_offset = 0
+
+    def _refresh(self):
+        try:
+            stat        = os.stat(self.segment_path)
+            segment_sig = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            segment_sig = None
+
+        if segment_sig != self._segment_sig:
+            # 이전 segment는 다른 thread가 아직 읽고 있을 수 있으므로 참조가 사라질 때 닫힌다
+            self._segment     = Segment(self.segment_path) if segment_sig else None
+            self._segment_sig = segment_sig
+            self._reset_delta()
+
+        try:
+            stat = os.stat(self.delta_path)
+        except FileNotFoundError:
+            if self._delta_inode is not None:
+                self._reset_delta()
+            return
+
+        if stat.st_ino != self._delta_inode or stat.st_size < self._delta_offset:
+            self._reset_delta()
+            self._delta_inode = stat.st_ino
+        if stat.st_size > self._delta_offset:
+            self._read_delta()
+
+    def _read_delta(self):
+        with open(self.delta_path, 'rb') as f:
+            f.seek(self._delta_offset)
+            data = f.read()
+        # 다른 process가 쓰는 중인 마지막 줄은 다음 검색 때 읽는다
+        complete = data.rfind(b'\n') + 1
+        if not complete:
+            return
+
+        delta  = dict(self._delta)
+        masked = dict(self._masked)
+        for line in data[:complete].splitlines():
+            entry = json.loads(line)
+            key   = (KIND_CODES[entry['kind']], entry['id'])
+            if entry.get('deleted'):
+                delta[key] = None
+            else:
+                terms      = Counter(tokenize(entry['text']))
+                delta[key] = (terms, sum(terms.values()))
+            if key not in masked and self._segment:
+                length = self._segment.find_doc(key)
+                if length is not None:
+                    masked[key] = length
+
+        self._delta         = delta
+        self._masked        = masked
+        self._delta_offset += complete
+
+    def append(self, kind, object_id, text=None):
+        """ 문서 변경분을 delta.log에 기록한다. text가 None이면 삭제 """
+        entry = {'kind' : kind, 'id' : object_id}
+        if text is None:
+            entry['deleted'] = True
+        else:
+            entry['text'] = text
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.delta_path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def rebuild(self, documents):
+        """ 전체 문서로 segment를 다시 만든다.
+        Note:
+            - DB를 읽기 전에 delta.log를 옮겨두므로, rebuild 도중 저장된 문서는 새 delta.log에 남는다.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        rotated_path = self.delta_path + '.old'
+        if os.path.exists(self.delta_path):
+            os.replace(self.delta_path, rotated_path)
+        write_segment(self.segment_path, documents)
+        if os.path.exists(rotated_path):
+            os.remove(rotated_path)
+
+    def _expand(self, term, segment, delta):
+        # 한 글자 검색어는 그 글자로 시작하는 bigram 전체로 확장한다
+        if len(term) != 1:
+            return [term]
+        terms = set(segment.prefix_terms(term)) if segment else set()
+        for value in delta.values():
+            if value:
+                terms.update(key for key in value[0] if key.startswith(term))
+        return list(terms)
+
+    def search(self, query, kinds=None, limit=20):
+        """ BM25 점수 순으로 (kind, object_id, score) 목록을 반환한다. """
+        with self._lock:
+            self._refresh()
+            segment, delta, masked = self._segment, self._delta, self._masked
+
+        kind_codes = {KIND_CODES[kind] for kind in kinds} if kinds else None
+        live       = {key : value for key, value in delta.items() if value}
+
+        doc_count    = (segment.doc_count if segment else 0) - len(masked) + len(live)
+        total_length = (segment.total_length if segment else 0) - sum(masked.values())\
+            + sum(length for _, length in live.values())
+        if doc_count <= 0:
+            return []
+        average_length = max(total_length / doc_count, 1)
+
+        query_terms = Counter()
+        for term, count in Counter(tokenize(query)).items():
+            for expanded in self._expand(term, segment, live):
+                query_terms[expanded] += count
+
+        scores = Counter()
+        for term, query_count in query_terms.items():
+            hits = []
+            for doc_index, frequency in (segment.postings(term) if segment else []):
+                kind, object_id, length = segment.doc(doc_index)
+                if (kind, object_id) not in delta:
+                    hits.append(((kind, object_id), frequency, length))
+            hits.extend((key, value[0][term], value[1]) for key, value in live.items() if term in value[0])
+            if not hits:
+                continue
+
+            idf = math.log(1 + (doc_count - len(hits) + 0.5) / (len(hits) + 0.5))
+            for key, frequency, length in hits:
+                if kind_codes and key[0] not in kind_codes:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] += query_count * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(KINDS[kind], object_id, score) for (kind, object_id), score in top]
+
+_indexes    = {}
+_index_lock = threading.Lock()
+
+def get_index():
+    """ settings.SEARCH_INDEX_DIR 의 SearchIndex (process 안에서 directory 별로 하나)
+    - 현재 설정 값으로 찾으므로 override_settings(SEARCH_INDEX_DIR=...)로 다른 directory를 사용할 수 있다.
+    """
+    from django.conf import settings
+    directory = str(settings.SEARCH_INDEX_DIR)
+    index     = _indexes.get(directory)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(directory)
+            if index is None:
+                index = _indexes[directory] = SearchIndex(directory)
+    return index
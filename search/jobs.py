@@ -0,0 +1,8 @@
+from job.queue        import task
+from search.documents import iter_documents
+from search.index     import get_index
+
+@task('search.rebuild_index', max_attempts=2)
+def rebuild_index():
+    """ 검색 색인을 DB 기준으로 다시 만들어서 쌓인 delta.log를 segment에 합친다 """
+    get_index().rebuild(iter_documents())
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from search.documents import iter_documents
+from search.index     import get_index
+
+class Command(BaseCommand):
+    help = '상품/게시글 검색 색인(segment)을 DB 기준으로 다시 만들고 delta.log를 비운다'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index   = get_index()
+        index.rebuild(iter_documents())
+        self.stdout.write(self.style.SUCCESS(
+            'search index rebuilt at {} ({:.1f}s)'.format(index.segment_path, time.monotonic() - started)
+        ))
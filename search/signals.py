@@ -0,0 +1,36 @@
+from django.db                import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch          import receiver
+
+from product.models   import Product, ProductCompany
+from posting.models   import Posting
+from search.documents import product_text, posting_text
+from search.index     import get_index
+
+# commit 이후에 delta.log에 기록해야 rollback된 변경이 색인에 남지 않는다
+def _append_on_commit(kind, object_id, text=None):
+    transaction.on_commit(lambda: get_index().append(kind, object_id, text))
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    _append_on_commit('product', instance.id, product_text(instance))
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    _append_on_commit('product', instance.id)
+
+@receiver(post_save, sender=ProductCompany)
+def index_company_products(sender, instance, created, **kwargs):
+    # 회사명이 바뀌면 해당 회사의 상품 문서도 바뀐다
+    if created:
+        return
+    for product_id, name in Product.objects.filter(company=instance).values_list('id', 'name'):
+        _append_on_commit('product', product_id, '{} {}'.format(name, instance.name))
+
+@receiver(post_save, sender=Posting)
+def index_posting(sender, instance, **kwargs):
+    _append_on_commit('posting', instance.id, posting_text(instance))
+
+@receiver(post_delete, sender=Posting)
+def unindex_posting(sender, instance, **kwargs):
+    _append_on_commit('posting', instance.id)
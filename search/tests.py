@@ -0,0 +1,71 @@
+import io
+import tempfile
+
+from django.core.management import call_command
+from django.test            import SimpleTestCase, TransactionTestCase, override_settings
+
+from product.models import Product
+from search.index   import SearchIndex
+from sweethome      import testing
+
+class SearchIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = SearchIndex(tempfile.mkdtemp(prefix='sweethome-test-search-'))
+
+    def test_bm25_ranks_frequent_terms_in_short_documents_first(self):
+        self.index.rebuild([
+            ('product', 1, '원목 소파 소파'),
+            ('product', 2, '원목 소파 침대 책상 의자 선반 수납장'),
+            ('product', 3, '원목 침대'),
+            ('posting', 1, '소파가 있는 거실'),
+        ])
+        results = self.index.search('소파', kinds=['product'])
+        self.assertEqual([object_id for _, object_id, _ in results], [1, 2])
+        self.assertGreater(results[0][2], results[1][2])
+        self.assertEqual(self.index.search('소파', limit=1)[0][:2], ('product', 1))
+
+    def test_delta_masks_rebuilt_documents_until_next_rebuild(self):
+        self.index.rebuild([('product', 1, '원목 소파'), ('product', 2, '철제 선반')])
+        self.index.append('product', 1, '패브릭 의자')
+        self.index.append('product', 2)
+
+        self.assertEqual(self.index.search('소파'), [])
+        self.assertEqual(self.index.search('선반'), [])
+        self.assertEqual([object_id for _, object_id, _ in self.index.search('의자')], [1])
+
+        self.index.rebuild([('product', 2, '철제 선반')])
+        self.assertEqual(self.index.search('의자'), [])
+        self.assertEqual([object_id for _, object_id, _ in self.index.search('선반')], [2])
+
+class SearchViewTest(TransactionTestCase):
+    def setUp(self):
+        settings = override_settings(SEARCH_INDEX_DIR=tempfile.mkdtemp(prefix='sweethome-test-search-'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        testing.seed(10)
+
+    def search(self, query, **params):
+        return self.client.get('/search', dict(params, query=query))
+
+    def test_rebuild_command_indexes_existing_products(self):
+        product = Product.objects.order_by('id').first()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+        products = self.search(product.name, type='product').json()['products']
+        self.assertEqual(products[0]['id'], product.id)
+
+    def test_saved_and_deleted_products_are_searchable_without_rebuild(self):
+        product      = Product.objects.order_by('id').first()
+        product.name = '새로 바뀐 상품명'
+        product.save()
+        self.assertEqual([row['id'] for row in self.search('바뀐 상품명', type='product').json()['products']], [product.id])
+
+        product.delete()
+        self.assertEqual(self.search('바뀐 상품명', type='product').json()['products'], [])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.search('').status_code, 400)
+        self.assertEqual(self.search('소파', type='user').status_code, 400)
+        for limit in ('0', '-1', 'many'):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.search('소파', limit=limit).status_code, 400)
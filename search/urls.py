@@ -0,0 +1,7 @@
+from django.urls import path
+
+from search.views import SearchView
+
+urlpatterns = [
+    path('', SearchView.as_view()),
+]
@@ -0,0 +1,71 @@
+from django.views import View
+
+from product.models import Product
+from posting.models import Posting
+from search.index   import get_index, KINDS
+from sweethome.renderers import JsonResponse
+
+DEFAULT_SEARCH_LIMIT = 20
+MAXIMUM_SEARCH_LIMIT = 100
+
+class SearchView(View):
+    def get(self, request):
+        """ [Search] 상품명, 회사명, 게시글 내용 통합 검색
+        Args:
+            - query: 검색어
+            - type: 'product' 혹은 'posting'. 값이 들어오지 않을 경우 둘 다 검색한다.
+            - limit: 반환할 최대 결과 수 (1 이상, 기본 20, 최대 100)
+        Returns:
+            - 200: {'products': 검색된 상품 목록, 'postings': 검색된 게시글 목록}
+            - 400: 검색어가 없거나 type, limit 값이 유효하지 않을 경우
+        Note:
+            - DB를 LIKE로 scan하지 않고 로컬 역색인(search.index)에서 BM25 순으로 id를 찾은 뒤 id로만 조회한다.
+        """
+        query = request.GET.get('query', '').strip()
+        kinds = request.GET.getlist('type') or None
+
+        if not query:
+            return JsonResponse({'message' : '검색어를 입력해주세요'}, status=400)
+        if kinds and any(kind not in KINDS for kind in kinds):
+            return JsonResponse({'message' : 'INVALID_TYPE'}, status=400)
+        try:
+            limit = int(request.GET.get('limit', DEFAULT_SEARCH_LIMIT))
+        except ValueError:
+            return JsonResponse({'message' : 'INVALID_LIMIT'}, status=400)
+        if limit < 1:
+            return JsonResponse({'message' : 'INVALID_LIMIT'}, status=400)
+        limit = min(limit, MAXIMUM_SEARCH_LIMIT)
+
+        results = get_index().search(query, kinds=kinds, limit=limit)
+        scores  = {(kind, object_id) : score for kind, object_id, score in results}
+
+        # 색인 결과의 순서(점수순)를 유지하기 위해 in_bulk로 가져와서 다시 정렬한다
+        products = Product.objects.select_related('company')\
+            .prefetch_related('productimage_set')\
+            .in_bulk([object_id for kind, object_id, _ in results if kind == 'product'])
+        postings = Posting.objects.select_related('user')\
+            .in_bulk([object_id for kind, object_id, _ in results if kind == 'posting'])
+        ranked_products = [products[object_id] for kind, object_id, _ in results
+            if kind == 'product' and object_id in products]
+        ranked_postings = [postings[object_id] for kind, object_id, _ in results
+            if kind == 'posting' and object_id in postings]
+
+        product_list = [{
+            'id'                  : product.id,
+            'name'                : product.name,
+            'company'             : product.company.name,
+            'image'               : product.productimage_set.all()[0].image_url if product.productimage_set.all() else None,
+            'discount_percentage' : int(product.discount_percentage),
+            'discount_price'      : int(product.original_price) * (100 - int(product.discount_percentage)) // 100,
+            'score'               : round(scores[('product', product.id)], 4),
+            } for product in ranked_products
+        ]
+        posting_list = [{
+            'id'             : posting.id,
+            'card_user_name' : posting.user.name,
+            'card_image'     : posting.image_url,
+            'card_content'   : posting.content,
+            'score'          : round(scores[('posting', posting.id)], 4),
+            } for posting in ranked_postings
+        ]
+        return JsonResponse({'products' : product_list, 'postings' : posting_list}, status=200)
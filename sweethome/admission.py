@@ -0,0 +1,134 @@
+"""
+adaptive admission control (과부하 시 요청 거절)
+
+- 요청은 sweethome/urls.py 의 admission_routes (path 정규식 -> admission class 이름) 로 class가 정해진다.
+- class 마다 동시 처리 수 limit이 있고, limit을 넘는 요청은 view를 실행하기 전에 503 + Retry-After로 거절한다.
+- limit은 AIMD로 조정한다. ADMISSION_WINDOW 초 마다 그 동안 끝난 요청 latency의 p90을 보고
+    - class의 target_latency를 넘으면 limit * ADMISSION_BACKOFF (최소 min_limit)
+    - 넘지 않았고 window 중에 limit까지 찼던 적이 있으면 limit + 1 (최대 max_limit)
+- 우선순위: worker 전체 동시 처리 수(ADMISSION_MAX_CONCURRENCY) 중 우선순위 별로 사용할 수 있는 비율
+  (ADMISSION_PRIORITY_SHARES)이 정해져 있어서, 전체가 붐비면 낮은 우선순위(signin)부터 거절되고
+  높은 우선순위(checkout)는 남은 자리를 끝까지 사용할 수 있다.
+- limit과 동시 처리 수는 worker process 단위이다.
+"""
+import math
+import re
+import threading
+import time
+
+from importlib import import_module
+
+from django.conf          import settings
+from django.core.signals  import setting_changed
+from django.dispatch      import receiver
+
+class AdmissionClass:
+    def __init__(self, name, priority, target_latency, min_limit, max_limit, retry_after):
+        self.name           = name
+        self.priority       = priority
+        self.target_latency = target_latency
+        self.min_limit      = min_limit
+        self.max_limit      = max_limit
+        self.retry_after    = retry_after
+        self.limit          = max_limit
+        self.in_flight      = 0
+        self.admitted       = 0
+        self.rejected       = 0
+        self._samples       = []
+        self._saturated     = False
+        self._window_start  = time.monotonic()
+
+    def observe(self, elapsed, now):
+        """ 끝난 요청의 latency를 기록하고, window가 지났으면 limit을 조정한다 """
+        self._samples.append(elapsed)
+        if now - self._window_start < settings.ADMISSION_WINDOW:
+            return
+
+        samples = sorted(self._samples)
+        p90     = samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+        if p90 > self.target_latency:
+            self.limit = max(self.min_limit, int(self.limit * settings.ADMISSION_BACKOFF))
+        elif self._saturated:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+        self._samples      = []
+        self._saturated    = self.in_flight >= self.limit
+        self._window_start = now
+
+    def stats(self):
+        return {
+            'priority'  : self.priority,
+            'limit'     : self.limit,
+            'in_flight' : self.in_flight,
+            'admitted'  : self.admitted,
+            'rejected'  : self.rejected,
+        }
+
+class AdmissionController:
+    def __init__(self, classes=None, routes=None):
+        self._lock      = threading.Lock()
+        self._classes   = classes
+        self._routes    = routes
+        self.in_flight  = 0
+
+    def configure(self):
+        """ settings.ADMISSION_CLASSES 와 ROOT_URLCONF 의 admission_routes 를 읽는다 (처음 요청 때 한번) """
+        if self._classes is None:
+            self._classes = {
+                name : AdmissionClass(name, **options) for name, options in settings.ADMISSION_CLASSES.items()
+            }
+        if self._routes is None:
+            urlconf      = import_module(settings.ROOT_URLCONF)
+            self._routes = [(re.compile(pattern), name) for pattern, name in getattr(urlconf, 'admission_routes', [])]
+
+    def classify(self, path):
+        """ path에 해당하는 AdmissionClass. 제한하지 않는 path면 None """
+        self.configure()
+        path = path.lstrip('/')
+        for pattern, name in self._routes:
+            if pattern.search(path):
+                return self._classes[name] if name else None
+        return self._classes['default']
+
+    def acquire(self, admission_class):
+        """ 요청을 받을 수 있으면 동시 처리 수를 늘리고 True """
+        share = settings.ADMISSION_PRIORITY_SHARES[admission_class.priority]
+        with self._lock:
+            if admission_class.in_flight >= admission_class.limit:
+                admission_class._saturated  = True
+                admission_class.rejected   += 1
+                return False
+            if self.in_flight >= settings.ADMISSION_MAX_CONCURRENCY * share:
+                admission_class.rejected += 1
+                return False
+            admission_class.in_flight += 1
+            admission_class.admitted  += 1
+            self.in_flight            += 1
+            if admission_class.in_flight >= admission_class.limit:
+                admission_class._saturated = True
+            return True
+
+    def release(self, admission_class, elapsed):
+        with self._lock:
+            admission_class.in_flight -= 1
+            self.in_flight            -= 1
+            admission_class.observe(elapsed, time.monotonic())
+
+    def retry_after(self, admission_class):
+        """ Retry-After header 값 (초). limit이 많이 줄어든 class일수록 길게 기다리게 한다. """
+        ratio = admission_class.max_limit / max(admission_class.limit, 1)
+        return int(math.ceil(admission_class.retry_after * min(ratio, settings.ADMISSION_MAX_RETRY_SCALE)))
+
+    def stats(self):
+        self.configure()
+        with self._lock:
+            return {name : admission_class.stats() for name, admission_class in self._classes.items()}
+
+admission_controller = AdmissionController()
+
+@receiver(setting_changed)
+def reset_admission_controller(setting, **kwargs):
+    # 테스트에서 override_settings 로 설정을 바꾸면 class와 route를 다시 읽는다
+    if setting.startswith('ADMISSION_') or setting == 'ROOT_URLCONF':
+        admission_controller._classes = None
+        admission_controller._routes  = None
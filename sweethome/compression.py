@@ -0,0 +1,120 @@
+"""
+응답 압축 (gzip, brotli)
+
+- Accept-Encoding의 q 값을 보고 brotli > gzip 순으로 encoding을 고른다.
+- brotli는 brotli package가 설치되어 있을 때만 사용한다.
+- cache에 저장하는 응답은 저장 시점에 encoding 별 압축본(variants)을 함께 만들어 두고,
+  CompressionMiddleware는 요청마다 다시 압축하지 않고 저장된 압축본을 그대로 보낸다.
+"""
+import gzip
+import zlib
+
+from functools import partial
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+# streaming 응답에서 압축된 data를 내보내는 단위(압축 전 byte)
+STREAM_FLUSH_SIZE  = 64 * 1024
+
+def available_encodings():
+    """ 서버가 지원하는 encoding (선호 순서) """
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+def parse_accept_encoding(header):
+    """ 'gzip, br;q=0.5, *;q=0' -> {'gzip' : 1.0, 'br' : 0.5, '*' : 0.0} """
+    weights = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+def negotiate(header, encodings=None):
+    """ Accept-Encoding header 값으로 사용할 encoding을 고른다. 사용할 수 있는 encoding이 없으면 None
+    Note:
+        - q 값이 같으면 available_encodings()의 순서(brotli 우선)를 따른다.
+    """
+    weights   = parse_accept_encoding(header or '')
+    default   = weights.get('*', 0.0)
+    best      = None
+    best_rank = 0.0
+    for encoding in available_encodings() if encodings is None else encodings:
+        weight = weights.get(encoding, default)
+        if weight > best_rank:
+            best, best_rank = encoding, weight
+    return best
+
+def is_compressible(response):
+    content_type = response.get('Content-Type', '')
+    return (
+        response.status_code == 200
+        and not response.has_header('Content-Encoding')
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+    )
+
+def compress(body, encoding, cached=False):
+    """ body(bytes)를 encoding으로 압축한다.
+    Args:
+        - cached: cache에 저장할 압축본이면 더 높은 압축률(느린 압축)을 사용한다.
+    """
+    if encoding == 'br':
+        quality = settings.COMPRESSION_CACHED_BROTLI_QUALITY if cached else settings.COMPRESSION_BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    level = settings.COMPRESSION_CACHED_GZIP_LEVEL if cached else settings.COMPRESSION_GZIP_LEVEL
+    # mtime을 고정해서 같은 body는 항상 같은 압축 결과가 나오도록 한다
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+def compress_variants(body):
+    """ cache에 함께 저장할 encoding 별 압축본. 압축해도 작아지지 않으면 해당 encoding은 저장하지 않는다. """
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return {}
+    variants = {}
+    for encoding in available_encodings():
+        compressed = compress(body, encoding, cached=True)
+        if len(compressed) < len(body):
+            variants[encoding] = compressed
+    return variants
+
+def compress_stream(chunks, encoding):
+    """ StreamingHttpResponse의 chunk를 순서대로 압축하면서 내보낸다
+    Note:
+        - chunk(row) 마다 flush하면 압축률이 크게 떨어지므로 STREAM_FLUSH_SIZE 만큼 쌓일 때마다 flush한다.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        compress   = compressor.process
+        flush      = compressor.flush
+        finish     = compressor.finish
+    else:
+        # wbits 16 + MAX_WBITS: gzip header/trailer를 포함한 형식
+        compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress   = compressor.compress
+        flush      = partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+        finish     = compressor.flush
+
+    pending = 0
+    for chunk in chunks:
+        data     = compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            data   += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
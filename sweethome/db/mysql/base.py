@@ -0,0 +1,7 @@
+from django.db.backends.mysql import base
+
+from sweethome.db.pool import PooledDatabaseWrapperMixin
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping_connection(self, connection):
+        connection.ping()
@@ -0,0 +1,211 @@
+"""
+DB connection pool
+
+Django는 CONN_MAX_AGE = 0 일 때 요청마다 DB connection을 새로 열고 닫는다.
+이 pool을 사용하는 backend(sweethome.db.mysql, sweethome.db.sqlite3)는 connection을 닫는 대신 pool에 돌려주고,
+다음 요청에서 다시 꺼내서 사용한다.
+
+DATABASES 설정 예시:
+    'default': {
+        'ENGINE' : 'sweethome.db.mysql',
+        ...
+        'POOL'   : {
+            'MIN_SIZE'         : 2,      # 미리 열어둘 connection 수
+            'MAX_SIZE'         : 20,     # process 당 최대 connection 수
+            'MAX_LIFETIME'     : 1800,   # 이 시간(초)보다 오래된 connection은 닫고 새로 연다
+            'CHECKOUT_TIMEOUT' : 5,      # 빈 connection을 기다리는 최대 시간(초)
+            'HEALTH_CHECK'     : True,   # 꺼낼 때 ping으로 연결 상태 확인
+        },
+    }
+"""
+import threading
+import time
+
+from collections import deque
+
+from django.db.utils import OperationalError
+
+DEFAULT_POOL_OPTIONS = {
+    'MIN_SIZE'         : 0,
+    'MAX_SIZE'         : 10,
+    'MAX_LIFETIME'     : 1800,
+    'CHECKOUT_TIMEOUT' : 5,
+    'HEALTH_CHECK'     : True,
+}
+
+class PoolTimeout(OperationalError):
+    pass
+
+class ConnectionPool:
+    def __init__(self, alias, connect, ping, options):
+        options               = dict(DEFAULT_POOL_OPTIONS, **options)
+        self.alias            = alias
+        self.min_size         = options['MIN_SIZE']
+        self.max_size         = options['MAX_SIZE']
+        self.max_lifetime     = options['MAX_LIFETIME']
+        self.checkout_timeout = options['CHECKOUT_TIMEOUT']
+        self.health_check     = options['HEALTH_CHECK']
+
+        self._connect   = connect
+        self._ping      = ping
+        self._condition = threading.Condition()
+        # (connection, 생성 시각). 최근에 반납된 connection부터 사용한다 (LIFO)
+        self._idle      = deque()
+        # id(connection) -> 생성 시각
+        self._in_use    = {}
+        self._size      = 0
+
+        self.checkouts         = 0
+        self.checkout_failures = 0
+        self.created           = 0
+        self.discarded         = 0
+        self.wait_time_total   = 0.0
+        self.wait_time_max     = 0.0
+
+    def _expired(self, created_at):
+        return self.max_lifetime is not None and time.monotonic() - created_at > self.max_lifetime
+
+    def _is_alive(self, connection):
+        try:
+            self._ping(connection)
+            return True
+        except Exception:
+            return False
+
+    def _open(self):
+        # 호출 전에 _size 자리를 미리 확보해야 한다
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self.checkout_failures += 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return connection, time.monotonic()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size      -= 1
+            self.discarded  += 1
+            self._condition.notify()
+
+    def _fill(self):
+        # 한번에 한 자리씩 확보한다. _open이 실패하면 그 자리만 돌려주고, 이미 연 connection은 idle에 남는다
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            connection = self._open()
+            with self._condition:
+                self._idle.appendleft(connection)
+                self._condition.notify()
+
+    def checkout(self):
+        started  = time.monotonic()
+        deadline = started + self.checkout_timeout
+        if self._size < self.min_size:
+            self._fill()
+
+        while True:
+            connection = None
+            with self._condition:
+                while True:
+                    if self._idle:
+                        connection, created_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.checkout_failures += 1
+                        raise PoolTimeout(
+                            'connection pool "{}" exhausted ({} connections in use)'.format(self.alias, self._size)
+                        )
+                    self._condition.wait(remaining)
+
+            if connection is None:
+                connection, created_at = self._open()
+            elif self._expired(created_at) or (self.health_check and not self._is_alive(connection)):
+                self._discard(connection)
+                continue
+
+            waited = time.monotonic() - started
+            with self._condition:
+                self._in_use[id(connection)] = created_at
+                self.checkouts       += 1
+                self.wait_time_total += waited
+                self.wait_time_max    = max(self.wait_time_max, waited)
+            return connection
+
+    def release(self, connection, broken=False):
+        with self._condition:
+            created_at = self._in_use.pop(id(connection), None)
+        if broken or created_at is None or self._expired(created_at):
+            self._discard(connection)
+            return
+        try:
+            # 끝나지 않은 transaction이 다음 요청으로 넘어가지 않도록 한다
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, created_at))
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size'               : self._size,
+                'idle'               : len(self._idle),
+                'in_use'             : len(self._in_use),
+                'max_size'           : self.max_size,
+                'checkouts'          : self.checkouts,
+                'checkout_failures'  : self.checkout_failures,
+                'created'            : self.created,
+                'discarded'          : self.discarded,
+                'wait_time_total_ms' : round(self.wait_time_total * 1000, 2),
+                'wait_time_max_ms'   : round(self.wait_time_max * 1000, 2),
+            }
+
+pools      = {}
+pools_lock = threading.Lock()
+
+def pool_stats():
+    return {alias : pool.stats() for alias, pool in list(pools.items())}
+
+class PooledDatabaseWrapperMixin:
+    """ DatabaseWrapper에 섞어서 사용한다. (backend 별로 ping_connection 구현 필요) """
+    def get_pool(self, conn_params):
+        pool = pools.get(self.alias)
+        if pool is None:
+            with pools_lock:
+                pool = pools.get(self.alias)
+                if pool is None:
+                    pool = pools[self.alias] = ConnectionPool(
+                        self.alias,
+                        lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                        self.ping_connection,
+                        self.settings_dict.get('POOL', {}),
+                    )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        return self.get_pool(conn_params).checkout()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                pools[self.alias].release(self.connection, broken=self.errors_occurred)
+
+    def ping_connection(self, connection):
+        raise NotImplementedError
@@ -0,0 +1,10 @@
+"""
+sqlite3 용 pool backend. MySQL 없이 로컬에서 pool 동작을 확인할 때 사용한다.
+"""
+from django.db.backends.sqlite3 import base
+
+from sweethome.db.pool import PooledDatabaseWrapperMixin
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping_connection(self, connection):
+        connection.execute('SELECT 1')
@@ -0,0 +1,86 @@
+"""
+process 단위 metric 저장소와 Prometheus text 형식 출력
+
+- 값은 worker process 별로 따로 쌓이므로 Prometheus에서 worker 단위로 scrape 한 뒤 합산한다.
+"""
+import bisect
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS    = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label='route'):
+        self.name          = name
+        self.documentation = documentation
+        self.buckets       = tuple(buckets)
+        self.label         = label
+        self._values       = {}
+        self._lock         = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            counts, total = self._values.get(label_value, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[label_value] = (counts, total + value)
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            values = {key : (list(counts), total) for key, (counts, total) in self._values.items()}
+        for label_value, (counts, total) in sorted(values.items()):
+            label      = '{}="{}"'.format(self.label, escape(label_value))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, label, bound, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, label, total))
+            lines.append('{}_count{{{}}} {}'.format(self.name, label, cumulative))
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, label='route'):
+        self.name          = name
+        self.documentation = documentation
+        self.label         = label
+        self._values       = {}
+        self._lock         = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} counter'.format(self.name)]
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            lines.append('{}{{{}="{}"}} {}'.format(self.name, self.label, escape(label_value), value))
+        return lines
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def gauge_lines(name, documentation, values, label):
+    """ values: {label 값: 숫자} """
+    lines = ['# HELP {} {}'.format(name, documentation), '# TYPE {} gauge'.format(name)]
+    for label_value, value in sorted(values.items()):
+        lines.append('{}{{{}="{}"}} {}'.format(name, label, escape(label_value), value))
+    return lines
+
+request_duration = Histogram('sweethome_request_duration_seconds', 'Request latency per route', DURATION_BUCKETS)
+request_queries  = Histogram('sweethome_request_queries', 'SQL queries per sampled request', QUERY_BUCKETS)
+request_db_time  = Histogram('sweethome_request_db_seconds', 'Total SQL time per sampled request', DURATION_BUCKETS)
+n_plus_one       = Counter('sweethome_n_plus_one_total', 'Sampled requests where a normalized query repeated over the threshold')
+admission_rejected = Counter(
+    'sweethome_admission_rejected_total', 'Requests rejected by admission control', label='admission_class'
+)
+
+REGISTRY = [request_duration, request_queries, request_db_time, n_plus_one, admission_rejected]
+
+def render_prometheus(extra_lines=()):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
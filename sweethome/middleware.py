@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import random
+import time
+
+from django.conf        import settings
+from django.utils.cache import patch_vary_headers
+
+from sweethome           import compression, metrics
+from sweethome.admission import admission_controller
+from sweethome.querylog  import QueryRecorder, recording
+from sweethome.renderers import JsonResponse
+from sweethome.routers   import use_primary
+from utils               import get_token_user_id
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 쓰기 요청을 보낸 유저 id를 담는 signed cookie. 값에 서명 시각이 들어있어서 REPLICA_STICKY_SECONDS가 지나면 무시된다
+STICKY_COOKIE_NAME = 'primary-sticky'
+STICKY_COOKIE_SALT = 'sweethome.middleware.ReplicaRoutingMiddleware'
+
+def is_sticky(request, user_id):
+    value = request.get_signed_cookie(
+        STICKY_COOKIE_NAME, default=None, salt=STICKY_COOKIE_SALT, max_age=settings.REPLICA_STICKY_SECONDS
+    )
+    return value == str(user_id)
+
+class GuardedStream:
+    """ StreamingHttpResponse의 body iterator를 감싼다.
+    streaming body는 middleware가 응답을 반환한 뒤에 server가 읽으면서 query를 실행하므로, 요청 중에 잡은 상태를 그때까지 유지한다.
+    Args:
+        - content: 원래 streaming_content
+        - context: chunk를 만들 때(next)마다 들어갈 context manager를 반환하는 함수 (primary 고정)
+        - on_close: body를 끝까지 읽었거나 연결이 끊겨 close() 될 때 한번만 호출할 함수 (admission 자리 반납)
+    Note:
+        - generator는 한번도 읽지 않고 close() 하면 finally가 실행되지 않으므로 iterator class로 구현한다.
+        - StreamingHttpResponse는 streaming_content의 close를 등록해두고 response.close() 때 호출한다.
+    """
+    def __init__(self, content, context=None, on_close=None):
+        self.content  = iter(content)
+        self.context  = context
+        self.on_close = on_close
+        self.closed   = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            if self.context is None:
+                return next(self.content)
+            with self.context():
+                return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.on_close is not None:
+            self.on_close()
+
+class HybridMiddleware:
+    """ WSGI(sync)와 ASGI(async) 양쪽에서 동작하는 middleware
+    - sync 전용 middleware는 ASGI에서 thread_sensitive sync_to_async로 감싸져서 async view도 한번에 하나씩만 처리된다.
+    - 다음 handler(get_response)가 coroutine function이면 async middleware로 동작하고 __call__이 acall()의 coroutine을 반환한다.
+    - 하위 class는 같은 처리를 call(sync)과 acall(async)로 구현한다.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async     = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Django가 이 instance를 coroutine function으로 인식해서 sync_to_async로 감싸지 않도록 표시한다
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+class AdmissionControlMiddleware(HybridMiddleware):
+    """ 과부하 시 route 별 동시 처리 수 limit을 넘는 요청을 바로 503으로 거절한다 (sweethome/admission.py)
+    - 가장 바깥쪽 middleware로 두어서 거절되는 요청은 DB, 인증, 압축 비용 없이 끝나게 한다.
+    - ASGI에서는 view를 await 하는 동안 자리를 잡고 있으므로 동시에 처리 중인 async 요청도 limit에 포함된다.
+    - StreamingHttpResponse는 body를 다 보내거나 연결이 끊길 때까지 자리를 잡고 있고, 그때까지를 처리 시간으로 계산한다.
+    """
+    def admit(self, request):
+        """ (자리를 잡은 admission class 또는 None, 거절 응답 또는 None) """
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return None, None
+        admission_class = admission_controller.classify(request.path_info)
+        if admission_class is None:
+            return None, None
+
+        if not admission_controller.acquire(admission_class):
+            metrics.admission_rejected.inc(admission_class.name)
+            response = JsonResponse({'message' : 'SERVER_BUSY'}, status=503)
+            response['Retry-After'] = admission_controller.retry_after(admission_class)
+            return None, response
+        return admission_class, None
+
+    def hold(self, admission_class, started, response):
+        """ 응답을 다 보낼 때 자리를 반납한다. streaming이 아니면 바로 반납한다. """
+        def release():
+            admission_controller.release(admission_class, time.perf_counter() - started)
+
+        if not response.streaming:
+            release()
+            return response
+        response.streaming_content = GuardedStream(response.streaming_content, on_close=release)
+        return response
+
+    def call(self, request):
+        admission_class, rejected = self.admit(request)
+        if rejected is not None:
+            return rejected
+        if admission_class is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            admission_controller.release(admission_class, time.perf_counter() - started)
+            raise
+        return self.hold(admission_class, started, response)
+
+    async def acall(self, request):
+        admission_class, rejected = self.admit(request)
+        if rejected is not None:
+            return rejected
+        if admission_class is None:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            admission_controller.release(admission_class, time.perf_counter() - started)
+            raise
+        return self.hold(admission_class, started, response)
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """ 쓰기 요청과, 최근에 쓰기 요청을 보낸 유저의 읽기 요청을 primary DB로 고정한다.
+    - 방금 누른 좋아요나 장바구니 내용이 replica 복제 지연 때문에 사라져 보이지 않도록
+      REPLICA_STICKY_SECONDS 동안 해당 유저의 읽기도 primary에서 처리한다.
+    - 고정 여부는 worker 마다 다른 cache가 아니라 client의 signed cookie에 저장하므로 어느 worker가 받아도 같다.
+    - 고정은 contextvar(use_primary)이므로 ASGI에서 동시에 처리되는 다른 요청에는 영향을 주지 않는다.
+    - StreamingHttpResponse는 body를 읽을 때 실행되는 query에도 같은 고정을 적용한다.
+    """
+    def pinned(self, request):
+        """ (primary 고정 여부, 쓰기 요청 여부, token의 user id) """
+        is_write = request.method not in SAFE_METHODS
+        user_id  = get_token_user_id(request)
+        return is_write or bool(user_id and is_sticky(request, user_id)), is_write, user_id
+
+    def stick(self, response, pinned, is_write, user_id):
+        if response.streaming:
+            response.streaming_content = GuardedStream(response.streaming_content, context=lambda: use_primary(pinned))
+        if is_write and user_id and response.status_code < 400:
+            response.set_signed_cookie(
+                STICKY_COOKIE_NAME, str(user_id), salt=STICKY_COOKIE_SALT,
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def call(self, request):
+        pinned, is_write, user_id = self.pinned(request)
+        with use_primary(pinned):
+            response = self.get_response(request)
+        return self.stick(response, pinned, is_write, user_id)
+
+    async def acall(self, request):
+        pinned, is_write, user_id = self.pinned(request)
+        with use_primary(pinned):
+            response = await self.get_response(request)
+        return self.stick(response, pinned, is_write, user_id)
+
+class QueryInstrumentationMiddleware(HybridMiddleware):
+    """ 요청 단위 SQL 계측 (query 수, SQL 시간, 중복 query fingerprint)
+    - SQL_INSTRUMENTATION_SAMPLE_RATE 비율의 요청만 계측하고, 나머지 요청은 latency만 기록한다.
+    - 같은 fingerprint의 query가 SQL_N_PLUS_ONE_THRESHOLD 회를 넘으면 N+1 의심으로 log를 남긴다.
+    - 응답에 Server-Timing header(db, app)를 추가하고, route 별 histogram은 /metrics 에서 볼 수 있다.
+    """
+    def call(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            response = self.get_response(request)
+            metrics.request_duration.observe(route_name(request), time.perf_counter() - started)
+            return response
+
+        recorder = QueryRecorder()
+        with recording(recorder):
+            response = self.get_response(request)
+        return self.report(request, response, recorder, started)
+
+    async def acall(self, request):
+        started = time.perf_counter()
+        if random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            response = await self.get_response(request)
+            metrics.request_duration.observe(route_name(request), time.perf_counter() - started)
+            return response
+
+        recorder = QueryRecorder()
+        with recording(recorder):
+            response = await self.get_response(request)
+        return self.report(request, response, recorder, started)
+
+    def report(self, request, response, recorder, started):
+        elapsed = time.perf_counter() - started
+        route   = route_name(request)
+
+        metrics.request_duration.observe(route, elapsed)
+        metrics.request_queries.observe(route, recorder.count)
+        metrics.request_db_time.observe(route, recorder.duration)
+
+        repeated = recorder.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            metrics.n_plus_one.inc(route)
+            for fingerprint, count in repeated:
+                logger.warning('N+1 suspected on %s %s: %d x %s', request.method, route, count, fingerprint)
+
+        response['Server-Timing'] = 'db;dur={:.1f};desc="{} queries", app;dur={:.1f}'.format(
+            recorder.duration * 1000, recorder.count, elapsed * 1000
+        )
+        return response
+
+class CompressionMiddleware(HybridMiddleware):
+    """ Accept-Encoding에 따라 JSON 응답을 brotli/gzip으로 압축한다.
+    - COMPRESSION_MIN_SIZE 보다 작은 응답은 압축하지 않는다.
+    - cache_response로 cache된 응답은 저장된 압축본(response.compressed_variants)을 그대로 사용한다.
+    - 길이를 알 수 없는 StreamingHttpResponse는 chunk 단위로 압축한다.
+    """
+    def call(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def acall(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if not compression.is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        variants = getattr(response, 'compressed_variants', None)
+        encoding = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING'), list(variants) if variants is not None else None
+        )
+        if not encoding:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            body = variants[encoding] if variants else compression.compress(response.content, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content           = body
+            response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        return response
+
+def route_name(request):
+    return getattr(getattr(request, 'resolver_match', None), 'route', None) or 'unmatched'
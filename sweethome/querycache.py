@@ -0,0 +1,163 @@
+"""
+tag 기반 query 결과 cache
+
+- 값(queryset 결과, 직렬화된 응답 조각)은 이름과 정규화된 query parameter로 key를 만들어 저장한다.
+- 각 값은 의존하는 table / row를 tag로 가진다. (table: 'products', row: 'products:3')
+- tag마다 version을 cache에 두고, 값을 저장할 때의 tag version을 값과 함께 저장한다.
+  model이 저장/삭제되면(invalidate_on_change) tag version이 바뀌고, version이 다른 값은 cache miss로 처리된다.
+- backend는 settings.QUERY_CACHE_ALIAS 의 CACHES 설정을 사용한다. invalidate가 모든 worker에 반영되도록
+  worker 간에 공유되는 backend(file, memcached 등)여야 한다.
+- queryset.update(), bulk_create() 는 signal이 발생하지 않으므로 호출한 쪽에서 invalidate() 해야 한다.
+- 같은 key의 동시 cache miss는 sweethome/singleflight.py 로 합친다.
+"""
+import hashlib
+import json
+import time
+
+from django.conf                       import settings
+from django.core.cache                 import caches
+from django.core.cache.backends.dummy  import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db                         import transaction
+from django.db.models.signals          import post_save, post_delete
+
+from sweethome.singleflight import single_flight
+
+# worker(process) 마다 따로 저장하는 backend. 다른 worker가 계산한 값을 읽을 수 없으므로 single-flight는 worker 안에서만 한다
+LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+def table_tag(model):
+    return model._meta.db_table
+
+def row_tag(model, pk):
+    return '{}:{}'.format(model._meta.db_table, pk)
+
+def normalize_params(params):
+    """ dict / QueryDict를 순서와 무관한 문자열로 만든다 (?a=1&b=2 와 ?b=2&a=1 은 같은 key) """
+    if hasattr(params, 'lists'):
+        items = params.lists()
+    else:
+        items = ((key, value if isinstance(value, (list, tuple)) else [value]) for key, value in params.items())
+    normalized = sorted(
+        (str(key), sorted(str(value) for value in values)) for key, values in items
+    )
+    return json.dumps(normalized, ensure_ascii=False, separators=(',', ':'))
+
+class QueryCache:
+    def __init__(self, alias=None):
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias or settings.QUERY_CACHE_ALIAS]
+
+    def key(self, name, params=None):
+        digest = hashlib.sha1(normalize_params(params or {}).encode('utf-8')).hexdigest()
+        return 'querycache:{}:{}'.format(name, digest)
+
+    def tag_versions(self, tags):
+        """ 현재 tag version. version이 없는 tag(처음 사용되거나 cache에서 밀려난 tag)는 새 version을 만든다. """
+        keys     = {tag : 'querycache-tag:{}'.format(tag) for tag in tags}
+        found    = self.backend.get_many(list(keys.values()))
+        versions = {}
+        for tag, key in keys.items():
+            if key not in found:
+                self.backend.add(key, time.time_ns(), None)
+                found[key] = self.backend.get(key)
+            versions[tag] = found[key]
+        return versions
+
+    def lookup(self, name, params=None):
+        """ ('fresh', 값) / ('stale', 값) / (None, None)
+        - stale: 유효 시간이 지났거나 tag version이 바뀌었지만 아직 backend에 남아있는 값 (single-flight 중에 사용)
+        """
+        entry = self.backend.get(self.key(name, params))
+        if entry is None:
+            return None, None
+        keys    = {'querycache-tag:{}'.format(tag) : version for tag, version in entry['versions'].items()}
+        current = self.backend.get_many(list(keys))
+        if entry['expires_at'] < time.time() or any(current.get(key) != version for key, version in keys.items()):
+            return 'stale', entry['value']
+        return 'fresh', entry['value']
+
+    def get(self, name, params=None):
+        """ 저장된 값이 없거나 stale 이면 (False, None) """
+        state, value = self.lookup(name, params)
+        if state != 'fresh':
+            return False, None
+        return True, value
+
+    def set(self, name, params, tags, value, versions=None, timeout=None):
+        timeout = timeout or settings.QUERY_CACHE_TIMEOUT
+        entry   = {
+            'versions'   : versions or self.tag_versions(tags),
+            'expires_at' : time.time() + timeout,
+            'value'      : value,
+        }
+        # 유효 시간이 지난 뒤에도 QUERY_CACHE_STALE_TIMEOUT 동안은 single-flight 중에 stale 값으로 사용할 수 있게 남겨둔다
+        self.backend.set(self.key(name, params), entry, timeout + settings.QUERY_CACHE_STALE_TIMEOUT)
+
+    def get_or_set(self, name, params, tags, compute, timeout=None, cacheable=None):
+        """ cache된 값을 반환하고, 없으면 compute()의 결과를 tags와 함께 저장한다.
+        Args:
+            - name: 값의 종류 (endpoint 이름 등)
+            - params: 값을 구분하는 parameter (dict 또는 request.GET)
+            - tags: 값이 의존하는 table / row tag 목록
+            - compute: 값을 계산하는 함수 (결과는 pickle 가능해야 한다, None도 저장된다)
+            - cacheable: compute() 결과를 저장할지 판단하는 함수 (기본: 항상 저장)
+        Note:
+            - tag version을 계산 전에 읽어두므로, 계산 중에 변경된 값은 저장되더라도 바로 stale로 처리된다.
+            - 같은 key의 동시 cache miss는 single-flight로 합쳐서 한 요청만 compute()를 실행한다.
+        """
+        state, stale = self.lookup(name, params)
+        if state == 'fresh':
+            return stale
+
+        def compute_and_store():
+            versions = self.tag_versions(tags)
+            value    = compute()
+            shared   = cacheable is None or cacheable(value)
+            if shared:
+                self.set(name, params, tags, value, versions, timeout)
+            return value, shared
+
+        def reload():
+            state, value = self.lookup(name, params)
+            return state == 'fresh', value
+
+        return single_flight.run(
+            self.key(name, params), compute_and_store, stale=stale, has_stale=state == 'stale', reload=reload,
+            cross_worker=not isinstance(self.backend, LOCAL_BACKENDS)
+        )
+
+    def queryset(self, queryset, tags=(), timeout=None):
+        """ queryset 결과(list)를 SQL 단위로 cache 한다. query에 사용된 table은 자동으로 tag에 포함된다. """
+        sql, params = queryset.query.sql_with_params()
+        tables      = {alias.table_name for alias in queryset.query.alias_map.values()}
+        return self.get_or_set(
+            'queryset', {'sql' : sql, 'params' : [str(param) for param in params]},
+            sorted(tables | set(tags)), lambda: list(queryset), timeout
+        )
+
+    def invalidate(self, *tags):
+        self.backend.set_many({'querycache-tag:{}'.format(tag) : time.time_ns() for tag in tags}, None)
+
+    def clear(self):
+        """ signal 없이 대량으로 데이터를 바꾼 경우(seed 등) cache 전체를 비운다 """
+        self.backend.clear()
+
+query_cache = QueryCache()
+
+def invalidate_on_change(model, row_tags=None):
+    """ model이 저장/삭제되면 table tag와 row_tags(instance)가 반환하는 tag를 invalidate 한다
+    Note:
+        - 변경 직후와 commit 이후에 한번씩 invalidate 한다.
+          commit 전에 다른 요청이 변경 전의 값을 다시 cache에 저장했을 수 있기 때문이다.
+    """
+    def invalidate(sender, instance, **kwargs):
+        tags = [table_tag(sender)] + list(row_tags(instance) if row_tags else [])
+        query_cache.invalidate(*tags)
+        transaction.on_commit(lambda: query_cache.invalidate(*tags))
+
+    post_save.connect(invalidate, sender=model, weak=False)
+    post_delete.connect(invalidate, sender=model, weak=False)
@@ -0,0 +1,86 @@
+"""
+SQL query 기록기
+
+connection_created signal로 모든 DB connection에 execute wrapper를 한번씩 등록해두고,
+현재 context(요청)에 QueryRecorder가 있을 때만 query를 기록한다.
+contextvar를 사용하므로 async view의 executor thread(run_in_db_thread)에서 실행된 query도 같은 요청으로 기록된다.
+"""
+import re
+import threading
+import time
+
+from collections import Counter
+from contextlib  import contextmanager
+from contextvars import ContextVar
+
+from django.db                  import connections
+from django.db.backends.signals import connection_created
+
+# 현재 context에서 query를 기록 중인 recorder 목록 (middleware와 test harness가 겹쳐서 기록할 수 있다)
+_recorders = ContextVar('query_recorders', default=())
+
+STRING_RE  = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE  = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE   = re.compile(r'\s+')
+
+def fingerprint(sql):
+    """ 값만 다른 query를 같은 query로 묶기 위한 정규화 """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+class QueryRecorder:
+    """ Args:
+        - keep_statements: 실행된 (DB alias, sql, params)를 statements에 그대로 남길지 여부 (EXPLAIN 등 분석용)
+    """
+    def __init__(self, keep_statements=False):
+        self.count           = 0
+        self.duration        = 0.0
+        self.fingerprints    = Counter()
+        self.statements      = []
+        self.keep_statements = keep_statements
+        self._lock           = threading.Lock()
+
+    def add(self, sql, elapsed, params=None, alias=None):
+        with self._lock:
+            self.count    += 1
+            self.duration += elapsed
+            self.fingerprints[fingerprint(sql)] += 1
+            if self.keep_statements:
+                self.statements.append((alias, sql, params))
+
+    def repeated(self, threshold):
+        with self._lock:
+            return [(sql, count) for sql, count in self.fingerprints.most_common() if count > threshold]
+
+@contextmanager
+def recording(recorder):
+    # signal 등록 이전에 열린 connection(migrate, system check 등)에도 wrapper를 등록한다
+    for connection in connections.all():
+        install_wrapper(None, connection)
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+def record_query(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        alias   = context['connection'].alias
+        for recorder in recorders:
+            recorder.add(sql, elapsed, params, alias)
+
+def install_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+connection_created.connect(install_wrapper)
@@ -0,0 +1,84 @@
+"""
+JSON 응답 renderer
+
+- settings.JSON_RENDERER 로 backend를 고른다: 'orjson' | 'stdlib' | 'auto'(orjson이 설치되어 있으면 orjson)
+- 어떤 backend를 사용해도 응답 내용은 같고, 기존 django.http.JsonResponse(DjangoJSONEncoder)의 형식을 유지한다.
+    - Decimal: 문자열 ("12000.00")
+    - datetime / time: ISO 8601, 밀리초까지 ("2021-03-01T09:30:00.001Z"), UTC는 "Z"
+    - 한글은 escape 하지 않고 UTF-8 그대로 보낸다.
+"""
+import datetime
+import json
+
+from decimal   import Decimal
+from functools import lru_cache
+
+from django.conf                  import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals          import setting_changed
+from django.dispatch              import receiver
+from django.http                  import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class StdlibRenderer:
+    name = 'stdlib'
+
+    def __init__(self):
+        self.encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(self, data):
+        return self.encoder.encode(data).encode('utf-8')
+
+# datetime 형식을 stdlib renderer와 맞추는 데 사용한다 (default()만 호출하므로 설정 값은 무관)
+django_encoder = DjangoJSONEncoder()
+
+def orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    # orjson 기본 형식은 마이크로초까지 보내므로 DjangoJSONEncoder와 같은 밀리초 형식으로 바꾼다
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return django_encoder.default(obj)
+    raise TypeError('Type is not JSON serializable: {}'.format(type(obj).__name__))
+
+class OrjsonRenderer:
+    name = 'orjson'
+    # UUID는 orjson이 직접 직렬화하고, datetime / date / time은 orjson_default에서 직렬화한다
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, data):
+        return orjson.dumps(data, default=orjson_default, option=self.options)
+
+RENDERERS = {
+    'stdlib' : StdlibRenderer,
+    'orjson' : OrjsonRenderer,
+}
+
+@lru_cache(maxsize=None)
+def get_renderer(name=None):
+    name = name or settings.JSON_RENDERER
+    if name == 'auto':
+        name = 'orjson' if orjson else 'stdlib'
+    if name == 'orjson' and not orjson:
+        raise ImportError('JSON_RENDERER = "orjson" 이지만 orjson이 설치되어 있지 않습니다')
+    return RENDERERS[name]()
+
+@receiver(setting_changed)
+def reset_renderer(setting, **kwargs):
+    # 테스트에서 override_settings 로 JSON_RENDERER를 바꾸면 renderer를 다시 고른다
+    if setting == 'JSON_RENDERER':
+        get_renderer.cache_clear()
+
+def dumps(data):
+    return get_renderer().dumps(data)
+
+class JsonResponse(HttpResponse):
+    """ django.http.JsonResponse 와 같은 사용법의 응답. 직렬화는 설정된 renderer가 한다. """
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
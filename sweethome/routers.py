@@ -0,0 +1,42 @@
+"""
+Read replica routing
+
+- 읽기 query는 settings.DATABASE_REPLICAS 중 하나로, 쓰기 query와 transaction 안의 query는 'default'(primary)로 보낸다.
+- 요청 단위로 primary 고정(pin)이 필요할 때는 use_primary()를 사용한다. (sweethome.middleware.ReplicaRoutingMiddleware)
+"""
+import random
+
+from contextlib  import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db   import DEFAULT_DB_ALIAS, connections
+
+_use_primary = ContextVar('use_primary', default=False)
+
+@contextmanager
+def use_primary(enabled=True):
+    token = _use_primary.set(enabled)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
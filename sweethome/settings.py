@@ -30,10 +30,15 @@ INSTALLED_APPS = [
     'product',
     'user',
     'order',
-    'posting'
+    'posting',
+    'search',
+    'job',
 ]
 
 MIDDLEWARE = [
+    'sweethome.middleware.AdmissionControlMiddleware',
+    'sweethome.middleware.QueryInstrumentationMiddleware',
+    'sweethome.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -42,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'sweethome.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'sweethome.urls'
@@ -68,9 +74,20 @@ WSGI_APPLICATION = 'sweethome.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# connection pool을 사용하려면 my_settings.DATABASES의 ENGINE을 'sweethome.db.mysql'로 지정하고
+# 'POOL' 옵션을 추가한다. (옵션은 sweethome/db/pool.py 참고, 로컬 테스트용 'sweethome.db.sqlite3')
 
 DATABASES = DATABASES
 
+# 'default' 이외의 alias는 read replica로 사용한다 (sweethome/routers.py)
+DATABASE_ROUTERS       = ['sweethome.routers.ReplicaRouter']
+DATABASE_REPLICAS      = [alias for alias in DATABASES if alias != 'default']
+# test 실행 시 replica는 별도 test DB를 만들지 않고 primary test DB를 그대로 사용한다
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias].setdefault('TEST', {}).setdefault('MIRROR', 'default')
+# 쓰기 요청 이후 해당 유저의 읽기 요청을 primary로 고정하는 시간 (초)
+REPLICA_STICKY_SECONDS = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -137,3 +154,165 @@ CORS_ALLOW_HEADERS = (
     'x-requested-with',
 		#만약 허용해야할 추가적인 헤더키가 있다면?(사용자정의 키) 여기에 추가하면 됩니다.
 )
+
+##SEARCH
+# 검색 색인(segment.bin, delta.log)이 저장되는 경로. 같은 서버의 모든 worker가 공유한다.
+SEARCH_INDEX_DIR = BASE_DIR / 'search_index'
+
+##TOKEN_CACHE
+# login_decorator / non_user_accept_decorator 에서 사용하는 token -> user cache (worker 단위)
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL  = 300
+
+##PASSWORD_HASHER
+# bcrypt cost. 값을 바꾸면 기존 유저는 다음 로그인 성공 시 새 cost로 다시 hash 된다.
+BCRYPT_ROUNDS              = 12
+# bcrypt 전용 process 수와 대기열 크기. 대기열이 가득 차면 회원가입/로그인은 503을 반환한다.
+PASSWORD_HASHER_WORKERS    = 2
+PASSWORD_HASHER_QUEUE_SIZE = 8
+# 대기열에 들어간 요청이 결과를 기다리는 최대 시간(초). 대기열 8개 / process 2개 기준 cost 12에서 약 1초가 걸린다.
+PASSWORD_HASHER_TIMEOUT    = 2
+
+##JWT
+# access token에는 화면 표시용 프로필 claim이 담기므로 짧게 유지하고 refresh token으로 재발급한다 (초 단위)
+ACCESS_TOKEN_LIFETIME     = 60 * 10
+REFRESH_TOKEN_LIFETIME    = 60 * 60 * 24 * 14
+# 만료 시각(exp)이 없는 기존 token을 허용하는 마지막 시각 (timezone이 있는 datetime). None이면 허용하지 않는다.
+LEGACY_TOKEN_ACCEPT_UNTIL = None
+
+##OPS
+# /stats, /metrics 는 내부 상태(token cache, DB pool, admission, route 별 latency)를 보여주므로 이 IP에서 온 요청만 허용한다
+# (reverse proxy 뒤에서는 proxy가 전달한 REMOTE_ADDR 기준이므로 scrape 서버가 proxy를 거치지 않는 주소를 넣는다)
+OPS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+##PROFILE
+# 렌더링된 유저 프로필(집계 값 포함) cache 유지 시간 (초)
+PROFILE_CACHE_TIMEOUT = 60 * 5
+
+##ASYNC
+# async view(/async/...)에서 ORM query를 실행하는 thread 수 (= async view가 동시에 사용하는 최대 DB connection 수)
+ASYNC_DB_WORKERS = 16
+
+##SQL_INSTRUMENTATION
+# SQL 계측(query 수, SQL 시간, N+1 감지)을 적용할 요청 비율. latency histogram은 모든 요청에 기록된다.
+SQL_INSTRUMENTATION_SAMPLE_RATE = 1.0 if DEBUG else 0.1
+# 한 요청에서 같은 형태의 query가 이 횟수를 넘으면 N+1 의심으로 warning log를 남긴다
+SQL_N_PLUS_ONE_THRESHOLD        = 10
+
+##STREAMING
+# ?stream=1 로 요청한 목록 응답에서 한번에 DB에서 가져와 직렬화하는 row 수
+STREAMING_CHUNK_SIZE = 500
+
+##JSON_RENDERER
+# JSON 응답 직렬화 backend: 'orjson' | 'stdlib' | 'auto' (orjson이 설치되어 있으면 orjson을 사용한다)
+JSON_RENDERER = 'auto'
+
+##COMPRESSION
+# 이 크기(byte)보다 작은 응답은 압축하지 않는다
+COMPRESSION_MIN_SIZE              = 1024
+# 요청마다 압축하는 응답의 압축 수준
+COMPRESSION_GZIP_LEVEL            = 6
+COMPRESSION_BROTLI_QUALITY        = 5
+# cache_response로 저장할 때 한번만 만드는 압축본은 더 높은 압축률을 사용한다
+# (brotli quality 11은 큰 목록 응답에서 1초 이상 걸려서 cache miss 요청이 느려진다)
+COMPRESSION_CACHED_GZIP_LEVEL     = 9
+COMPRESSION_CACHED_BROTLI_QUALITY = 8
+# cache_response로 cache한 응답의 유효 시간(초)
+RESPONSE_CACHE_TIMEOUT            = 60 * 10
+
+##CACHES
+# query cache, 응답 cache, 프로필 cache는 한 worker에서 invalidate 한 값이 모든 worker에 반영되어야 하므로
+# process 간에 공유되는 backend를 사용한다. (LocMemCache는 worker 마다 따로 저장된다)
+# 여러 서버에서 실행할 때는 memcached 등 서버 간에 공유되는 backend로 바꾼다.
+# test 실행 중에는 sweethome.testing.TestRunner가 LOCATION을 임시 directory로 바꾼다.
+CACHES = {
+    'default' : {
+        'BACKEND'  : 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION' : str(BASE_DIR / 'django_cache'),
+        # 저장할 때마다 directory의 file 수를 세므로 너무 크게 잡지 않는다
+        'OPTIONS'  : {'MAX_ENTRIES' : 20000},
+    },
+}
+TEST_RUNNER = 'sweethome.testing.TestRunner'
+
+##QUERY_CACHE
+# query 결과 / 응답 cache(sweethome/querycache.py)가 사용하는 CACHES alias
+QUERY_CACHE_ALIAS         = 'default'
+QUERY_CACHE_TIMEOUT       = 60 * 10
+# 유효 시간이 지난 값을 다시 계산하는 동안 다른 요청에 이전 값으로 응답할 수 있는 시간(초)
+QUERY_CACHE_STALE_TIMEOUT = 60 * 5
+
+##SINGLE_FLIGHT
+# 같은 key를 계산 중인 요청(다른 worker 포함)을 기다리는 최대 시간(초). 넘으면 직접 계산한다.
+SINGLE_FLIGHT_TIMEOUT      = 10
+# worker 간 lock file 위치와 개수 (key는 lock file 중 하나에 hash 된다)
+SINGLE_FLIGHT_LOCK_DIR     = BASE_DIR / 'single_flight_locks'
+SINGLE_FLIGHT_LOCK_STRIPES = 256
+
+##ADMISSION_CONTROL
+# route 별 class는 sweethome/urls.py 의 admission_routes 에서 정한다
+ADMISSION_CONTROL_ENABLED   = True
+# worker process 하나가 동시에 처리하는 요청 수 (gunicorn --threads 값과 맞춘다)
+ADMISSION_MAX_CONCURRENCY   = 32
+# 우선순위 별로 사용할 수 있는 ADMISSION_MAX_CONCURRENCY 의 비율
+ADMISSION_PRIORITY_SHARES   = {
+    'critical' : 1.0,
+    'high'     : 0.75,
+    'low'      : 0.25,
+}
+# target_latency(초): window의 p90 latency가 이 값을 넘으면 limit을 줄인다
+# retry_after(초): limit이 max_limit일 때의 Retry-After. limit이 줄어든 만큼 늘어난다.
+ADMISSION_CLASSES           = {
+    'checkout' : {'priority' : 'critical', 'target_latency' : 1.0, 'min_limit' : 4, 'max_limit' : 32, 'retry_after' : 1},
+    'feed'     : {'priority' : 'high', 'target_latency' : 0.3, 'min_limit' : 4, 'max_limit' : 24, 'retry_after' : 1},
+    'catalog'  : {'priority' : 'high', 'target_latency' : 0.3, 'min_limit' : 4, 'max_limit' : 24, 'retry_after' : 1},
+    'default'  : {'priority' : 'high', 'target_latency' : 0.5, 'min_limit' : 2, 'max_limit' : 16, 'retry_after' : 1},
+    # bcrypt는 PASSWORD_HASHER_WORKERS 개의 process에서만 실행되므로 그 이상 동시에 받아도 대기만 길어진다
+    'signin'   : {'priority' : 'low', 'target_latency' : 1.5, 'min_limit' : 1, 'max_limit' : 8, 'retry_after' : 2},
+}
+# limit을 조정하는 주기(초)와 latency가 target을 넘었을 때 limit에 곱하는 값
+ADMISSION_WINDOW            = 1.0
+ADMISSION_BACKOFF           = 0.7
+# Retry-After가 retry_after의 몇 배까지 늘어날 수 있는지
+ADMISSION_MAX_RETRY_SCALE   = 5
+
+##JOB
+# python manage.py run_jobs worker 설정 (job/worker.py)
+JOB_WORKER_THREADS       = 4
+JOB_POLL_INTERVAL        = 1.0
+# 실패한 job은 JOB_RETRY_BACKOFF * 2^(실행 횟수-1) 초 뒤에 다시 실행한다 (최대 JOB_RETRY_BACKOFF_MAX)
+JOB_MAX_ATTEMPTS         = 5
+JOB_RETRY_BACKOFF        = 10
+JOB_RETRY_BACKOFF_MAX    = 60 * 60
+# 실행 중인 job은 JOB_LEASE_RENEW_INTERVAL(초) 마다 lease(locked_at)를 갱신한다.
+# JOB_LEASE_TIMEOUT(초) 동안 갱신되지 않은 running job은 worker가 죽은 것으로 보고 다시 실행한다.
+JOB_LEASE_TIMEOUT        = 60 * 5
+JOB_LEASE_RENEW_INTERVAL = 60
+# 끝난 job을 보관하는 시간(초)
+JOB_RETENTION            = 60 * 60 * 24 * 7
+# 주기 job: {이름: {'task': job 이름, 'interval': 초, 'payload': task 인자(선택)}}
+JOB_SCHEDULE             = {
+    'recount_user_counters' : {'task' : 'user.recount_counters', 'interval' : 60 * 60 * 24},
+    'recount_ratings'       : {'task' : 'product.recount_ratings', 'interval' : 60 * 60 * 24},
+    'rebuild_search_index'  : {'task' : 'search.rebuild_index', 'interval' : 60 * 60 * 6},
+    'purge_finished_jobs'   : {'task' : 'job.purge_finished', 'interval' : 60 * 60},
+    'related_products'      : {'task' : 'product.build_related_products', 'interval' : 60 * 60},
+    'related_products_full' : {
+        'task' : 'product.build_related_products', 'interval' : 60 * 60 * 24 * 7, 'payload' : {'full' : True}
+    },
+}
+
+##RELATED_PRODUCTS
+# 함께 구매한 상품 추천 (product/related.py, build_related_products)
+RELATED_PRODUCTS_TOP_K       = 10
+# 함께 구매된 주문 수가 이보다 적은 상품은 추천하지 않는다
+RELATED_PRODUCTS_MIN_SUPPORT = 2
+# 한번에 읽는 주문 수
+RELATED_PRODUCTS_BATCH_SIZE  = 5000
+# 누적된 공동 구매 행렬과 반영한 주문 id (다음 실행 때 새 주문만 더한다)
+RELATED_PRODUCTS_STATE       = BASE_DIR / 'related_products.npz'
+
+##POPULAR_SALES
+# 상품 목록 order=popular 정렬에 합산하는 최근 판매 기간 (오늘 포함, 일)
+# 목록 응답 cache는 product_sales_daily를 tag로 갖지 않으므로 순위 변경은 최대 RESPONSE_CACHE_TIMEOUT 늦게 반영된다
+POPULAR_SALES_WINDOW_DAYS = 7
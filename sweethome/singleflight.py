@@ -0,0 +1,148 @@
+"""
+cache miss 요청 합치기 (single-flight)
+
+같은 key의 cache가 비었을 때 동시에 들어온 요청이 모두 같은 무거운 query를 실행하지 않도록
+key 당 한 요청(leader)만 값을 다시 계산하고, 나머지 요청은
+    - 이전 값(stale)이 남아 있으면 바로 이전 값을 받고,
+    - 없으면 leader의 계산이 끝날 때까지 기다렸다가 그 결과를 사용한다.
+
+- worker 안의 thread 끼리는 key 별 Flight(threading.Event)로 합친다.
+- worker 끼리는 SINGLE_FLIGHT_LOCK_DIR 의 lock file(fcntl.flock)로 합친다.
+  다른 worker의 결과를 cache에서 다시 읽을 수 있어야 하므로, cache가 worker 간에 공유되지 않으면(cross_worker=False) 하지 않는다.
+  key는 SINGLE_FLIGHT_LOCK_STRIPES 개의 lock file 중 하나에 hash 되므로, 드물게 다른 key와 lock을 같이 쓸 수 있다.
+- fcntl이 없는 환경(Windows)에서는 worker 안에서만 합친다.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# lock file을 다시 시도하는 간격 (초)
+LOCK_POLL_INTERVAL = 0.01
+
+class Flight:
+    def __init__(self):
+        self.done  = threading.Event()
+        self.value = None
+        self.ok    = False
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock    = threading.Lock()
+        self._counts  = {
+            'leaders'       : 0,
+            'coalesced'     : 0,
+            'stale_served'  : 0,
+            'lock_timeouts' : 0,
+        }
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, in_flight=len(self._flights))
+
+    def run(self, key, compute, stale=None, has_stale=False, reload=None, cross_worker=True):
+        """ key에 대해 compute()를 한번만 실행한다.
+        Args:
+            - compute: 값을 계산해서 cache에 저장까지 하는 함수. (값, 다른 요청과 공유 가능 여부)를 반환한다.
+            - stale, has_stale: 만료/무효화 되었지만 남아있는 이전 값
+            - reload: 다른 worker가 계산을 끝낸 뒤 cache에서 값을 다시 읽는 함수. (찾았는지, 값)을 반환한다.
+            - cross_worker: 다른 worker와도 lock file로 합칠지 여부
+        Returns:
+            - 계산된 값, 다른 요청이 계산한 값 또는 stale 값
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            if has_stale:
+                self.count('stale_served')
+                return stale
+            if flight.done.wait(settings.SINGLE_FLIGHT_TIMEOUT) and flight.ok:
+                self.count('coalesced')
+                return flight.value
+            # leader가 실패했거나 공유할 수 없는 결과(에러 응답 등)였으면 직접 계산한다
+            if not flight.done.is_set():
+                self.count('lock_timeouts')
+            return compute()[0]
+
+        try:
+            value, ok = self.lead(key, compute, stale, has_stale, reload, cross_worker)
+            flight.value, flight.ok = value, ok
+            return value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def lead(self, key, compute, stale, has_stale, reload, cross_worker):
+        """ worker 안의 leader가 다른 worker와 lock file로 한번 더 합친다 """
+        self.count('leaders')
+        if not cross_worker or reload is None:
+            return compute()
+        with file_lock(key, blocking=False) as acquired:
+            if acquired:
+                return compute()
+        if has_stale:
+            self.count('stale_served')
+            return stale, True
+
+        # 다른 worker가 계산 중: lock이 풀리면 그 결과를 cache에서 읽는다
+        with file_lock(key, blocking=True) as acquired:
+            if not acquired:
+                self.count('lock_timeouts')
+                return compute()
+            found, value = reload()
+            if found:
+                self.count('coalesced')
+                return value, True
+            return compute()
+
+def lock_path(key):
+    stripe = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % settings.SINGLE_FLIGHT_LOCK_STRIPES
+    return os.path.join(settings.SINGLE_FLIGHT_LOCK_DIR, '{}.lock'.format(stripe))
+
+@contextmanager
+def file_lock(key, blocking):
+    """ worker 간 lock. blocking이면 SINGLE_FLIGHT_TIMEOUT 동안 기다린다. 얻었는지 여부를 yield 한다. """
+    if fcntl is None:
+        yield True
+        return
+
+    os.makedirs(settings.SINGLE_FLIGHT_LOCK_DIR, exist_ok=True)
+    fd       = os.open(lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+    acquired = False
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if not blocking or time.monotonic() >= deadline:
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+        yield acquired
+    finally:
+        if acquired:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+single_flight = SingleFlight()
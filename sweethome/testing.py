@@ -0,0 +1,229 @@
+"""
+endpoint 별 query budget 회귀 테스트 도구
+
+- 같은 seed의 데이터를 두 가지 크기(DATASET_SIZES)로 만들고 endpoint를 호출해서
+    1. query 수가 데이터 크기와 무관하게 같은지 (row 마다 query가 늘어나는 N+1이 없는지)
+    2. query 수가 view의 query_budget 을 넘지 않는지
+    3. 큰 데이터에서의 응답 시간이 baseline(query_baseline.json) 대비 허용 범위 안인지
+  를 확인한다.
+- 각 view는 method 별 최대 query 수를 query_budget = {'get' : 3} 형태의 class 속성으로 선언한다.
+- 각 app의 tests.py 에서 QueryBudgetTestCase(async view는 AsyncQueryBudgetTestCase)를 상속받아 endpoints 와 urls 를 지정한다.
+- 응답 시간은 측정하는 machine과 부하에 따라 달라지므로 기본으로는 몇 배 느려진 경우만 실패로 보고,
+  baseline을 만든 환경에서는 QUERY_WALL_TIME=1 로 좁은 허용 범위를 사용한다.
+- endpoint를 추가하거나 baseline 보다 빨라진 경우 갱신: QUERY_BASELINE_UPDATE=1 python manage.py test
+"""
+import json
+import os
+import tempfile
+import time
+
+from io import StringIO
+
+from django.conf            import settings
+from django.core.cache      import caches
+from django.core.management import call_command
+from django.test            import TestCase, TransactionTestCase, override_settings
+from django.test.runner     import DiscoverRunner
+from django.urls            import URLPattern, resolve
+
+from sweethome.querylog import QueryRecorder, recording
+from user.models        import User
+from utils              import create_access_token
+
+DATASET_SIZES   = (10, 1000)
+BASELINE_PATH   = os.path.join(settings.BASE_DIR, 'sweethome', 'query_baseline.json')
+# baseline 보다 TIME_TOLERANCE 배 + TIME_SLACK 초 이상 느려지면 실패로 본다
+# 기본값은 다른 machine에서도 통과하도록 넉넉하게 잡고, QUERY_WALL_TIME=1 이면 baseline 환경용 STRICT_* 값을 사용한다
+TIME_TOLERANCE        = 4.0
+TIME_SLACK            = 0.25
+STRICT_TIME_TOLERANCE = 1.0
+STRICT_TIME_SLACK     = 0.02
+# GET 요청은 여러번 호출한 최소값을 응답 시간으로 사용한다
+TIME_REPEAT     = 3
+# test에서 만든 검색 색인이 개발용 색인(settings.SEARCH_INDEX_DIR)을 덮어쓰지 않도록 임시 directory를 사용한다
+SEARCH_INDEX_DIR = tempfile.mkdtemp(prefix='sweethome-test-index-')
+
+class TestRunner(DiscoverRunner):
+    """ file 기반 cache를 임시 directory로 바꿔서 실행한다 (settings.TEST_RUNNER)
+    - 개발 서버가 사용하는 cache에 test data가 섞이거나, 이전 test 실행의 값이 남아있지 않도록 한다.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(CACHES={
+            alias : dict(config, LOCATION=tempfile.mkdtemp(prefix='sweethome-test-cache-'))
+            if config['BACKEND'].endswith('FileBasedCache') else config
+            for alias, config in settings.CACHES.items()
+        })
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+def seed(size):
+    call_command(
+        'seed_dataset',
+        reset         = True,
+        stdout        = StringIO(),
+        users         = size,
+        follows       = size,
+        products      = size,
+        reviews       = size,
+        review_likes  = size,
+        postings      = size,
+        posting_likes = size,
+        scraps        = size,
+        comments      = size,
+        carts         = max(1, size // 10),
+        orders        = size,
+    )
+
+class Endpoint:
+    """ 측정할 요청 하나
+    Args:
+        - method, path: 요청 method와 path (query string 포함 가능)
+        - data: request body (dict) 또는 데이터 크기를 받아 body를 반환하는 함수
+        - login: seed 유저(id=1)의 access token으로 요청할지 여부
+        - prepare: 측정 전에 실행할 함수(데이터 크기를 받는다). 매번 같은 분기를 타도록 상태를 맞추는 데 사용한다.
+    """
+    def __init__(self, method, path, data=None, login=False, prepare=None):
+        self.method  = method
+        self.path    = path
+        self.data    = data
+        self.login   = login
+        self.prepare = prepare
+
+    @property
+    def name(self):
+        return '{} {}{}'.format(self.method, self.path, ' (login)' if self.login else '')
+
+    @property
+    def budget(self):
+        view_class = resolve(self.path.split('?')[0]).func.view_class
+        return getattr(view_class, 'query_budget', {}).get(self.method.lower())
+
+class Measurement:
+    def __init__(self, queries, seconds, status_code):
+        self.queries     = queries
+        self.seconds     = seconds
+        self.status_code = status_code
+
+def measure(client, endpoint, size, token):
+    headers = {'HTTP_AUTHORIZATION' : token} if endpoint.login else {}
+    repeat  = TIME_REPEAT if endpoint.method == 'GET' else 1
+    timings = []
+    for _ in range(repeat):
+        # cache에 남은 값으로 query 수가 달라지지 않도록 매번 비운다 (query cache alias 포함)
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        if endpoint.prepare:
+            endpoint.prepare(size)
+        data = endpoint.data(size) if callable(endpoint.data) else endpoint.data
+
+        recorder = QueryRecorder()
+        with recording(recorder):
+            started = time.perf_counter()
+            if endpoint.method == 'GET':
+                response = client.get(endpoint.path, **headers)
+            else:
+                response = client.generic(
+                    endpoint.method, endpoint.path, json.dumps(data or {}), 'application/json', **headers
+                )
+            # streaming 응답은 body를 읽을 때 query를 실행하므로 끝까지 읽은 뒤에 잰다
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append(time.perf_counter() - started)
+    return Measurement(recorder.count, min(timings), response.status_code)
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+class QueryBudgetMixin:
+    """ app 별 query budget test
+    - endpoints: 측정할 Endpoint 목록
+    - urls: app의 urls module (모든 view가 query_budget을 선언했는지 확인한다)
+    """
+    endpoints = []
+    urls      = None
+
+    @classmethod
+    def measure_endpoints(cls):
+        cls.measurements = {}
+        if not cls.endpoints:
+            return
+        client = cls.client_class()
+        for size in DATASET_SIZES:
+            seed(size)
+            token = create_access_token(User.objects.get(id=1))
+            for endpoint in cls.endpoints:
+                cls.measurements.setdefault(endpoint.name, {})[size] = measure(client, endpoint, size, token)
+
+    def test_responses_succeed(self):
+        for name, by_size in self.measurements.items():
+            for size, measurement in by_size.items():
+                with self.subTest(endpoint=name, size=size):
+                    self.assertLess(measurement.status_code, 500)
+
+    def test_query_count_independent_of_size(self):
+        for name, by_size in self.measurements.items():
+            with self.subTest(endpoint=name):
+                counts = {size : measurement.queries for size, measurement in by_size.items()}
+                self.assertEqual(len(set(counts.values())), 1, 'query 수가 데이터 크기에 따라 달라집니다: {}'.format(counts))
+
+    def test_query_budget(self):
+        for endpoint in self.endpoints:
+            with self.subTest(endpoint=endpoint.name):
+                budget  = endpoint.budget
+                queries = max(measurement.queries for measurement in self.measurements[endpoint.name].values())
+                self.assertIsNotNone(budget, 'view에 {} query_budget이 없습니다'.format(endpoint.method))
+                self.assertLessEqual(queries, budget)
+
+    def test_views_declare_budget(self):
+        if not self.urls:
+            return
+        for pattern in self.urls.urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            view_class = pattern.callback.view_class
+            methods    = [method for method in view_class.http_method_names if method != 'options' and hasattr(view_class, method)]
+            with self.subTest(view=view_class.__name__):
+                self.assertEqual(sorted(getattr(view_class, 'query_budget', {})), sorted(methods))
+
+    def test_wall_time(self):
+        largest  = max(DATASET_SIZES)
+        baseline = load_baseline()
+        current  = {name : round(by_size[largest].seconds, 4) for name, by_size in self.measurements.items()}
+
+        if os.environ.get('QUERY_BASELINE_UPDATE'):
+            baseline.update(current)
+            with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+                json.dump(dict(sorted(baseline.items())), f, ensure_ascii=False, indent=2)
+                f.write('\n')
+            return
+
+        strict    = bool(os.environ.get('QUERY_WALL_TIME'))
+        tolerance = STRICT_TIME_TOLERANCE if strict else TIME_TOLERANCE
+        slack     = STRICT_TIME_SLACK if strict else TIME_SLACK
+        for name, seconds in current.items():
+            with self.subTest(endpoint=name):
+                self.assertTrue(name in baseline, 'baseline이 없습니다. QUERY_BASELINE_UPDATE=1 로 갱신하세요')
+                self.assertLessEqual(seconds, baseline[name] * (1 + tolerance) + slack,
+                    '응답 시간이 baseline({:.4f}s) 보다 느려졌습니다'.format(baseline[name]))
+
+# 목록을 streaming 하는 endpoint도 데이터 크기와 무관하게 chunk 하나로 처리되도록 한다 (chunk 마다 prefetch query가 늘어난다)
+@override_settings(BCRYPT_ROUNDS=4, SEARCH_INDEX_DIR=SEARCH_INDEX_DIR, STREAMING_CHUNK_SIZE=max(DATASET_SIZES))
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.measure_endpoints()
+
+@override_settings(BCRYPT_ROUNDS=4, SEARCH_INDEX_DIR=SEARCH_INDEX_DIR, STREAMING_CHUNK_SIZE=max(DATASET_SIZES))
+class AsyncQueryBudgetTestCase(QueryBudgetMixin, TransactionTestCase):
+    """ async view는 db_executor thread의 다른 DB connection으로 조회하므로 commit 된 데이터로 한번만 측정한다 """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.measure_endpoints()
@@ -0,0 +1,483 @@
+import asyncio
+import datetime
+import gzip
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from decimal      import Decimal
+from unittest     import mock, skipUnless
+from urllib.parse import urlencode
+
+from django.conf       import settings
+from django.core.cache import cache
+from django.db         import transaction
+from django.http       import HttpResponse, JsonResponse as DjangoJsonResponse, StreamingHttpResponse
+from django.test       import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls       import path
+
+from product.models         import Category, SubCategory
+from sweethome              import compression, testing
+from sweethome.admission    import AdmissionController, admission_controller
+from sweethome.db.pool      import ConnectionPool, PoolTimeout
+from sweethome.middleware   import STICKY_COOKIE_NAME, ReplicaRoutingMiddleware
+from sweethome.querycache   import query_cache
+from sweethome.renderers    import RENDERERS, JsonResponse, get_renderer, orjson
+from sweethome.routers      import ReplicaRouter, _use_primary, use_primary
+from sweethome.singleflight import single_flight
+from user.models            import User
+from utils                  import create_access_token, run_in_db_thread
+
+def ping(connection):
+    connection.execute('SELECT 1')
+
+class ConnectionPoolTest(SimpleTestCase):
+    def make_pool(self, connect=None, **options):
+        return ConnectionPool('pool-test', connect or (lambda: sqlite3.connect(':memory:')), ping, options)
+
+    def test_released_connection_is_reused(self):
+        pool       = self.make_pool(MAX_SIZE=2)
+        connection = pool.checkout()
+        connection.execute('CREATE TABLE pooled (id INTEGER)')
+        pool.release(connection)
+
+        self.assertIs(pool.checkout(), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['idle']), (1, 1, 0))
+        self.assertEqual((stats['checkouts'], stats['created']), (2, 1))
+
+    def test_broken_connection_is_replaced(self):
+        pool       = self.make_pool(MAX_SIZE=1)
+        connection = pool.checkout()
+        pool.release(connection, broken=True)
+        self.assertEqual(pool.stats()['size'], 0)
+
+        # health check에 실패한 idle connection은 버리고 새로 연다
+        connection = pool.checkout()
+        pool.release(connection)
+        connection.close()
+        replaced = pool.checkout()
+
+        self.assertIsNot(replaced, connection)
+        ping(replaced)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['discarded'], stats['created']), (1, 2, 3))
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(MAX_SIZE=1, CHECKOUT_TIMEOUT=0.05)
+        pool.checkout()
+
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()['checkout_failures'], 1)
+
+    def test_failed_fill_releases_only_the_failed_slot(self):
+        attempts = []
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 2:
+                raise sqlite3.OperationalError('unable to open database file')
+            return sqlite3.connect(':memory:')
+        pool = self.make_pool(connect, MIN_SIZE=3, MAX_SIZE=3, CHECKOUT_TIMEOUT=0.05)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.checkout()
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['checkout_failures']), (1, 1, 1))
+
+        # 남은 자리를 다시 채우고, MAX_SIZE 까지 모두 꺼낼 수 있다
+        connections = [pool.checkout() for _ in range(3)]
+        self.assertEqual(len({id(connection) for connection in connections}), 3)
+        self.assertEqual(pool.stats()['size'], 3)
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def test_reads_go_to_replica_unless_pinned_or_in_transaction(self):
+        router = ReplicaRouter()
+        # TestCase가 test를 transaction으로 감싸므로 바깥 transaction 밖인 것처럼 확인한다
+        with mock.patch.object(transaction.get_connection(), 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(User), 'replica')
+            with use_primary():
+                self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_read(User), 'default')
+        self.assertEqual(router.db_for_write(User), 'default')
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.routed  = []
+        def get_response(request):
+            with mock.patch.object(transaction.get_connection(), 'in_atomic_block', False):
+                self.routed.append(ReplicaRouter().db_for_read(User))
+            return HttpResponse(status=int(request.GET.get('status', 200)))
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+
+    def token(self, user_id):
+        return create_access_token(User(id=user_id, name='user{}'.format(user_id), image_url='', description=''))
+
+    def request(self, method, user_id, cookies=None, **params):
+        request = getattr(self.factory, method)('/?' + urlencode(params), HTTP_AUTHORIZATION=self.token(user_id))
+        request.COOKIES.update(cookies or {})
+        return self.middleware(request)
+
+    def sticky_cookie(self, response):
+        return {STICKY_COOKIE_NAME : response.cookies[STICKY_COOKIE_NAME].value}
+
+    def test_reads_after_a_write_stick_to_primary_for_that_user(self):
+        cookies = self.sticky_cookie(self.request('post', 1))
+        self.assertEqual(self.routed, ['default'])
+
+        self.request('get', 1, cookies)
+        self.request('get', 2, cookies)
+        self.request('get', 1)
+        self.assertEqual(self.routed[1:], ['default', 'replica', 'replica'])
+
+    def test_sticky_cookie_expires_and_is_not_set_for_failed_writes(self):
+        self.assertNotIn(STICKY_COOKIE_NAME, self.request('post', 1, status=400).cookies)
+
+        cookies = self.sticky_cookie(self.request('post', 1))
+        with mock.patch('time.time', return_value=time.time() + 10):
+            self.request('get', 1, cookies)
+        self.request('get', 1, {STICKY_COOKIE_NAME : '1'})
+        self.assertEqual(self.routed[-2:], ['replica', 'replica'])
+
+# HybridMiddlewareTest, StreamingMiddlewareTest 의 ROOT_URLCONF. view는 DB query 대신 처리 중에 본 상태를 기록한다
+slow_requests = []
+streamed      = []
+
+async def slow_view(request):
+    await run_in_db_thread(time.sleep, 0.3)
+    slow_requests.append((request.method, _use_primary.get(), admission_controller.in_flight))
+    return JsonResponse({'message' : 'SUCCESS'}, status=200)
+
+def stream_view(request):
+    def chunks():
+        for number in range(3):
+            streamed.append((_use_primary.get(), admission_controller.in_flight))
+            yield str(number)
+    return StreamingHttpResponse(chunks(), content_type='text/plain')
+
+urlpatterns = [path('slow', slow_view), path('stream', stream_view)]
+
+@override_settings(ROOT_URLCONF='sweethome.tests', DATABASE_REPLICAS=['replica'])
+class HybridMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        slow_requests.clear()
+
+    async def test_async_views_run_concurrently_through_the_middleware(self):
+        client  = AsyncClient()
+        started = time.perf_counter()
+        responses = await asyncio.gather(client.post('/slow'), *[client.get('/slow') for _ in range(3)])
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        # sync 전용 middleware가 있으면 요청이 하나씩 처리되어 1.2초 이상 걸린다
+        self.assertLess(elapsed, 0.9)
+        # admission 자리와 primary 고정은 view를 await 하는 동안 유지되고, 요청끼리 섞이지 않는다
+        self.assertEqual(max(in_flight for _, _, in_flight in slow_requests), 4)
+        self.assertEqual(sorted((method, pinned) for method, pinned, _ in slow_requests), [
+            ('GET', False), ('GET', False), ('GET', False), ('POST', True)
+        ])
+        self.assertEqual(admission_controller.in_flight, 0)
+
+@override_settings(ROOT_URLCONF='sweethome.tests', DATABASE_REPLICAS=['replica'])
+class StreamingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        streamed.clear()
+
+    def test_admission_slot_and_primary_pin_are_held_until_the_body_is_sent(self):
+        response = self.client.post('/stream')
+        self.assertEqual(admission_controller.in_flight, 1)
+        self.assertEqual(b''.join(response.streaming_content), b'012')
+        self.assertEqual(streamed, [(True, 1)] * 3)
+        self.assertEqual(admission_controller.in_flight, 0)
+
+        b''.join(self.client.get('/stream').streaming_content)
+        self.assertEqual(streamed[3:], [(False, 1)] * 3)
+
+    def test_admission_slot_is_released_when_the_stream_is_closed_unread(self):
+        self.client.get('/stream').close()
+        self.assertEqual(streamed, [])
+        self.assertEqual(admission_controller.in_flight, 0)
+
+def sample_value(text, sample):
+    """ Prometheus text에서 sample(이름과 label) 값. 없으면 0 """
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+@override_settings(SEARCH_INDEX_DIR=testing.SEARCH_INDEX_DIR, SQL_INSTRUMENTATION_SAMPLE_RATE=1.0)
+class QueryInstrumentationMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        testing.seed(10)
+
+    def setUp(self):
+        query_cache.clear()
+
+    def scrape(self, sample):
+        return sample_value(self.client.get('/metrics').content.decode(), sample)
+
+    def test_sampled_request_reports_server_timing_and_histograms(self):
+        before   = {name : self.scrape('{}_count{{route="products"}}'.format(name)) for name in (
+            'sweethome_request_duration_seconds', 'sweethome_request_queries', 'sweethome_request_db_seconds'
+        )}
+        response = self.client.get('/products')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", app;dur=[\d.]+$')
+        for name, count in before.items():
+            with self.subTest(metric=name):
+                self.assertEqual(self.scrape('{}_count{{route="products"}}'.format(name)), count + 1)
+        self.assertGreater(self.scrape('sweethome_request_queries_sum{route="products"}'), 0)
+
+    def test_repeated_queries_are_counted_and_logged(self):
+        before = self.scrape('sweethome_n_plus_one_total{route="products/<int:product_id>"}')
+        with self.settings(SQL_N_PLUS_ONE_THRESHOLD=0), self.assertLogs('sweethome.middleware', 'WARNING') as logs:
+            self.client.get('/products/1')
+
+        self.assertIn('N+1 suspected on GET products/<int:product_id>', logs.output[0])
+        self.assertEqual(self.scrape('sweethome_n_plus_one_total{route="products/<int:product_id>"}'), before + 1)
+
+    def test_unsampled_request_records_latency_only(self):
+        before = (
+            self.scrape('sweethome_request_duration_seconds_count{route="posting"}'),
+            self.scrape('sweethome_request_queries_count{route="posting"}'),
+        )
+        with self.settings(SQL_INSTRUMENTATION_SAMPLE_RATE=0):
+            response = self.client.get('/posting')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.scrape('sweethome_request_duration_seconds_count{route="posting"}'), before[0] + 1)
+        self.assertEqual(self.scrape('sweethome_request_queries_count{route="posting"}'), before[1])
+
+class OpsViewTest(SimpleTestCase):
+    def test_ops_endpoints_are_only_served_to_allowed_ips(self):
+        for path in ('/stats', '/metrics'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 200)
+                self.assertEqual(self.client.get(path, REMOTE_ADDR='203.0.113.7').status_code, 403)
+                with self.settings(OPS_ALLOWED_IPS=['203.0.113.7']):
+                    self.assertEqual(self.client.get(path, REMOTE_ADDR='203.0.113.7').status_code, 200)
+                    self.assertEqual(self.client.get(path).status_code, 403)
+
+class RendererTest(SimpleTestCase):
+    payload = {
+        'name'       : '원목 선반',
+        'price'      : Decimal('12000.50'),
+        'created_at' : datetime.datetime(2021, 3, 1, 9, 30, 0, 1001, tzinfo=datetime.timezone.utc),
+        'seoul'      : datetime.datetime(2021, 3, 1, 9, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=9))),
+        'naive'      : datetime.datetime(2021, 3, 1, 9, 30),
+        'ordered_at' : datetime.date(2021, 3, 1),
+        'histogram'  : {5 : 3, 1 : 0},
+    }
+    expected = (
+        '{"name":"원목 선반","price":"12000.50","created_at":"2021-03-01T09:30:00.001Z",'
+        '"seoul":"2021-03-01T09:30:00+09:00","naive":"2021-03-01T09:30:00","ordered_at":"2021-03-01",'
+        '"histogram":{"5":3,"1":0}}'
+    ).encode('utf-8')
+
+    def test_stdlib_renderer_output(self):
+        self.assertEqual(RENDERERS['stdlib']().dumps(self.payload), self.expected)
+
+    def test_output_matches_django_json_response(self):
+        # renderer를 도입하기 전의 API 형식 (datetime은 밀리초까지)
+        for name in RENDERERS if orjson else ['stdlib']:
+            with self.subTest(renderer=name), self.settings(JSON_RENDERER=name):
+                self.assertEqual(
+                    json.loads(JsonResponse(self.payload).content),
+                    json.loads(DjangoJsonResponse(self.payload, json_dumps_params={'ensure_ascii' : False}).content)
+                )
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_renderer_matches_stdlib(self):
+        renderer = RENDERERS['orjson']()
+        self.assertEqual(renderer.dumps(self.payload), self.expected)
+        with self.assertRaises(TypeError):
+            renderer.dumps({'value' : object()})
+
+    def test_renderer_follows_setting(self):
+        with self.settings(JSON_RENDERER='stdlib'):
+            self.assertEqual(get_renderer().name, 'stdlib')
+            self.assertEqual(JsonResponse(self.payload).content, self.expected)
+        if orjson:
+            with self.settings(JSON_RENDERER='orjson'):
+                self.assertEqual(get_renderer().name, 'orjson')
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(1, 11):
+            category = Category.objects.create(name='카테고리 {}'.format(number))
+            SubCategory.objects.create(name='서브 카테고리 {}'.format(number), category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_response_is_not_recompressed(self):
+        plain = self.client.get('/products/category').content
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            response = self.client.get('/products/category', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+        compress.assert_not_called()
+
+    def test_identity_when_not_accepted(self):
+        response = self.client.get('/products/category', HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+def invalidate_in_process(tag):
+    query_cache.invalidate(tag)
+
+class SharedQueryCacheTest(SimpleTestCase):
+    def setUp(self):
+        query_cache.clear()
+
+    def test_default_cache_is_shared_between_workers(self):
+        self.assertNotIn('LocMemCache', settings.CACHES[settings.QUERY_CACHE_ALIAS]['BACKEND'])
+
+    def test_invalidation_in_another_worker_is_visible(self):
+        self.assertEqual(query_cache.get_or_set('shared-cache-test', {}, ['products'], lambda: 'old'), 'old')
+
+        # 다른 worker(process)의 cache instance로 invalidate 한다
+        process = multiprocessing.get_context('fork').Process(target=invalidate_in_process, args=('products',))
+        process.start()
+        process.join()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(query_cache.get_or_set('shared-cache-test', {}, ['products'], lambda: 'new'), 'new')
+
+def slow_compute(log_path):
+    def compute():
+        with open(log_path, 'a') as f:
+            f.write('computed\n')
+        time.sleep(0.3)
+        return 'value'
+    return compute
+
+def compute_in_process(log_path):
+    query_cache.get_or_set('single-flight-test', {}, ['products'], slow_compute(log_path))
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.log_path = tempfile.mktemp(prefix='sweethome-single-flight-')
+        self.addCleanup(lambda: os.path.exists(self.log_path) and os.remove(self.log_path))
+
+    def computed(self):
+        with open(self.log_path) as f:
+            return len(f.readlines())
+
+    def test_threads_share_one_computation(self):
+        before  = single_flight.stats()['coalesced']
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                query_cache.get_or_set('single-flight-test', {}, ['products'], slow_compute(self.log_path))
+            )) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.computed(), 1)
+        self.assertEqual(single_flight.stats()['coalesced'] - before, 7)
+
+    def test_stale_value_is_served_while_recomputing(self):
+        query_cache.get_or_set('single-flight-test', {}, ['products'], lambda: 'old')
+        query_cache.invalidate('products')
+
+        leader = threading.Thread(
+            target=query_cache.get_or_set, args=('single-flight-test', {}, ['products'], slow_compute(self.log_path))
+        )
+        leader.start()
+        time.sleep(0.1)
+        self.assertEqual(query_cache.get_or_set('single-flight-test', {}, ['products'], lambda: 'other'), 'old')
+        leader.join()
+        self.assertEqual(query_cache.get_or_set('single-flight-test', {}, ['products'], lambda: 'other'), 'value')
+
+    def run_workers(self, count):
+        context   = multiprocessing.get_context('fork')
+        processes = [context.Process(target=compute_in_process, args=(self.log_path,)) for _ in range(count)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    @override_settings(SINGLE_FLIGHT_LOCK_DIR=tempfile.mkdtemp(prefix='sweethome-test-locks-'))
+    def test_workers_share_one_computation(self):
+        self.run_workers(4)
+        self.assertEqual(self.computed(), 1)
+
+    @override_settings(
+        CACHES={'default' : {'BACKEND' : 'django.core.cache.backends.locmem.LocMemCache'}},
+        SINGLE_FLIGHT_LOCK_DIR=tempfile.mkdtemp(prefix='sweethome-test-locks-'),
+    )
+    def test_worker_local_cache_does_not_wait_for_other_workers(self):
+        # 다른 worker의 계산 결과를 읽을 수 없으므로 lock file을 기다리지 않고 각 worker가 직접 계산한다
+        self.run_workers(2)
+        with mock.patch('sweethome.singleflight.file_lock') as file_lock:
+            query_cache.get_or_set('single-flight-test', {}, ['products'], slow_compute(self.log_path))
+
+        file_lock.assert_not_called()
+        self.assertEqual(self.computed(), 3)
+
+SIGNIN_CLASS = {'priority' : 'low', 'target_latency' : 0.5, 'min_limit' : 1, 'max_limit' : 4, 'retry_after' : 2}
+
+@override_settings(ADMISSION_WINDOW=0)
+class AdmissionControlTest(SimpleTestCase):
+    def controller(self):
+        return AdmissionController(classes=None, routes=[])
+
+    @override_settings(ADMISSION_CLASSES={'default' : SIGNIN_CLASS})
+    def test_limit_backs_off_on_slow_requests_and_recovers(self):
+        controller = self.controller()
+        signin     = controller.classify('/user/signin')
+
+        for _ in range(4):
+            self.assertTrue(controller.acquire(signin))
+        self.assertFalse(controller.acquire(signin))
+        for _ in range(4):
+            controller.release(signin, 2.0)
+        self.assertEqual(signin.limit, 1)
+        self.assertEqual(controller.retry_after(signin), 8)
+
+        # limit까지 찬 상태에서 빠르게 끝나면 window 마다 1씩 늘어난다
+        for limit in (1, 2, 3):
+            self.assertEqual(signin.limit, limit)
+            for _ in range(limit):
+                self.assertTrue(controller.acquire(signin))
+            for _ in range(limit):
+                controller.release(signin, 0.01)
+        self.assertEqual(signin.limit, 4)
+
+    @override_settings(ADMISSION_MAX_CONCURRENCY=4)
+    def test_low_priority_is_shed_before_critical(self):
+        controller = self.controller()
+        controller.configure()
+        checkout   = controller._classes['checkout']
+        signin     = controller._classes['signin']
+
+        self.assertTrue(controller.acquire(signin))
+        self.assertFalse(controller.acquire(signin))
+        for _ in range(3):
+            self.assertTrue(controller.acquire(checkout))
+        self.assertEqual(controller.stats()['signin']['rejected'], 1)
+
+    def test_middleware_rejects_with_retry_after(self):
+        signin = admission_controller.classify('/user/signin')
+        with mock.patch.object(signin, 'limit', 0):
+            response = self.client.post('/user/signin', {}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'message' : 'SERVER_BUSY'})
+        self.assertTrue(int(response['Retry-After']) >= 1)
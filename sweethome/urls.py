@@ -1,8 +1,27 @@
 from django.urls import path, include
 
+from sweethome.views import MetricsView, StatsView
+
 urlpatterns = [
     path('orders', include('order.urls')),
     path('products', include('product.urls')),
     path('posting', include('posting.urls')),
     path('user', include('user.urls')),
+    path('search', include('search.urls')),
+    path('stats', StatsView.as_view()),
+    path('metrics', MetricsView.as_view()),
+    # ASGI 서버용 async view (sync view와 응답 형식 동일)
+    path('async/products', include('product.async_urls')),
+    path('async/posting', include('posting.async_urls')),
+]
+
+# admission control class (sweethome/admission.py, settings.ADMISSION_CLASSES)
+# path(앞의 / 제외)에 위에서부터 처음 일치하는 정규식의 class를 사용한다. None이면 제한하지 않고, 일치하는 것이 없으면 'default'
+admission_routes = [
+    (r'^(stats|metrics)$', None),
+    (r'^orders/', 'checkout'),
+    (r'^products/cart$', 'checkout'),
+    (r'^user/(signin|signup|token/refresh)$', 'signin'),
+    (r'^(async/)?posting', 'feed'),
+    (r'^(async/)?products', 'catalog'),
 ]
@@ -0,0 +1,74 @@
+from django.conf  import settings
+from django.http  import HttpResponse
+from django.views import View
+
+from sweethome              import metrics
+from sweethome.admission    import admission_controller
+from sweethome.db.pool      import pool_stats
+from sweethome.renderers    import JsonResponse
+from sweethome.singleflight import single_flight
+from utils                  import token_cache
+
+def ops_only(func):
+    """ settings.OPS_ALLOWED_IPS 에서 온 요청만 통과시킨다 """
+    def wrapper(self, request, *args, **kwargs):
+        if request.META.get('REMOTE_ADDR') not in settings.OPS_ALLOWED_IPS:
+            return JsonResponse({'message' : 'FORBIDDEN'}, status=403)
+        return func(self, request, *args, **kwargs)
+    return wrapper
+
+class StatsView(View):
+    @ops_only
+    def get(self, request):
+        """ [Ops] 현재 worker process의 cache 상태
+        Returns:
+            - 200: {'token_cache': token cache 크기와 hit/miss 횟수, 'db_pools': DB alias 별 connection pool 상태,
+                    'single_flight': cache miss 계산 횟수(leaders), 다른 요청의 결과를 기다려 사용한 횟수(coalesced),
+                                     stale 값으로 응답한 횟수(stale_served), 기다리다 직접 계산한 횟수(lock_timeouts),
+                    'admission': admission class 별 우선순위, 현재 limit, 처리 중인 요청 수, 받은/거절한 요청 수}
+            - 403: settings.OPS_ALLOWED_IPS 밖에서 온 요청
+        Note:
+            - 값은 요청을 처리한 worker 한 개의 값이다.
+        """
+        return JsonResponse({
+            'token_cache'   : token_cache.stats(),
+            'db_pools'      : pool_stats(),
+            'single_flight' : single_flight.stats(),
+            'admission'     : admission_controller.stats(),
+        }, status=200)
+
+class MetricsView(View):
+    @ops_only
+    def get(self, request):
+        """ [Ops] Prometheus scrape endpoint
+        Returns:
+            - 200: route 별 latency / SQL query 수 / SQL 시간 histogram, N+1 감지 횟수, token cache와 DB pool gauge,
+                    admission control limit / 처리 중인 요청 수와 거절 횟수 (text 형식)
+            - 403: settings.OPS_ALLOWED_IPS 밖에서 온 요청
+        Note:
+            - 값은 요청을 처리한 worker 한 개의 값이다.
+        """
+        cache_stats = token_cache.stats()
+        pools       = pool_stats()
+        lines       = metrics.gauge_lines(
+            'sweethome_token_cache', 'Token cache size and hit/miss counts', cache_stats, 'stat'
+        )
+        for stat in ('size', 'idle', 'in_use', 'max_size', 'checkouts', 'checkout_failures', 'created', 'discarded'):
+            lines.extend(metrics.gauge_lines(
+                'sweethome_db_pool_{}'.format(stat), 'Connection pool {}'.format(stat.replace('_', ' ')),
+                {alias : values[stat] for alias, values in pools.items()}, 'alias'
+            ))
+        lines.extend(metrics.gauge_lines(
+            'sweethome_single_flight', 'Single-flight cache recompute counts', single_flight.stats(), 'stat'
+        ))
+        admission = admission_controller.stats()
+        for stat in ('limit', 'in_flight'):
+            lines.extend(metrics.gauge_lines(
+                'sweethome_admission_{}'.format(stat), 'Admission control {}'.format(stat.replace('_', ' ')),
+                {name : values[stat] for name, values in admission.items()}, 'admission_class'
+            ))
+        return HttpResponse(
+            metrics.render_prometheus(lines),
+            content_type = 'text/plain; version=0.0.4; charset=utf-8',
+            status       = 200,
+        )
@@ -0,0 +1,90 @@
+"""
+유저 프로필의 집계 값(게시글, 팔로워, 팔로잉, 스크랩, 좋아요 수)을 user_counters에 미리 저장해둔다.
+
+- 게시글/팔로우/좋아요/스크랩이 생성, 삭제될 때 user.signals 에서 add_count 로 갱신한다.
+- 렌더링된 프로필은 cache에 저장하고, 값이 바뀌면 cache를 지운다.
+- 값이 어긋났을 경우 recount_user_counters 명령으로 다시 계산한다.
+"""
+from django.conf       import settings
+from django.core.cache import cache
+from django.db         import transaction, IntegrityError
+from django.db.models  import Count, F
+
+from user.models    import User, Follow, UserCounter
+from posting.models import Posting, PostingLike, PostingScrap
+
+# counter 필드 -> (집계할 model, 유저를 가리키는 필드)
+COUNTER_SOURCES = {
+    'posting_count'   : (Posting, 'user_id'),
+    'follower_count'  : (Follow, 'to_user_id'),
+    'following_count' : (Follow, 'from_user_id'),
+    'scrap_count'     : (PostingScrap, 'user_id'),
+    'like_count'      : (PostingLike, 'user_id'),
+}
+
+def profile_cache_key(user_id):
+    return 'user-profile:{}'.format(user_id)
+
+def invalidate_profile(user_id):
+    transaction.on_commit(lambda: cache.delete(profile_cache_key(user_id)))
+
+def add_count(user_id, field, amount):
+    """ F()를 사용해서 동시에 들어온 요청끼리도 값이 덮어써지지 않도록 update 한다. """
+    if not UserCounter.objects.filter(user_id=user_id).update(**{field : F(field) + amount}):
+        recount([user_id])
+    invalidate_profile(user_id)
+
+def recount(user_ids):
+    """ user_ids의 counter를 실제 COUNT 값으로 다시 계산해서 저장한다. (counter 종류별로 GROUP BY query 1번) """
+    counts = {user_id : {field : 0 for field in COUNTER_SOURCES} for user_id in user_ids}
+    for field, (model, user_field) in COUNTER_SOURCES.items():
+        rows = model.objects.filter(**{user_field + '__in' : user_ids})\
+            .values(user_field).annotate(count=Count('id')).values_list(user_field, 'count')
+        for user_id, count in rows:
+            counts[user_id][field] = count
+
+    users    = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    existing = set(UserCounter.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    UserCounter.objects.bulk_update(
+        [UserCounter(user_id=user_id, **counts[user_id]) for user_id in existing], list(COUNTER_SOURCES)
+    )
+    try:
+        with transaction.atomic():
+            UserCounter.objects.bulk_create([
+                UserCounter(user_id=user_id, **counts[user_id]) for user_id in users - existing
+            ])
+    except IntegrityError:
+        # 다른 요청이 먼저 counter를 만든 경우: 그 값을 그대로 사용한다
+        pass
+    cache.delete_many([profile_cache_key(user_id) for user_id in user_ids])
+
+def get_profile(user_id):
+    """ 렌더링된 프로필 dict. cache에 없을 때만 users, user_counters를 조회한다.
+    Raises:
+        - User.DoesNotExist: 유저가 존재하지 않을 경우
+    """
+    key     = profile_cache_key(user_id)
+    profile = cache.get(key)
+    if profile is not None:
+        return profile
+
+    user = User.objects.select_related('counter').get(id=user_id)
+    try:
+        counter = user.counter
+    except UserCounter.DoesNotExist:
+        recount([user_id])
+        counter = UserCounter.objects.get(user_id=user_id)
+
+    profile = {
+        'id'              : user.id,
+        'name'            : user.name,
+        'image_url'       : user.image_url,
+        'description'     : user.description,
+        'posting_count'   : counter.posting_count,
+        'follower_count'  : counter.follower_count,
+        'following_count' : counter.following_count,
+        'scrap_count'     : counter.scrap_count,
+        'like_count'      : counter.like_count,
+    }
+    cache.set(key, profile, settings.PROFILE_CACHE_TIMEOUT)
+    return profile
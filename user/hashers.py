@@ -0,0 +1,96 @@
+"""
+bcrypt 연산을 요청 thread가 아닌 별도의 process pool에서 처리한다.
+
+- pool 크기(PASSWORD_HASHER_WORKERS) + 대기열 크기(PASSWORD_HASHER_QUEUE_SIZE)를 넘는 요청은
+  기다리지 않고 바로 HasherBusy 를 발생시킨다. (view에서 503 처리)
+- bcrypt cost는 settings.BCRYPT_ROUNDS 로 설정하며, cost가 바뀌면 다음 로그인 때 다시 hash 한다.
+"""
+import multiprocessing
+import threading
+
+from concurrent.futures         import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from django.conf import settings
+
+class HasherBusy(Exception):
+    pass
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _checkpw(password, hashed_password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+class PasswordHasherPool:
+    def __init__(self, workers, queue_size, timeout):
+        self.workers   = workers
+        self.timeout   = timeout
+        self._slots    = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock     = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # thread를 사용하는 WSGI worker 안에서 fork 하지 않도록 forkserver 사용
+                    self._executor = ProcessPoolExecutor(
+                        max_workers = self.workers,
+                        mp_context  = multiprocessing.get_context('forkserver'),
+                    )
+        return self._executor
+
+    def _discard(self, executor):
+        """ worker process가 죽어서 깨진 pool을 버린다. 다음 요청에서 새로 만든다. """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def run(self, func, *args):
+        # 대기열 자리가 없으면 기다리지 않고 바로 거절한다
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(executor)
+            raise HasherBusy
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # 이미 503으로 응답한 요청의 hash를 계산하느라 worker와 대기열 자리를 쓰지 않도록 대기 중인 작업은 취소한다
+            # (worker에 넘어가서 실행 중인 작업은 취소되지 않고 끝날 때 자리를 돌려준다)
+            future.cancel()
+            raise HasherBusy
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise HasherBusy
+
+hasher_pool = PasswordHasherPool(
+    settings.PASSWORD_HASHER_WORKERS,
+    settings.PASSWORD_HASHER_QUEUE_SIZE,
+    settings.PASSWORD_HASHER_TIMEOUT,
+)
+
+def hash_password(password):
+    return hasher_pool.run(_hashpw, password, settings.BCRYPT_ROUNDS)
+
+def check_password(password, hashed_password):
+    return hasher_pool.run(_checkpw, password, hashed_password)
+
+def needs_rehash(hashed_password):
+    # bcrypt hash 형식: $2b$<cost>$<salt + hash>
+    try:
+        return int(hashed_password.split('$')[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,14 @@
+import io
+
+from django.core.management import call_command
+
+from job.queue     import task
+from user.counters import recount
+
+@task('user.recount_counters')
+def recount_counters(user_ids=None):
+    """ user_counters를 실제 COUNT 값으로 다시 계산한다. user_ids가 없으면 전체 유저 """
+    if user_ids:
+        recount(user_ids)
+    else:
+        call_command('recount_user_counters', stdout=io.StringIO())
@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools          import islice, repeat
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db                   import transaction
+
+from user.models  import User
+from user.hashers import _hashpw
+from user.views   import MINIMUM_PASSWORD_LENGTH, MINIMUM_NAME_LENGTH, MAXIMUN_NAME_LENGTH
+
+def read_rows(path, file_format):
+    with open(path, encoding='utf-8', newline='') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class Command(BaseCommand):
+    help = 'JSONL/CSV 파일의 유저를 한번에 가입시킨다 (email, password, name, [image_url], [description])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None,
+            help='파일 형식. 지정하지 않으면 확장자로 판단한다.')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+            help='중복 검사와 hash를 한번에 처리할 row 수')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='bulk_create 한번에 insert 할 row 수')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+            help='bcrypt hash에 사용할 process 수')
+        parser.add_argument('--rounds', type=int, default=settings.BCRYPT_ROUNDS,
+            help='bcrypt cost (기본값: settings.BCRYPT_ROUNDS)')
+
+    def handle(self, *args, **options):
+        path        = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        if not os.path.exists(path):
+            raise CommandError('file not found: {}'.format(path))
+
+        self.read    = 0
+        self.created = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+
+        # 파일 안에서의 중복을 막기 위해 지금까지 처리한 email, name을 기억한다
+        seen_emails = set()
+        seen_names  = set()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for rows in chunked(read_rows(path, file_format), options['chunk_size']):
+                self.read += len(rows)
+                users      = self.validate(rows, seen_emails, seen_names)
+                users      = self.exclude_existing(users)
+
+                hashed_passwords = executor.map(
+                    _hashpw, [user['password'] for user in users], repeat(options['rounds']), chunksize=64
+                )
+                with transaction.atomic():
+                    User.objects.bulk_create([
+                        User(
+                            email       = user['email'],
+                            password    = hashed_password,
+                            name        = user['name'],
+                            description = user.get('description') or None,
+                            **({'image_url' : user['image_url']} if user.get('image_url') else {})
+                        ) for user, hashed_password in zip(users, hashed_passwords)
+                    ], batch_size=options['batch_size'])
+
+                self.created += len(users)
+                self.report()
+
+        self.stdout.write(self.style.SUCCESS('done'))
+
+    def validate(self, rows, seen_emails, seen_names):
+        users = []
+        for row in rows:
+            email    = (row.get('email') or '').strip()
+            password = row.get('password') or ''
+            name     = (row.get('name') or '').strip()
+            if (
+                not email or not name
+                or len(password) < MINIMUM_PASSWORD_LENGTH
+                or not MINIMUM_NAME_LENGTH <= len(name) <= MAXIMUN_NAME_LENGTH
+                or email in seen_emails or name in seen_names
+            ):
+                self.skipped += 1
+                continue
+            seen_emails.add(email)
+            seen_names.add(name)
+            users.append(dict(row, email=email, name=name))
+        return users
+
+    def exclude_existing(self, users):
+        # chunk 단위로 IN query 한번씩만 사용해서 이미 가입된 email, name을 걸러낸다
+        emails = set(User.objects.filter(email__in=[user['email'] for user in users])\
+            .values_list('email', flat=True))
+        names  = set(User.objects.filter(name__in=[user['name'] for user in users])\
+            .values_list('name', flat=True))
+        new_users = [user for user in users if user['email'] not in emails and user['name'] not in names]
+        self.skipped += len(users) - len(new_users)
+        return new_users
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write('read {:,} / created {:,} / skipped {:,} ({:,.0f} rows/s)'.format(
+            self.read, self.created, self.skipped, self.read / elapsed if elapsed else 0
+        ))
@@ -0,0 +1,47 @@
+import json
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+
+from user.hashers import _hashpw
+from user.models  import User
+from utils        import create_access_token, create_refresh_token
+
+LOAD_USER_EMAIL = 'loadtest-{}@sweethome.test'
+
+class Command(BaseCommand):
+    help = '부하 테스트(locust_test.py)용 유저를 만들고 token pool 파일(JSON)을 생성한다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--password', default='loadtest1234')
+        parser.add_argument('--output', default='load_tokens.json')
+
+    def handle(self, *args, **options):
+        emails   = [LOAD_USER_EMAIL.format(number) for number in range(options['users'])]
+        existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        # 부하 테스트 유저는 모두 같은 비밀번호를 사용하므로 hash는 한번만 계산한다
+        password = _hashpw(options['password'], settings.BCRYPT_ROUNDS)
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(email=email, password=password, name='loadtest{}'.format(number))
+                for number, email in enumerate(emails) if email not in existing
+            ])
+        users = User.objects.filter(email__in=emails).order_by('id')
+
+        tokens = [{
+            'user_id'       : user.id,
+            'email'         : user.email,
+            'password'      : options['password'],
+            'access_token'  : create_access_token(user),
+            'refresh_token' : create_refresh_token(user),
+        } for user in users]
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(tokens, f, ensure_ascii=False, indent=2)
+
+        self.stdout.write(self.style.SUCCESS('{} users ({} new) -> {}'.format(
+            len(tokens), len(emails) - len(existing), options['output']
+        )))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.counters import recount
+from user.models   import User
+
+class Command(BaseCommand):
+    help = 'user_counters의 값을 실제 COUNT 값으로 batch 단위로 다시 계산한다'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started  = time.monotonic()
+        last_id  = 0
+        finished = 0
+        while True:
+            # id 기준 keyset pagination (OFFSET 없이)
+            user_ids = list(User.objects.filter(id__gt=last_id).order_by('id')\
+                .values_list('id', flat=True)[:options['batch_size']])
+            if not user_ids:
+                break
+            recount(user_ids)
+            last_id   = user_ids[-1]
+            finished += len(user_ids)
+            self.stdout.write('recounted {:,} users'.format(finished))
+
+        self.stdout.write(self.style.SUCCESS('done ({:.1f}s)'.format(time.monotonic() - started)))
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.6 on 2026-10-19 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_auto_20210226_0356'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='user.user')),
+                ('posting_count', models.IntegerField(default=0)),
+                ('follower_count', models.IntegerField(default=0)),
+                ('following_count', models.IntegerField(default=0)),
+                ('scrap_count', models.IntegerField(default=0)),
+                ('like_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'user_counters',
+            },
+        ),
+    ]
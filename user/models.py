@@ -18,3 +18,14 @@ class Follow(models.Model):
 
     class Meta:
         db_table = 'follows'
+
+class UserCounter(models.Model):
+    user            = models.OneToOneField('User', on_delete=models.CASCADE, primary_key=True, related_name='counter')
+    posting_count   = models.IntegerField(default=0)
+    follower_count  = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    scrap_count     = models.IntegerField(default=0)
+    like_count      = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'user_counters'
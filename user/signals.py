@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch          import receiver
+
+from sweethome.querycache import invalidate_on_change
+from user.counters  import add_count, invalidate_profile
+from user.models    import User, Follow
+from posting.models import Posting, PostingLike, PostingScrap
+from utils          import token_cache
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.id)
+    invalidate_profile(instance.id)
+
+# 게시글 목록, 리뷰 목록은 작성자 이름/이미지를 포함한다
+invalidate_on_change(User)
+
+# 게시글, 좋아요, 스크랩: 작성한 유저의 counter 갱신
+USER_COUNTER_FIELDS = {
+    Posting      : 'posting_count',
+    PostingLike  : 'like_count',
+    PostingScrap : 'scrap_count',
+}
+
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        add_count(instance.user_id, USER_COUNTER_FIELDS[sender], 1)
+
+def count_deleted(sender, instance, **kwargs):
+    add_count(instance.user_id, USER_COUNTER_FIELDS[sender], -1)
+
+for model in USER_COUNTER_FIELDS:
+    post_save.connect(count_created, sender=model)
+    post_delete.connect(count_deleted, sender=model)
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        add_count(instance.from_user_id, 'following_count', 1)
+        add_count(instance.to_user_id, 'follower_count', 1)
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    add_count(instance.from_user_id, 'following_count', -1)
+    add_count(instance.to_user_id, 'follower_count', -1)
@@ -1,3 +1,241 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import jwt
+
+from unittest import mock
+
+from django.core.management import call_command
+from django.test            import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from sweethome    import testing
+from user.hashers import HasherBusy, PasswordHasherPool, _checkpw, _hashpw, hasher_pool
+from user.models  import Follow, User, UserCounter
+from my_settings  import ALGORITHM, SECRET_KEY
+from utils        import (
+    LazyUser, TokenCache, UserSnapshot, create_access_token, create_refresh_token, get_login_user, token_cache
+)
+
+import user.urls
+
+def new_user(size):
+    return {'email' : 'budget{}@sweethome.test'.format(size), 'password' : 'budget1234', 'name' : 'budget{}'.format(size)}
+
+def refresh_token(size):
+    return {'refresh_token' : create_refresh_token(User.objects.get(id=1))}
+
+def clear_follow(size):
+    Follow.objects.filter(from_user_id=1, to_user_id=2).delete()
+
+class UserQueryBudgetTest(testing.QueryBudgetTestCase):
+    urls      = user.urls
+    endpoints = [
+        testing.Endpoint('POST', '/user/signup', data=new_user),
+        testing.Endpoint('POST', '/user/signin', data={'email' : 'user1@seed.sweethome', 'password' : 'seed1234'}),
+        testing.Endpoint('POST', '/user/token/refresh', data=refresh_token),
+        testing.Endpoint('GET', '/user/1/profile'),
+        testing.Endpoint('POST', '/user/follow', data={'user_id' : 2}, login=True, prepare=clear_follow),
+    ]
+
+def snapshot(user_id):
+    return UserSnapshot(user_id, 'user{}'.format(user_id), None, None)
+
+class TokenCacheTest(SimpleTestCase):
+    def test_entries_expire_after_ttl_or_token_exp(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set('long', snapshot(1))
+        cache.set('short', snapshot(1), expires_at=time.time() + 5)
+
+        with mock.patch('utils.time.monotonic', return_value=time.monotonic() + 30):
+            self.assertIsNone(cache.get('short'))
+            self.assertEqual(cache.get('long').id, 1)
+        with mock.patch('utils.time.monotonic', return_value=time.monotonic() + 90):
+            self.assertIsNone(cache.get('long'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_least_recently_used_token_is_evicted(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', snapshot(1))
+        cache.set('b', snapshot(2))
+        cache.get('a')
+        cache.set('c', snapshot(3))
+        self.assertEqual([token for token in 'abc' if cache.get(token)], ['a', 'c'])
+
+    def test_invalidate_user_removes_every_token_of_the_user(self):
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set('a', snapshot(1))
+        cache.set('b', snapshot(1))
+        cache.set('c', snapshot(2))
+        cache.invalidate_user(1)
+        self.assertEqual([token for token in 'abc' if cache.get(token)], ['c'])
+
+class LazyUserTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='lazy@sweethome.test', password='x', name='lazy', description='소개')
+
+    def test_snapshot_fields_do_not_query_the_user(self):
+        lazy_user = LazyUser(UserSnapshot(self.user.id, 'lazy', None, '소개'))
+        with self.assertNumQueries(0):
+            self.assertEqual((lazy_user.id, lazy_user.pk, lazy_user.name), (self.user.id, self.user.id, 'lazy'))
+            self.assertIsInstance(lazy_user, User)
+        with self.assertNumQueries(1):
+            self.assertEqual(lazy_user.email, 'lazy@sweethome.test')
+
+    def test_saving_the_user_invalidates_cached_tokens(self):
+        token_cache.set('legacy-token', UserSnapshot(self.user.id, 'lazy', None, '소개'))
+        self.assertEqual(get_login_user('legacy-token').name, 'lazy')
+
+        self.user.name = 'renamed'
+        self.user.save()
+        self.assertIsNone(token_cache.get('legacy-token'))
+
+class PasswordHasherPoolTest(TestCase):
+    def test_requests_over_the_queue_are_rejected_without_waiting(self):
+        pool    = PasswordHasherPool(workers=1, queue_size=0, timeout=5)
+        running = threading.Thread(target=pool.run, args=(time.sleep, 1))
+        running.start()
+        time.sleep(0.1)
+
+        started = time.monotonic()
+        with self.assertRaises(HasherBusy):
+            pool.run(_hashpw, 'password', 4)
+        self.assertLess(time.monotonic() - started, 0.1)
+        running.join()
+
+    def test_timed_out_requests_give_back_their_queue_slot(self):
+        pool = PasswordHasherPool(workers=1, queue_size=3, timeout=0.2)
+        self.addCleanup(lambda: pool._get_executor().shutdown(wait=False, cancel_futures=True))
+        # 실행 중인 작업과 worker 쪽 queue로 넘어간 작업은 취소되지 않지만, 아직 대기 중인 마지막 작업은 취소된다
+        for _ in range(4):
+            with self.assertRaises(HasherBusy):
+                pool.run(time.sleep, 2)
+        self.assertGreater(pool._slots._value, 0)
+
+    def test_signup_answers_503_when_the_hasher_is_saturated(self):
+        with mock.patch.object(hasher_pool, '_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.client.post('/user/signup', {
+                'email' : 'busy@sweethome.test', 'password' : 'busy12345', 'name' : 'busy'
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(email='busy@sweethome.test').exists())
+
+    def test_pool_is_recreated_after_a_worker_dies(self):
+        pool = PasswordHasherPool(workers=1, queue_size=1, timeout=30)
+        with self.assertRaises(HasherBusy):
+            pool.run(os._exit, 1)
+        self.assertTrue(pool.run(_hashpw, 'password', 4).startswith('$2b$04$'))
+
+        # 깨진 pool에 submit 하는 경우도 503으로 처리하고 다음 요청에서 다시 만든다
+        broken = pool._get_executor().submit(os._exit, 1)
+        with self.assertRaises(Exception):
+            broken.result()
+        with self.assertRaises(HasherBusy):
+            pool.run(_hashpw, 'password', 4)
+        self.assertTrue(pool.run(_hashpw, 'password', 4).startswith('$2b$04$'))
+
+class AccessTokenTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='token@sweethome.test', password='x', name='token')
+
+    def token(self, **claims):
+        return jwt.encode(dict({'user_id' : self.user.id}, **claims), SECRET_KEY, ALGORITHM)
+
+    def test_expired_access_token_is_rejected(self):
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            get_login_user(self.token(name='token', image_url=None, description=None, exp=int(time.time()) - 1))
+
+    def test_refresh_issues_a_working_access_token(self):
+        response = self.client.post('/user/token/refresh', {'refresh_token' : create_refresh_token(self.user)},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_login_user(response.json()['access_token']).id, self.user.id)
+
+        response = self.client.post('/user/token/refresh', {'refresh_token' : create_access_token(self.user)},
+            content_type='application/json')
+        self.assertEqual(response.json()['message'], 'INVALID_TOKEN')
+        with self.assertRaises(jwt.InvalidTokenError):
+            get_login_user(create_refresh_token(self.user))
+
+    def test_refresh_rejects_malformed_bodies(self):
+        for body in ('', 'not json', '[]', '"token"', '{}'):
+            with self.subTest(body=body):
+                response = self.client.post('/user/token/refresh', body, content_type='application/json')
+                self.assertEqual((response.status_code, response.json()['message']), (400, 'KEY_ERROR'))
+
+    def test_legacy_token_without_exp_is_accepted_only_until_the_cutoff(self):
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            get_login_user(self.token())
+
+        tomorrow  = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+        yesterday = tomorrow - datetime.timedelta(days=2)
+        with override_settings(LEGACY_TOKEN_ACCEPT_UNTIL=yesterday), self.assertRaises(jwt.ExpiredSignatureError):
+            get_login_user(self.token(legacy=1))
+        with override_settings(LEGACY_TOKEN_ACCEPT_UNTIL=tomorrow):
+            self.assertEqual(get_login_user(self.token(legacy=2)).id, self.user.id)
+
+class UserProfileTest(TransactionTestCase):
+    def setUp(self):
+        self.follower = User.objects.create(email='from@sweethome.test', password='x', name='from')
+        self.followed = User.objects.create(email='to@sweethome.test', password='x', name='to')
+        self.headers  = {'HTTP_AUTHORIZATION' : create_access_token(self.follower)}
+
+    def profile(self, user):
+        return self.client.get('/user/{}/profile'.format(user.id)).json()['profile']
+
+    def follow(self):
+        return self.client.post('/user/follow', {'user_id' : self.followed.id}, content_type='application/json', **self.headers)
+
+    def test_follow_updates_counters_and_cached_profiles(self):
+        self.assertEqual(self.profile(self.followed)['follower_count'], 0)
+
+        self.assertEqual(self.follow().status_code, 201)
+        self.assertEqual(self.profile(self.followed)['follower_count'], 1)
+        self.assertEqual(self.profile(self.follower)['following_count'], 1)
+
+        response = self.follow()
+        self.assertEqual((response.status_code, response.json()['message']), (200, '팔로우 취소'))
+        self.assertEqual(self.profile(self.followed)['follower_count'], 0)
+
+    def test_recount_repairs_drifted_counters(self):
+        Follow.objects.bulk_create([Follow(from_user=self.follower, to_user=self.followed)])
+        UserCounter.objects.filter(user=self.followed).update(follower_count=5)
+
+        call_command('recount_user_counters', stdout=io.StringIO())
+        self.assertEqual(self.profile(self.followed)['follower_count'], 1)
+
+class ImportUsersTest(TestCase):
+    def write(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def import_users(self, path):
+        call_command('import_users', path, '--workers', '1', '--rounds', '4', '--chunk-size', '2', stdout=io.StringIO())
+
+    def test_imports_valid_rows_and_skips_duplicates(self):
+        User.objects.create(email='taken@sweethome.test', password='x', name='taken')
+        rows = [
+            {'email' : 'a@sweethome.test', 'password' : 'password1', 'name' : 'alpha', 'description' : '소개'},
+            {'email' : 'a@sweethome.test', 'password' : 'password1', 'name' : 'alpha2'},
+            {'email' : 'taken@sweethome.test', 'password' : 'password1', 'name' : 'beta'},
+            {'email' : 'c@sweethome.test', 'password' : 'short', 'name' : 'gamma'},
+            {'email' : 'd@sweethome.test', 'password' : 'password1', 'name' : 'taken'},
+        ]
+        self.import_users(self.write('.jsonl', '\n'.join(json.dumps(row) for row in rows)))
+        self.import_users(self.write('.csv', 'email,password,name\ne@sweethome.test,password2,epsilon\n'))
+
+        self.assertEqual(
+            sorted(User.objects.exclude(name='taken').values_list('email', 'name', 'description')),
+            [('a@sweethome.test', 'alpha', '소개'), ('e@sweethome.test', 'epsilon', None)]
+        )
+        self.assertTrue(_checkpw('password2', User.objects.get(name='epsilon').password))
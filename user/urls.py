@@ -1,8 +1,14 @@
 from django.urls import path
 from .views      import SignupView
 from .views      import SigninView
+from .views      import TokenRefreshView
+from .views      import UserProfileView
+from .views      import FollowView
 
 urlpatterns = [
     path('/signup', SignupView.as_view()),
-    path('/signin', SigninView.as_view())
+    path('/signin', SigninView.as_view()),
+    path('/token/refresh', TokenRefreshView.as_view()),
+    path('/follow', FollowView.as_view()),
+    path('/<int:user_id>/profile', UserProfileView.as_view()),
 ]
\ No newline at end of file
@@ -1,19 +1,35 @@
 import json
-import bcrypt
 import jwt
 
 from django.views import View
-from django.http  import JsonResponse
 
-from my_settings  import SECRET_KEY, ALGORITHM
-from utils       import login_decorator
-from .models      import User
+from sweethome.renderers import JsonResponse
+from utils       import login_decorator, create_access_token, create_refresh_token, decode_token
+from .models      import User, Follow
+from .counters    import get_profile
+from .hashers     import HasherBusy, hash_password, check_password, needs_rehash
 
 MINIMUM_PASSWORD_LENGTH = 8
 MINIMUM_NAME_LENGTH = 2
 MAXIMUN_NAME_LENGTH = 15
+SERVER_BUSY_RETRY_AFTER = 1
+
+def server_busy_response():
+    response = JsonResponse({'message' : 'SERVER_BUSY'}, status = 503)
+    response['Retry-After'] = SERVER_BUSY_RETRY_AFTER
+    return response
+
+def rehash_password(user, password):
+    # 로그인 자체는 이미 성공했으므로 대기열이 가득 찼다면 다음 로그인으로 미룬다
+    try:
+        hashed_password = hash_password(password)
+    except HasherBusy:
+        return
+    User.objects.filter(id = user.id).update(password = hashed_password)
 
 class SignupView(View):
+    query_budget = {'post' : 2}
+
     def post(self, request):
         """ [User] 회원가입
         Args:
@@ -27,8 +43,9 @@ class SignupView(View):
             - 400 (닉네임을 입력해주세요): 닉네임을 입력하지 않았을 경우
             - 400 (닉네임 길이를 맞춰주세요): 닉네임 길이가 유효하지 않을 경우 (2자 이상 15자 이하)
             - 400 (이미 존재하는 닉네임입니다): 닉네임 중복 유효성에 위배될 경우
+            - 503 (SERVER_BUSY): bcrypt 처리 대기열이 가득 찬 경우
         Note:
-            - 유효한 비밀번호는 bcrypt로 암호화 되어 db에 저장
+            - 유효한 비밀번호는 bcrypt로 암호화 되어 db에 저장 (user.hashers의 process pool에서 처리)
         """
         try:
             data     = json.loads(request.body)
@@ -49,7 +66,7 @@ class SignupView(View):
             if User.objects.filter(name = name).exists():
                 return JsonResponse({'message' : '이미 존재하는 닉네임입니다'}, status = 400)
 
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed_password = hash_password(password)
             User.objects.create(
                 email    = email,
                 password = hashed_password,
@@ -59,9 +76,13 @@ class SignupView(View):
                 
         except KeyError:
             return JsonResponse({'message' : 'KEY_ERROR'}, status = 400)
+        except HasherBusy:
+            return server_busy_response()
 
 
 class SigninView(View):
+    query_budget = {'post' : 2}
+
     def post(self, request):
         """ [User] 회원가입
         Args:
@@ -69,11 +90,14 @@ class SigninView(View):
             - password: 유저의 password
             - name: 유저의 닉네임
         Returns: 
-            - 200: {'message' : '로그인 성공', 'access_token' : 유효한 토큰 정보 반환}
+            - 200: {'message' : '로그인 성공', 'access_token' : 유효한 토큰 정보 반환, 'refresh_token' : access token 재발급용 토큰}
             - 401 (존재하지 않는 이메일 입니다): 회원가입된 정보와 일치하는 이메일이 없을 경우
             - 401 (비밀번호를 확인해주세요): 입력한 이메일 정보는 있지만 비밀번호가 동일하지 않을 경우
+            - 503 (SERVER_BUSY): bcrypt 처리 대기열이 가득 찬 경우
         Note:
             - 로그인 성공 후 access_token 반환 (body)
+            - access_token은 settings.ACCESS_TOKEN_LIFETIME 동안만 유효하며 name, image_url, description claim을 담는다.
+            - 저장된 hash의 cost가 settings.BCRYPT_ROUNDS와 다르면 새 cost로 다시 hash 해서 저장한다.
         """
         try: 
             data     = json.loads(request.body)
@@ -84,12 +108,110 @@ class SigninView(View):
                 return JsonResponse({'mesage' : '존재하지 않는 이메일 입니다.'}, status = 401)
             user = User.objects.get(email=email)
             
-            if bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
-                token = jwt.encode({'user_id': user.id}, SECRET_KEY, ALGORITHM)
-                return JsonResponse({'message': '로그인 성공', 'access_token': token}, status=200)
+            if check_password(password, user.password):
+                if needs_rehash(user.password):
+                    rehash_password(user, password)
+                return JsonResponse({
+                    'message'       : '로그인 성공',
+                    'access_token'  : create_access_token(user),
+                    'refresh_token' : create_refresh_token(user),
+                }, status=200)
             return JsonResponse({'message': '비밀번호를 확인해주세요'}, status=401)
 
         except KeyError:
             return JsonResponse({'message': 'KEY_ERROR'}, status=400)
+        except HasherBusy:
+            return server_busy_response()
+
+
+class TokenRefreshView(View):
+    query_budget = {'post' : 1}
+
+    def post(self, request):
+        """ [User] access token 재발급
+        Args:
+            - refresh_token: 로그인 시 발급받은 refresh token
+        Returns: 
+            - 200: {'access_token' : 새로 발급된 access token}
+            - 400 (KEY_ERROR): body가 비었거나 JSON object가 아니거나 refresh_token이 없는 경우
+            - 401 (EXPIRED_TOKEN): refresh token이 만료된 경우
+            - 401 (INVALID_TOKEN): refresh token이 아니거나 유효하지 않은 경우
+            - 401 (INVALID_USER): token의 유저가 존재하지 않는 경우
+        Note:
+            - 매번 User를 새로 조회하므로 변경된 프로필은 재발급된 access token부터 반영된다.
+        """
+        try:
+            data    = json.loads(request.body)
+            payload = decode_token(data['refresh_token'])
+            if payload.get('type') != 'refresh':
+                return JsonResponse({'message': 'INVALID_TOKEN'}, status=401)
+
+            user = User.objects.get(id=payload['user_id'])
+            return JsonResponse({'access_token': create_access_token(user)}, status=200)
+
+        # JSON이 아닌 body는 JSONDecodeError, object가 아닌 JSON(list, 문자열 등)은 TypeError
+        except (KeyError, TypeError, json.JSONDecodeError):
+            return JsonResponse({'message': 'KEY_ERROR'}, status=400)
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message': 'EXPIRED_TOKEN'}, status=401)
+        except jwt.InvalidTokenError:
+            return JsonResponse({'message': 'INVALID_TOKEN'}, status=401)
+        except User.DoesNotExist:
+            return JsonResponse({'message': 'INVALID_USER'}, status=401)
+
+
+class UserProfileView(View):
+    query_budget = {'get' : 1}
 
+    def get(self, request, user_id):
+        """ [User] 유저 프로필
+        Args:
+            - user_id: path parameter로 들어오는 유저 id
+        Returns: 
+            - 200: {'profile' : 유저 정보와 게시글, 팔로워, 팔로잉, 스크랩, 좋아요 수}
+            - 404: 존재하지 않는 유저일 경우
+        Note:
+            - 집계 값은 COUNT query 대신 user_counters에 저장된 값을 사용하고, 렌더링된 결과는 cache에 저장된다.
+        """
+        try:
+            return JsonResponse({'profile': get_profile(user_id)}, status=200)
+        except User.DoesNotExist:
+            return JsonResponse({'message': '존재하지 않는 유저입니다'}, status=404)
+
+
+class FollowView(View):
+    query_budget = {'post' : 5}
+
+    @login_decorator
+    def post(self, request):
+        """ [User] 팔로우 / 팔로우 취소
+        Args:
+            - user_id: body로 들어오는 팔로우할 유저의 id
+        Returns: 
+            - 201: {'message' : '팔로우 완료'}
+            - 200: {'message' : '팔로우 취소'} 이미 팔로우 중일 경우 팔로우 관계를 삭제
+            - 400: 자기 자신을 팔로우 하려는 경우
+            - 404: 존재하지 않는 유저일 경우
+        """
+        try:
+            user       = request.user
+            data       = json.loads(request.body)
+            to_user_id = data['user_id']
+
+            if to_user_id == user.id:
+                return JsonResponse({'message': '자기 자신은 팔로우 할 수 없습니다'}, status=400)
+            if not User.objects.filter(id=to_user_id).exists():
+                return JsonResponse({'message': '존재하지 않는 유저입니다'}, status=404)
 
+            follows = Follow.objects.filter(from_user_id=user.id, to_user_id=to_user_id)
+            if follows.exists():
+                follows.delete()
+                return JsonResponse({'message': '팔로우 취소'}, status=200)
+
+            Follow.objects.create(from_user_id=user.id, to_user_id=to_user_id)
+            return JsonResponse({'message': '팔로우 완료'}, status=201)
+
+        except KeyError:
+            return JsonResponse({'message': 'KEY_ERROR'}, status=400)
+        except json.decoder.JSONDecodeError:
+            return JsonResponse({'message': 'JSON_DECODE_ERROR'}, status=400)
@@ -1,11 +1,181 @@
+import asyncio
+import contextvars
 import jwt
 import json
+import threading
+import time
 
-from django.http    import JsonResponse
+from collections        import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools          import partial, update_wrapper
+from itertools          import islice
 
-from my_settings    import SECRET_KEY, ALGORITHM
+from django.conf                  import settings
+from django.db                    import close_old_connections
+from django.db.models             import prefetch_related_objects
+from django.http                  import HttpResponse, StreamingHttpResponse
+from django.utils.decorators      import classonlymethod
+from django.utils.functional      import SimpleLazyObject, empty
+from django.views                 import View
+
+from my_settings          import SECRET_KEY, ALGORITHM
+from sweethome            import compression, renderers
+from sweethome.querycache import query_cache
+from sweethome.renderers  import JsonResponse
 from user.models    import User
 
+# 화면 표시에 필요한 User 필드만 담은 가벼운 객체
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'name', 'image_url', 'description'])
+
+def make_snapshot(user):
+    return UserSnapshot(user.id, user.name, user.image_url, user.description)
+
+class TokenCache:
+    """ 검증된 token -> UserSnapshot LRU/TTL cache
+    - process(worker) 단위의 cache 이므로 다른 worker에서 수정된 User는 TTL 이후에 반영된다.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size        = max_size
+        self.ttl             = ttl
+        self.hits            = 0
+        self.misses          = 0
+        self._entries        = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock           = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                self._remove(token)
+            self.misses += 1
+            return None
+
+    def set(self, token, snapshot, expires_at=None):
+        # 만료 시각(exp)이 있는 token은 exp 이후까지 cache에 남지 않도록 한다
+        ttl = self.ttl if expires_at is None else min(self.ttl, expires_at - time.time())
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (time.monotonic() + ttl, snapshot)
+            self._tokens_by_user.setdefault(snapshot.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def _remove(self, token):
+        _, snapshot = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(snapshot.id)
+        if tokens:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[snapshot.id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size'     : len(self._entries),
+                'max_size' : self.max_size,
+                'hits'     : self.hits,
+                'misses'   : self.misses,
+            }
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+class LazyUser(SimpleLazyObject):
+    """ snapshot에 있는 필드는 바로 반환하고, 그 외의 필드를 사용할 때 User를 조회한다.
+    - filter(user=request.user) 처럼 id만 필요한 ORM 호출에서는 조회가 일어나지 않는다.
+    """
+    _meta     = User._meta
+    __class__ = property(lambda self: User)
+
+    def __init__(self, snapshot):
+        self.__dict__['_snapshot'] = snapshot
+        super().__init__(lambda: User.objects.get(id=snapshot.id))
+
+    def __getattr__(self, name):
+        if name == 'pk':
+            name = 'id'
+        if self._wrapped is empty and name in UserSnapshot._fields:
+            return getattr(self._snapshot, name)
+        return super().__getattr__(name)
+
+def create_access_token(user):
+    """ 화면 표시용 claim(name, image_url, description)을 담은 짧은 수명의 access token """
+    payload = {
+        'user_id'     : user.id,
+        'name'        : user.name,
+        'image_url'   : user.image_url,
+        'description' : user.description,
+        'type'        : 'access',
+        'exp'         : int(time.time()) + settings.ACCESS_TOKEN_LIFETIME,
+    }
+    return jwt.encode(payload, SECRET_KEY, ALGORITHM)
+
+def create_refresh_token(user):
+    payload = {'user_id' : user.id, 'type' : 'refresh', 'exp' : int(time.time()) + settings.REFRESH_TOKEN_LIFETIME}
+    return jwt.encode(payload, SECRET_KEY, ALGORITHM)
+
+def decode_token(token):
+    """ token의 payload. 서명이 유효하지 않거나 만료된 token은 jwt 예외를 발생시킨다.
+    Note:
+        - 만료 시각(exp)이 없는 기존 token은 settings.LEGACY_TOKEN_ACCEPT_UNTIL 까지만 허용하고, 그 이후(또는 None이면)는 만료로 처리한다.
+    """
+    payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
+    if 'exp' not in payload:
+        accept_until = settings.LEGACY_TOKEN_ACCEPT_UNTIL
+        if accept_until is None or time.time() >= accept_until.timestamp():
+            raise jwt.ExpiredSignatureError('token has no exp claim')
+    return payload
+
+def get_login_user(access_token):
+    """ token으로 로그인 user를 반환한다.
+    Raises:
+        - jwt.ExpiredSignatureError: 만료된 token
+        - jwt.InvalidTokenError: 유효하지 않은 token (refresh token 포함)
+        - User.DoesNotExist: token의 user가 존재하지 않을 경우
+    Note:
+        - claim이 담긴 access token은 User를 조회하지 않는다. (프로필 변경은 다음 refresh 때 반영)
+        - claim이 없는 기존 token만 User를 조회한다.
+        - exp가 없는 기존 token은 decode_token 참고
+    """
+    snapshot = token_cache.get(access_token)
+    if snapshot:
+        return LazyUser(snapshot)
+
+    payload = decode_token(access_token)
+    if payload.get('type') == 'refresh':
+        raise jwt.InvalidTokenError('refresh token cannot be used as an access token')
+
+    if 'name' in payload:
+        login_user = LazyUser(UserSnapshot(
+            payload['user_id'], payload['name'], payload['image_url'], payload['description']
+        ))
+        token_cache.set(access_token, login_user._snapshot, payload.get('exp'))
+        return login_user
+
+    login_user = User.objects.get(id=payload['user_id'])
+    token_cache.set(access_token, make_snapshot(login_user), payload.get('exp'))
+    return login_user
+
+def get_token_user_id(request):
+    """ DB 조회 없이 Authorization header의 token에서 user_id만 꺼낸다. 유효하지 않으면 None """
+    access_token = request.headers.get('Authorization', None)
+    if not access_token:
+        return None
+    try:
+        return decode_token(access_token).get('user_id')
+    except jwt.InvalidTokenError:
+        return None
+
 def non_user_accept_decorator(func):
     def wrapper(self, request, *args, **kwargs):
         try:
@@ -13,11 +183,29 @@ def non_user_accept_decorator(func):
             if not access_token:
                 request.user = None
                 return func(self, request, *args, **kwargs)
-            payload         = jwt.decode(access_token, SECRET_KEY, algorithms=ALGORITHM)
-            login_user      = User.objects.get(id=payload['user_id'])
-            request.user    = login_user
+            request.user    = get_login_user(access_token)
             return func(self, request, *args, **kwargs)
-        except jwt.DecodeError:
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message' : 'EXPIRED_TOKEN'}, status=401)
+        except jwt.InvalidTokenError:
+            return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+        except User.DoesNotExist:
+            return JsonResponse({'message' : 'INVALID_USER'}, status=401)
+    return wrapper
+
+def async_non_user_accept_decorator(func):
+    """ AsyncView 용 non_user_accept_decorator """
+    async def wrapper(self, request, *args, **kwargs):
+        try:
+            access_token    = request.headers.get('Authorization', None)
+            if not access_token:
+                request.user = None
+                return await func(self, request, *args, **kwargs)
+            request.user    = await run_in_db_thread(get_login_user, access_token)
+            return await func(self, request, *args, **kwargs)
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message' : 'EXPIRED_TOKEN'}, status=401)
+        except jwt.InvalidTokenError:
             return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
         except User.DoesNotExist:
             return JsonResponse({'message' : 'INVALID_USER'}, status=401)
@@ -29,12 +217,134 @@ def login_decorator(func):
             return JsonResponse({'message': 'NEED_LOGIN'}, status=401)
         try:
             access_token = request.headers['Authorization']
-            payload      = jwt.decode(access_token, SECRET_KEY, ALGORITHM)
-            login_user   = User.objects.get(id=payload['user_id'])
-            request.user = login_user
+            request.user = get_login_user(access_token)
             return func(self, request, *args, **kwargs)
-        except jwt.DecodeError:
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message': 'EXPIRED_TOKEN'}, status=401)
+        except jwt.InvalidTokenError:
             return JsonResponse({'message': 'INVALID_TOKEN'}, status=401)
         except User.DoesNotExist:
             return JsonResponse({'message': 'INVALID_USER'}, status=401)
     return wrapper
+
+def cache_response(tags):
+    """ 로그인 여부와 무관한 GET 응답을 path와 정규화된 query parameter 단위로 query cache에 저장한다.
+    Args:
+        - tags: 응답이 의존하는 table / row tag 목록, 또는 view의 path parameter를 받아 tag 목록을 반환하는 함수
+    Note:
+        - body와 함께 encoding 별 압축본을 저장해서, CompressionMiddleware가 요청마다 다시 압축하지 않도록 한다.
+        - 200 응답만 저장하고, tag의 model이 변경되면 다음 요청에서 다시 만든다.
+        - ?stream=1 요청은 streaming 응답을 저장하지 않으므로 cache를 읽지도 않고 view를 바로 실행한다.
+    """
+    def decorator(func):
+        def wrapper(self, request, *args, **kwargs):
+            if request.GET.get('stream'):
+                return func(self, request, *args, **kwargs)
+
+            def render():
+                response = func(self, request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                return {
+                    'content_type' : response['Content-Type'],
+                    'body'         : response.content,
+                    'variants'     : compression.compress_variants(response.content),
+                }
+
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            entry      = query_cache.get_or_set(
+                'response:{}'.format(request.path), request.GET, entry_tags, render,
+                settings.RESPONSE_CACHE_TIMEOUT, cacheable=lambda entry: isinstance(entry, dict)
+            )
+            # 저장하지 않는 응답(에러, streaming)은 그대로 반환한다
+            if not isinstance(entry, dict):
+                return entry
+
+            response = HttpResponse(entry['body'], content_type=entry['content_type'])
+            response.compressed_variants = entry['variants']
+            return response
+        return wrapper
+    return decorator
+
+# async view에서 ORM query를 실행하는 thread pool. 동시에 열리는 DB connection 수도 이 크기로 제한된다.
+db_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_WORKERS, thread_name_prefix='async-db')
+
+def _run_query(func, *args):
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+async def run_in_db_thread(func, *args):
+    """ ORM을 사용하는 동기 함수를 db_executor에서 실행한다.
+    - asyncio.gather와 함께 사용하면 서로 독립적인 query를 동시에 실행할 수 있다.
+    """
+    loop    = asyncio.get_running_loop()
+    # replica routing 등 contextvar 상태를 executor thread에서도 그대로 사용하도록 context를 복사한다
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, partial(context.run, _run_query, func, *args))
+
+class AsyncView(View):
+    """ async def 로 작성된 method(get, post ...)를 가지는 class based view
+    - Django 3.1의 View.as_view()는 async handler를 지원하지 않기 때문에 coroutine view 함수를 직접 만든다.
+    """
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        super().as_view(**initkwargs)
+
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+            return await self.dispatch(request, *args, **kwargs)
+        view.view_class      = cls
+        view.view_initkwargs = initkwargs
+
+        update_wrapper(view, cls, updated=())
+        update_wrapper(view, cls.dispatch, assigned=())
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request, *args, **kwargs)
+        return handler(request, *args, **kwargs)
+
+def queryset_chunks(queryset, chunk_size=None):
+    """ queryset을 chunk_size 개씩 list로 나눠서 반환한다.
+    - .iterator()는 prefetch_related를 무시하므로, prefetch 대상은 chunk 마다 prefetch_related_objects로 가져온다.
+    """
+    chunk_size = chunk_size or settings.STREAMING_CHUNK_SIZE
+    lookups    = queryset._prefetch_related_lookups
+    iterator   = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+def stream_json_response(key, rows, status=200, **extra):
+    """ {key: [row, ...], **extra} 형태의 JSON을 row 단위로 직렬화해서 보내는 StreamingHttpResponse
+    Args:
+        - rows: dict를 하나씩 만들어내는 iterable (generator)
+        - extra: 목록 외에 함께 보낼 값 (목록보다 먼저 계산되어 있어야 한다)
+    Note:
+        - 전체 목록을 메모리에 만들지 않고, 첫 row가 준비되는 즉시 응답을 보내기 시작한다.
+        - rows의 query는 view가 반환된 뒤 body를 읽을 때 실행된다. 그동안의 admission 자리와 primary 고정은
+          sweethome.middleware.GuardedStream 이 유지한다.
+    """
+    def render():
+        dumps = renderers.dumps
+        yield b'{' + dumps(key) + b':['
+        for number, row in enumerate(rows):
+            yield (b',' if number else b'') + dumps(row)
+        yield b']'
+        for name, value in extra.items():
+            yield b',' + dumps(name) + b':' + dumps(value)
+        yield b'}'
+
+    return StreamingHttpResponse(render(), status=status, content_type='application/json')